@@ -10,7 +10,8 @@ from .ckanext_dataminds import (
     MongoWriter,
     CkanPublisher,
     run_ted_cron_job,
-    run_bescha_cron_job,
+    run_ted_cron_job_for,
+    run_bescha_cron_job_for,
     DatamindsPlugin
 )
 
@@ -1,20 +1,212 @@
 import json
-import io
 import re
 import logging
+import time
+import threading
+import concurrent.futures
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from urllib.parse import quote
 
-from pymongo import MongoClient
 import ckan.plugins.toolkit as tk
 
+from . import mongoPool
+from .harvestLog import LogSampler
+from .mongoWriter import content_hash
+
 log = logging.getLogger(__name__)
 
 
+# Läufe, die gerade ohne Suchindex-Update publizieren (auch parallel, z.B. im Async-Harvest);
+# allowed: der Prozess gehört dem Harvest (siehe exclusive_indexing)
+_deferred_indexing_state = {'count': 0, 'previous': True, 'allowed': False}
+_deferred_indexing_lock = threading.Lock()
+
+
+@contextmanager
+def exclusive_indexing():
+    """
+    Erlaubt zurückgestelltes Indexieren für die Dauer des Blocks. Der Schalter
+    ckan.search.automatic_indexing gilt für den ganzen Prozess – andere
+    Paketänderungen im selben Zeitraum würden nie indexiert. Deshalb nur dort,
+    wo allein der Harvest Pakete ändert: im Harvest-Job des RQ-Work-Horse
+    (jobs.run_harvest_job) und im Benchmark. Anderswo indexiert CKAN sofort.
+    """
+    with _deferred_indexing_lock:
+        previous = _deferred_indexing_state['allowed']
+        _deferred_indexing_state['allowed'] = True
+    try:
+        yield
+    finally:
+        with _deferred_indexing_lock:
+            _deferred_indexing_state['allowed'] = previous
+
+
+@contextmanager
+def _deferred_indexing():
+    """
+    Schaltet CKANs Suchindex-Update bei Paketänderungen
+    (ckan.search.automatic_indexing) ab, bis der letzte Nutzer fertig ist.
+    """
+    key = 'ckan.search.automatic_indexing'
+    with _deferred_indexing_lock:
+        if _deferred_indexing_state['count'] == 0:
+            _deferred_indexing_state['previous'] = tk.config.get(key, True)
+            tk.config[key] = False
+        _deferred_indexing_state['count'] += 1
+    try:
+        yield
+    finally:
+        with _deferred_indexing_lock:
+            _deferred_indexing_state['count'] -= 1
+            if _deferred_indexing_state['count'] == 0:
+                tk.config[key] = _deferred_indexing_state['previous']
+
+
 def clean_tag(input_tag):
     tag = re.sub(r'[^a-zA-Z0-9 \-_.]', '', input_tag)
     return tag[:63].strip()
 
 
+class PackageNameIndex:
+    """
+    Index der vorhandenen CKAN-Paketnamen, damit nicht für jede Notice erneut
+    die komplette package_list geholt werden muss.
+
+    Wird einmal pro Lauf seitenweise geladen (optional auf Präfixe wie 'ted-'
+    gefiltert) und beim Anlegen neuer Pakete fortgeschrieben. Mit einer
+    Redis-Verbindung liegt der Index in einem Set, das sich alle CKAN-Worker teilen;
+    es läuft ttl Sekunden nach dem Aufbau ab (die Frist wird nicht verlängert),
+    damit in CKAN gelöschte Pakete spätestens dann herausfallen.
+    """
+
+    page_size = 1000
+
+    def __init__(self, prefixes=None, redis_conn=None,
+                 redis_key='dataminds:package_names', ttl=6 * 3600):
+        self.prefixes = tuple(prefixes or ())
+        self.redis = redis_conn
+        self.redis_key = redis_key
+        self.ttl = ttl
+        self._names = None
+        self._lock = threading.Lock()
+
+    def _matches(self, name):
+        return not self.prefixes or name.startswith(self.prefixes)
+
+    def _fetch_names(self):
+        names = set()
+        offset = 0
+        while True:
+            page = tk.get_action('package_list')(
+                {'ignore_auth': True}, {'limit': self.page_size, 'offset': offset})
+            names.update(n for n in page if self._matches(n))
+            if len(page) < self.page_size:
+                return names
+            offset += self.page_size
+
+    def load(self, force=False):
+        """
+        Lädt den Index, falls noch nicht geschehen. Ein vorhandenes Redis-Set
+        wird übernommen, statt package_list erneut aufzurufen – mit seiner
+        ursprünglichen Ablaufzeit.
+        """
+        with self._lock:
+            if self._names is not None and not force:
+                return
+            if self.redis is not None and not force and self.redis.exists(self.redis_key):
+                self._names = set()
+                log.info(f"Package index: using shared Redis set '{self.redis_key}'")
+                return
+
+            names = self._fetch_names()
+            if self.redis is not None:
+                pipe = self.redis.pipeline()
+                pipe.delete(self.redis_key)
+                batch = list(names)
+                for i in range(0, len(batch), 10000):
+                    pipe.sadd(self.redis_key, *batch[i:i + 10000])
+                pipe.expire(self.redis_key, self.ttl)
+                pipe.execute()
+            self._names = names
+            log.info(f"Package index loaded: {len(names)} names (prefixes={self.prefixes or 'all'})")
+
+    def __contains__(self, name):
+        if self._names is None:
+            self.load()
+        if name in self._names:
+            return True
+        if self.redis is not None and self.redis.sismember(self.redis_key, name):
+            self._names.add(name)
+            return True
+        return False
+
+    def discard(self, name):
+        if self._names is not None:
+            self._names.discard(name)
+        if self.redis is not None:
+            self.redis.srem(self.redis_key, name)
+
+    def add(self, name):
+        if self._names is None:
+            self.load()
+        if not self._matches(name):
+            return
+        self._names.add(name)
+        if self.redis is not None:
+            self.redis.sadd(self.redis_key, name)
+
+
+class PublishReport:
+    """
+    Sammelt pro Lauf das Ergebnis jeder Notice (published / updated / skipped / failed)
+    samt Fehlermeldung und liefert am Ende eine Zusammenfassung. Für Notices,
+    die CKAN-Aufrufe ausgelöst haben, wird zusätzlich die Dauer gesammelt.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.started = time.time()
+        self.results = {}
+        self.errors = {}
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, key, status, error=None, duration=None):
+        with self._lock:
+            self.results[key] = status
+            if error is not None:
+                self.errors[key] = str(error)
+            if duration is not None and status != 'skipped':
+                self.latencies.append(duration)
+
+    def merge(self, other):
+        with self._lock:
+            self.results.update(other.results)
+            self.errors.update(other.errors)
+            self.latencies.extend(other.latencies)
+
+    def count(self, status):
+        return sum(1 for s in self.results.values() if s == status)
+
+    def as_dict(self):
+        return {
+            'source': self.source,
+            'total': len(self.results),
+            'published': self.count('published'),
+            'updated': self.count('updated'),
+            'skipped': self.count('skipped'),
+            'failed': self.count('failed'),
+            'duration_s': round(time.time() - self.started, 2),
+            'errors': dict(self.errors),
+        }
+
+    def summary(self):
+        d = self.as_dict()
+        return (f"{self.source}: {d['published']} published, {d['updated']} updated, {d['skipped']} skipped, "
+                f"{d['failed']} failed of {d['total']} in {d['duration_s']:.2f}s")
+
+
 class CkanPublisher:
     """
     Veröffentlichung einzelner TED-Notices als separate Datasets in CKAN.
@@ -23,40 +215,150 @@ class CkanPublisher:
     # Context für Toolkit-Aktionen ohne Authentifizierung
     context = {'ignore_auth': True}
 
-    def __init__(self, mongo_uri, db_name, owner_org):
-        # MongoDB-Verbindung
-        self.client = MongoClient(mongo_uri)
-        self.db = self.client[db_name]
+    # Anzahl der Lock-Streifen für parallel publizierende Worker
+    lock_stripes = 64
+
+    def __init__(self, mongo_uri=None, db_name=None, owner_org=None, name_index=None, workers=1,
+                 bulk=False, batch_size=100, defer_indexing=False, reindex_batch_size=500):
+        # MongoDB-Verbindung über den geteilten Client
+        self.client = mongoPool.get_client(mongo_uri)
+        self.db = self.client[mongoPool.db_name(db_name)]
         # Org, unter der die Datasets angelegt werden
         self.owner_org = owner_org
-        print(f"CKAN Publisher ready (DB {db_name}, owner_org={owner_org})")
-
-    def _get_or_create_package(self, name, title, description, tags=None, extras=None):
-        """
-        Legt ein neues CKAN-Paket an oder lädt es, wenn es bereits existiert.
-        Jetzt mit owner_org und aussagekräftigen Logs.
-        """
-        existing = tk.get_action('package_list')(self.context, {})
+        # Namensindex wird erst beim ersten Paket geladen (einmal pro Lauf)
+        self.name_index = name_index or PackageNameIndex(prefixes=('ted-', 'bescha-'))
+        # Parallelität beim Publizieren (1 = sequentiell wie bisher)
+        self.workers = max(1, int(workers or 1))
+        self._name_locks = [threading.Lock() for _ in range(self.lock_stripes)]
+        # Content-Hash, Paket- und Resource-ID je veröffentlichtem Dataset
+        self.publish_state = self.db["ckan_publish_state"]
+        # Bulk-Modus: neue Datasets samt Resource in Batches anlegen
+        self.bulk = bulk
+        self.batch_size = max(1, int(batch_size or 1))
+        self.notice_base_url = tk.config.get('ckan.site_url', '').rstrip('/') + '/dataminds/notice'
+        # Suchindex während des Laufs aus, betroffene Pakete indexiert finish()
+        # in Blöcken von reindex_batch_size (im Bulk-Modus immer) – nur innerhalb
+        # von exclusive_indexing(), sonst indexiert CKAN wie gewohnt sofort
+        self.defer_indexing = bool(bulk or defer_indexing) and _deferred_indexing_state['allowed']
+        if (bulk or defer_indexing) and not self.defer_indexing:
+            log.info("Deferred indexing only runs in the harvest worker, indexing immediately")
+        self.reindex_batch_size = max(1, int(reindex_batch_size or 1))
+        self._unindexed = {}
+        self._unindexed_lock = threading.Lock()
+        # Fehler pro Notice nur stichprobenweise loggen, vollständig stehen sie im Report
+        self._error_log = LogSampler()
+        log.debug(f"CKAN Publisher ready (DB {self.db.name}, owner_org={owner_org})")
+
+    def _ctx(self):
+        # CKAN-Aktionen verändern den Context, daher pro Aufruf eine Kopie
+        return dict(self.context)
+
+    def _name_lock(self, name):
+        return self._name_locks[hash(name) % self.lock_stripes]
+
+    @staticmethod
+    def _package_fields(title, description, tags=None, extras=None):
+        """Die aus der Notice abgeleiteten Paket-Felder (für create und patch)."""
         data = {
-            'name': name,
             'title': title,
             'notes': description,
-            'owner_org': self.owner_org,
             'tags': [{'name': t} for t in (tags or [])],
-            'private': False
         }
         if extras:
             data['extras'] = [{'key': k, 'value': str(v)} for k, v in extras.items()]
+        return data
 
-        if name in existing:
-            pkg = tk.get_action('package_show')(self.context, {'id': name})
-        else:
-            pkg = tk.get_action('package_create')(self.context, data)
+    def _get_or_create_package(self, name, title, description, tags=None, extras=None):
+        """
+        Legt ein neues CKAN-Paket an oder lädt es, wenn es bereits existiert.
+        Jetzt mit owner_org und aussagekräftigen Logs.
+        Die Existenzprüfung läuft über den Namensindex statt über package_list.
+        """
+        data = dict(self._package_fields(title, description, tags, extras),
+                    name=name, owner_org=self.owner_org, private=False)
+
+        if name in self.name_index:
+            try:
+                return tk.get_action('package_show')(self._ctx(), {'id': name})
+            except tk.ObjectNotFound:
+                # in CKAN gelöscht, der Index kennt den Namen noch: neu anlegen
+                log.info(f"Package {name} no longer exists, creating it again")
+                self.name_index.discard(name)
+        try:
+            pkg = tk.get_action('package_create')(self._ctx(), data)
+        except tk.ValidationError as e:
+            # Ein anderer Worker/Prozess hat das Paket inzwischen angelegt
+            if 'name' not in (e.error_dict or {}):
+                raise
+            pkg = tk.get_action('package_show')(self._ctx(), {'id': name})
+        self.name_index.add(name)
         return pkg
 
-    def _publish_ted_notice(self, notice):
+    def _load_publish_states(self, names):
+        """Gespeicherter Publish-Zustand (hash, package_id, resource_id) je Dataset-Name."""
+        cursor = self.publish_state.find({'_id': {'$in': list(names)}})
+        return {doc['_id']: doc for doc in cursor}
+
+    def _save_publish_state(self, name, digest, package_id, resource_id):
+        self.publish_state.update_one(
+            {'_id': name},
+            {'$set': {'hash': digest, 'package_id': package_id, 'resource_id': resource_id,
+                      'published_at': datetime.utcnow()}},
+            upsert=True)
+
+    def _publish_package(self, name, digest, state, package, resource):
+        """
+        Legt Dataset und JSON-Resource an oder aktualisiert sie gezielt per
+        package_patch/resource_patch, wenn sich der Content-Hash geändert hat.
+        package: title/description/tags/extras wie bei _get_or_create_package,
+        resource: Argumente für die Resource ohne package_id.
+        Liefert 'published' oder 'updated'.
+        """
+        if state and state.get('package_id') and state.get('resource_id'):
+            package_id, resource_id = state['package_id'], state['resource_id']
+        else:
+            pkg = self._get_or_create_package(name=name, **package)
+            package_id = pkg['id']
+            existing = next((r for r in pkg.get('resources', []) if r['name'] == resource['name']), None)
+            if existing is None:
+                created = tk.get_action('resource_create')(self._ctx(), dict(resource, package_id=package_id))
+                self._save_publish_state(name, digest, package_id, created['id'])
+                self._mark_unindexed(package_id)
+                return 'published'
+            # vor der Hash-Erfassung veröffentlicht: Inhalt einmalig abgleichen
+            resource_id = existing['id']
+
+        try:
+            fields = self._package_fields(**package)
+            tk.get_action('package_patch')(self._ctx(), dict(fields, id=package_id))
+            tk.get_action('resource_patch')(self._ctx(), dict(resource, id=resource_id))
+        except tk.ObjectNotFound:
+            # Dataset wurde in CKAN gelöscht: neu anlegen
+            self.publish_state.delete_one({'_id': name})
+            self.name_index.discard(name)
+            return self._publish_package(name, digest, None, package, resource)
+        self._save_publish_state(name, digest, package_id, resource_id)
+        self._mark_unindexed(package_id)
+        return 'updated'
+
+    def _notice_resource(self, source, key, title):
+        """
+        Resource-Argumente für das Notice-JSON: ein Link auf den Notice-Endpoint,
+        der den Inhalt aus MongoDB liefert – kein Upload in den Filestore.
+        Früher hochgeladene Resources werden beim nächsten Update umgestellt.
+        """
+        return {
+            'name': f"{source}_{key}.json",
+            'url': f"{self.notice_base_url}/{source}/{quote(key, safe='')}",
+            'url_type': '',
+            'format': 'json',
+            'title': title
+        }
+
+    def _ted_dataset(self, notice):
         """
-        Baut aus einer Notice das Dataset plus Resource.
+        Baut aus einer Notice Dataset-Name, Paket-Felder und Resource.
+        None, wenn Titel oder Buyer fehlen.
         """
         pubnum = notice.get('publication-number', 'unknown')
         dataset_name = f"ted-{pubnum}"
@@ -72,7 +374,7 @@ class CkanPublisher:
                 lang_code = code
                 break
         if not title_text:
-            return False
+            return None
         raw_date = notice.get('publication-date', '').rstrip('Z')
         buyer_map = notice.get('buyer-name') or {}
         buyer_list = None
@@ -81,7 +383,7 @@ class CkanPublisher:
                 buyer_list = buyer_map[code]
                 break
         if not buyer_list:
-            return False
+            return None
         buyer = ", ".join(buyer_list)
         # Links aufbereiten
         links_md = ""
@@ -105,67 +407,192 @@ class CkanPublisher:
             'buyer_name': buyer,
             'publication_date': date_only
         }
-        # Paket anlegen oder holen
-        pkg = self._get_or_create_package(
-            name=dataset_name,
-            title=title_text,
-            description=description,
-            tags=tags,
-            extras=extras
-        )
-        pkg_id = pkg['id']
+        package = dict(title=title_text, description=description, tags=tags, extras=extras)
 
         # JSON-Resource erstellen/aktualisieren
-        notice_json = json.dumps(notice, ensure_ascii=False, indent=2)
-        fp = io.BytesIO(notice_json.encode('utf-8'))
-        dateiname = "ted_example"
-        try:
-            with open(dateiname, 'wb') as f:  # 'wb' steht für "write binary"
-                f.write(fp.getvalue())
-            print(f"Die Datei '{dateiname}' wurde erfolgreich gespeichert.")
-        except IOError as e:
-            print(f"Fehler beim Speichern der Datei: {e}")
-
-        fp.name = f"ted_{pubnum}.json"
-        res_args = {
-            'package_id': pkg_id,
-            'name': fp.name,
-            'upload': fp,
-            'format': 'json',
-            'title': title_text
-        }
-        # prüfen, ob Resource schon da ist
-        existing = next((r for r in pkg.get('resources', []) if r['name'] == fp.name), None)
-        if existing:
-            return False
+        res_args = self._notice_resource('ted', pubnum, title_text)
+        return dataset_name, package, res_args
 
-        tk.get_action('resource_create')(self.context, res_args)
-        return True
+    def _publish_ted_notice(self, notice, state=None):
+        """
+        Publiziert eine Notice als Dataset plus Resource. Unveränderte Notices
+        (gleicher Content-Hash wie beim letzten Publizieren) lösen keinen
+        CKAN-Aufruf aus, geänderte werden gezielt aktualisiert.
+        """
+        return self._publish_notice(notice, self._ted_dataset, state)
+
+    def _publish_notice(self, item, build_fn, state=None):
+        """Einzelweg: Hash prüfen, Dataset bauen, anlegen bzw. aktualisieren."""
+        digest = content_hash(item)
+        if state and state.get('hash') == digest:
+            return 'skipped'
+        built = build_fn(item)
+        if built is None:
+            return False
+        name, package, resource = built
+        return self._publish_package(name, digest, state, package, resource)
 
-    def publish_ted_notices(self, file_path):
+    def _create_batch(self, items, build_fn, key_fn, report):
+        """
+        Bulk-Modus: legt neue Datasets mit eingebetteter Resource per
+        package_create an, alle in einer Transaktion (defer_commit); indexiert
+        werden sie erst in finish(). Schlägt der Batch fehl, wird er Notice für
+        Notice wiederholt.
+        """
+        from ckan import model
+        created = []
+        t0 = time.time()
+        try:
+            for item in items:
+                built = build_fn(item)
+                if built is None:
+                    report.record(key_fn(item), 'skipped')
+                    continue
+                name, package, resource = built
+                data = dict(self._package_fields(**package), name=name, owner_org=self.owner_org,
+                            private=False, resources=[resource])
+                pkg = tk.get_action('package_create')(dict(self._ctx(), defer_commit=True), data)
+                created.append((name, content_hash(item), pkg))
+            model.repo.commit()
+        except Exception as e:
+            model.Session.rollback()
+            log.warning(f"Bulk create of {len(items)} datasets failed ({e}), publishing them one by one")
+            self._publish_all(items, lambda i: self._publish_notice(i, build_fn), key_fn, report)
+            return
+
+        # Latenz pro Notice: Anteil am Batch
+        duration = (time.time() - t0) / max(1, len(created))
+        for name, digest, pkg in created:
+            self.name_index.add(name)
+            self._save_publish_state(name, digest, pkg['id'], pkg['resources'][0]['id'])
+            self._mark_unindexed(pkg['id'])
+            report.record(name, 'published', duration=duration)
+
+    def _publish_items(self, items, build_fn, key_fn, report):
+        """
+        Publiziert eine Seite bzw. einen Batch. Der Publish-Zustand wird mit
+        einer Abfrage geladen; im Bulk-Modus gehen neue Datasets gesammelt über
+        _create_batch, bekannte weiter über den (Patch-)Einzelweg.
+        """
+        states = self._load_publish_states(key_fn(i) for i in items)
+        new = []
+        if self.bulk:
+            known = []
+            for item in items:
+                key = key_fn(item)
+                (new if key not in states and key not in self.name_index else known).append(item)
+            items = known
+        with _deferred_indexing() if self.defer_indexing else nullcontext():
+            self._publish_all(items, lambda i: self._publish_notice(i, build_fn, states.get(key_fn(i))),
+                              key_fn, report)
+            for i in range(0, len(new), self.batch_size):
+                self._create_batch(new[i:i + self.batch_size], build_fn, key_fn, report)
+        return report
+
+    def _mark_unindexed(self, package_id):
+        """Merkt ein angelegtes/geändertes Paket für den Reindex in finish() vor."""
+        if self.defer_indexing:
+            with self._unindexed_lock:
+                self._unindexed[package_id] = True
+
+    def finish(self, on_progress=None):
+        """
+        Am Ende eines Laufs: die ohne Suchindex angelegten bzw. geänderten
+        Pakete indexieren, blockweise mit je einem Solr-Commit. Ein fehlerhafter
+        Block wird geloggt, die übrigen laufen weiter. on_progress(done, total)
+        wird nach jedem Block aufgerufen. Liefert die Dauer in Sekunden.
+        """
+        with self._unindexed_lock:
+            package_ids, self._unindexed = list(self._unindexed), {}
+        if not package_ids:
+            return 0.0
+        from ckan.lib import search
+        t0 = time.time()
+        done = failed = 0
+        for i in range(0, len(package_ids), self.reindex_batch_size):
+            chunk = package_ids[i:i + self.reindex_batch_size]
+            try:
+                search.rebuild(package_ids=chunk, defer_commit=True)
+                search.commit()
+            except Exception:
+                log.exception(f"Search reindex of {len(chunk)} datasets failed")
+                failed += len(chunk)
+            done += len(chunk)
+            if on_progress is not None:
+                on_progress(done, len(package_ids))
+        duration = time.time() - t0
+        log.info(f"Search reindex: {len(package_ids)} datasets, {failed} failed in {duration:.2f}s",
+                 extra={'datasets': len(package_ids), 'failed': failed, 'seconds': round(duration, 3)})
+        return duration
+
+    def _publish_one(self, publish_fn, key, item, report):
+        """
+        Publiziert ein Element unter dem Lock seines Dataset-Namens und trägt
+        das Ergebnis in den Report ein.
+        """
+        t0 = time.time()
+        try:
+            with self._name_lock(key):
+                status = publish_fn(item) or 'skipped'
+            report.record(key, status, duration=time.time() - t0)
+        except Exception as e:
+            self._error_log.log(log, logging.WARNING, type(e).__name__, "Error at Notice %s: %s", key, e,
+                                extra={'notice': key})
+            report.record(key, 'failed', e, duration=time.time() - t0)
+        finally:
+            if self.workers > 1:
+                # Worker-Threads geben ihre SQLAlchemy-Session wieder frei
+                from ckan import model
+                model.Session.remove()
+
+    def _publish_all(self, items, publish_fn, key_fn, report):
+        """
+        Publiziert alle Elemente sequentiell oder – bei workers > 1 – über einen
+        Thread-Pool. Ein Semaphor begrenzt die Zahl der offenen Futures, damit
+        ein großer Input nicht komplett in die Queue wandert.
+        """
+        if self.workers <= 1:
+            for item in items:
+                self._publish_one(publish_fn, key_fn(item), item, report)
+            return report
+
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix='ckan-publish') as executor:
+            for item in items:
+                in_flight.acquire()
+                future = executor.submit(self._publish_one, publish_fn, key_fn(item), item, report)
+                future.add_done_callback(lambda _: in_flight.release())
+        return report
+
+    def publish_ted_notices(self, file_path, report=None):
         """
         Liest eine TED-JSON-Datei ein, zerlegt sie in Notices und legt
-        je ein CKAN-Dataset pro Notice an.
+        je ein CKAN-Dataset pro Notice an. Liefert einen PublishReport;
+        ein übergebener Report wird fortgeschrieben (ein Report pro Lauf).
         """
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
 
         notices = data.get('notices', [])
-        print(f"Found {len(notices)} notices in {file_path}")
-        accepted = 0
-        for notice in notices:
-            pubnum = notice.get('publication-number', 'unknown')
-            try:
-                if self._publish_ted_notice(notice):
-                    accepted += 1
-            except Exception as e:
-                print(f"Error at Notice {pubnum}: {e}")
-        print(f"[INFO] {accepted} / {len(notices)} notices published.")
+        log.info(f"Found {len(notices)} notices in {file_path}")
+        return self.publish_ted_page(notices, report)
 
-    def _publish_bescha_notice(self, release):
+    def publish_ted_page(self, notices, report=None):
         """
-        Publiziert ein einzelnes OCDS-Release aus BeschA als eigenes Dataset.
+        Publiziert eine Liste von TED-Notices, z.B. eine einzelne Seite direkt
+        aus DataFetcher.iter_ted_pages.
         """
+        owned = report is None
+        report = report or PublishReport('TED')
+        key_fn = lambda n: f"ted-{n.get('publication-number', 'unknown')}"
+        self._publish_items(notices, self._ted_dataset, key_fn, report)
+        if owned:
+            log.info(report.summary())
+        return report
+
+    def _bescha_dataset(self, release):
+        """Baut aus einem OCDS-Release Dataset-Name, Paket-Felder und Resource."""
         # Eindeutige ID und Name
         rel_id = release.get('id') or release.get('ocid', 'unknown')
         dataset_name = f"bescha-{rel_id}"
@@ -199,42 +626,24 @@ class CkanPublisher:
             'date': date_only,
             'buyer': buyer
         }
-        # Package anlegen oder holen
-        pkg = self._get_or_create_package(
-            name=dataset_name,
-            title=title_text,
-            description=description,
-            tags=tags,
-            extras=extras
-        )
-        pkg_id = pkg['id']
+        package = dict(title=title_text, description=description, tags=tags, extras=extras)
 
         # Resource (JSON) erzeugen
-        notice_json = json.dumps(release, ensure_ascii=False, indent=2)
-        fp = io.BytesIO(notice_json.encode('utf-8'))
-        fp.name = f"bescha_{rel_id}.json"
-        res_args = {
-            'package_id': pkg_id,
-            'name': fp.name,
-            'upload': fp,
-            'format': 'json',
-            'title': title_text
-        }
-
-        # Prüfen, ob Resource schon existiert
-        existing = next((r for r in pkg.get('resources', []) if r['name'] == fp.name), None)
-        if existing:
-            return False
+        res_args = self._notice_resource('bescha', rel_id, title_text)
+        return dataset_name, package, res_args
 
-        # Anlegen
-        tk.get_action('resource_create')(self.context, res_args)
-        return True
+    def _publish_bescha_notice(self, release, state=None):
+        """
+        Publiziert ein einzelnes OCDS-Release aus BeschA als eigenes Dataset;
+        unveränderte Releases werden über den Content-Hash übersprungen.
+        """
+        return self._publish_notice(release, self._bescha_dataset, state)
 
 
-    def publish_bescha_notices(self, data):
+    def publish_bescha_notices(self, data, report=None):
         """
         Liest eine BeschA-JSON-Datei ein (mit OCDS 'releases') und legt
-        je ein CKAN-Dataset pro Release an.
+        je ein CKAN-Dataset pro Release an. Liefert einen PublishReport.
         """
 
         if isinstance(data, dict):
@@ -243,11 +652,12 @@ class CkanPublisher:
             # altes Verhalten: file_path einlesen
             with open(data, 'r', encoding='utf-8') as f:
                 obj = json.load(f)
-            releases = data.get('notices', []) or obj.get('notices') or []
-
-        count = 0
-        for rel in releases:
-            success = self._publish_bescha_notice(rel)
-            if success:
-                count += 1
-        print(f"[INFO] {count} / {len(releases)} BESCHA releases published.")
+            releases = obj.get('notices') or obj.get('releases') or []
+
+        owned = report is None
+        report = report or PublishReport('BESCHA')
+        key_fn = lambda r: f"bescha-{r.get('id') or r.get('ocid', 'unknown')}"
+        self._publish_items(releases, self._bescha_dataset, key_fn, report)
+        if owned:
+            log.info(report.summary())
+        return report
@@ -1,6 +1,6 @@
 from .CKANPublisher import CkanPublisher
 from .dataFetch import DataFetcher
 from .mongoWriter import MongoWriter
-from .cron_jobs import run_ted_cron_job, run_bescha_cron_job
+from .cron_jobs import run_ted_cron_job, run_ted_cron_job_for, run_bescha_cron_job_for
 from .plugin import DatamindsPlugin
 
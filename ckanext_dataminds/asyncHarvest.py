@@ -0,0 +1,391 @@
+import asyncio
+import contextlib
+import json
+import logging
+import tempfile
+import email.utils
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+try:
+    import aiohttp
+except ImportError:  # optional, nur für den Async-Modus nötig
+    aiohttp = None
+
+try:
+    import motor.motor_asyncio as motor_asyncio
+except ImportError:  # ohne motor laufen die Mongo-Writes im Thread-Pool
+    motor_asyncio = None
+
+from pymongo.errors import BulkWriteError
+
+from . import mongoPool
+from .CKANPublisher import PublishReport
+from .dataFetch import FetchError, token_rejected
+from .harvestLock import LeaseLost
+from .jobs import report_progress
+from .mongoWriter import MongoWriter, stored_query, upsert_ops, ted_key, bescha_key, content_hash
+
+log = logging.getLogger(__name__)
+
+# Längste Wartezeit, die ein Retry-After-Header erzwingen kann (s)
+MAX_RETRY_AFTER = 300
+
+
+def retry_after(value, default):
+    """
+    Wartezeit aus einem Retry-After-Header: Sekunden oder HTTP-Datum (RFC 9110).
+    Fehlt er oder ist er nicht lesbar, gilt default; höchstens MAX_RETRY_AFTER.
+    """
+    if not value:
+        return default
+    try:
+        wait = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        wait = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(0.0, wait), MAX_RETRY_AFTER)
+
+
+def parse_host_limits(value):
+    """
+    Liest Limits im Format "host:gleichzeitig[:anfragen_pro_sekunde] ..."
+    z.B. "api.ted.europa.eu:2:5 www.oeffentlichevergabe.de:4".
+    """
+    limits = {}
+    for item in (value or '').split():
+        parts = item.split(':')
+        host = parts[0]
+        concurrency = int(parts[1]) if len(parts) > 1 else 4
+        rate = float(parts[2]) if len(parts) > 2 else None
+        limits[host] = (concurrency, rate)
+    return limits
+
+
+class HostLimiter:
+    """
+    Begrenzt pro Host die gleichzeitigen Requests (Semaphore) und optional die
+    Requests pro Sekunde, indem Startzeitpunkte gleichmäßig verteilt werden.
+    """
+    def __init__(self, limits=None, default_concurrency=4):
+        self.limits = limits or {}
+        self.default_concurrency = default_concurrency
+        self._semaphores = {}
+        self._next_start = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host):
+        concurrency, rate = self.limits.get(host, (self.default_concurrency, None))
+        sem = self._semaphores.setdefault(host, asyncio.Semaphore(concurrency))
+        async with sem:
+            if rate:
+                loop = asyncio.get_running_loop()
+                now = loop.time()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + 1.0 / rate
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
+class AsyncDataFetcher:
+    """
+    Async-Variante des DataFetcher auf aiohttp: TED-Seiten und BeschA-Exporte
+    teilen sich eine ClientSession mit Keep-Alive, die Host-Limits werden über
+    einen HostLimiter durchgesetzt. Retries bei 429/5xx mit Backoff und Retry-After.
+    """
+    spool_max_bytes = 64 * 1024 * 1024
+    download_chunk_size = 256 * 1024
+    max_retries = 3
+
+    def __init__(self, fetcher, limiter, ted_timeout=30, bescha_timeout=120):
+        if aiohttp is None:
+            raise RuntimeError("The async harvest engine needs aiohttp (pip install aiohttp)")
+        # URLs, Payload und Export-Parsing kommen vom synchronen Fetcher
+        self.fetcher = fetcher
+        self.limiter = limiter
+        self.ted_timeout = aiohttp.ClientTimeout(total=ted_timeout)
+        self.bescha_timeout = aiohttp.ClientTimeout(total=bescha_timeout)
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            headers={'Accept-Encoding': 'gzip, deflate'})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _request(self, method, url, timeout, handle, **kwargs):
+        """Führt einen Request mit Host-Limit und Retries aus; handle(response) liefert das Ergebnis."""
+        host = urlparse(url).hostname
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self.limiter.slot(host):
+                    async with self.session.request(method, url, timeout=timeout, **kwargs) as r:
+                        if r.status in (429, 500, 502, 503, 504) and attempt < self.max_retries:
+                            wait = retry_after(r.headers.get('Retry-After'), 2 ** attempt)
+                            log.warning(f"{host} answered {r.status}, retry in {wait:.0f}s")
+                        else:
+                            r.raise_for_status()
+                            return await handle(r)
+            except aiohttp.ClientResponseError as e:
+                raise FetchError(f"{method} {url} failed: {e}", e.status) from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise FetchError(f"{method} {url} failed: {e}") from e
+                wait = 2 ** attempt
+                log.warning(f"{host} request failed ({e}), retry in {wait}s")
+            await asyncio.sleep(wait)
+
+    async def _read_json(self, r):
+        body = await r.read()
+        self.fetcher._count_bytes('ted', len(body))
+        return json.loads(body)
+
+    async def iter_ted_pages(self, checkpoint=None):
+        """Async-Generator über die TED-Seiten, mit demselben Checkpoint wie iter_ted_pages."""
+        self.fetcher.sync_api_spec()
+        query = self.fetcher.current_payload.get('query')
+        state = checkpoint.load(query) if checkpoint else None
+        next_token = state['next_token'] if state else None
+        page_no = state['pages'] if state else 0
+        resuming = bool(next_token)
+        while True:
+            payload = dict(self.fetcher.current_payload)
+            if next_token:
+                payload['nextToken'] = next_token
+            try:
+                data = await self._request('POST', self.fetcher.ted_api_url, self.ted_timeout,
+                                           self._read_json, json=payload)
+            except FetchError as e:
+                if resuming and token_rejected(e):
+                    log.warning(f"Checkpoint token rejected ({e.status}), restarting query from page 1")
+                    checkpoint.clear(query)
+                    next_token, page_no, resuming = None, 0, False
+                    continue
+                raise
+            resuming = False
+
+            page_no += 1
+            yield data.get('notices', [])
+
+            next_token = data.get('iterationNextToken')
+            if checkpoint:
+                if next_token:
+                    checkpoint.save(query, next_token, page_no)
+                else:
+                    checkpoint.clear(query)
+            if not next_token:
+                return
+
+    async def download_bescha_export(self, pub_day):
+        """Lädt den BeschA-Export eines Tages in einen SpooledTemporaryFile."""
+        parsed = urlparse(self.fetcher.bescha_api_url)
+        qs = parse_qs(parsed.query)
+        qs['pubDay'] = [pub_day]
+        qs['format'] = ['ocds.zip']
+        fetch_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path,
+                                parsed.params, urlencode(qs, doseq=True), parsed.fragment))
+
+        async def _spool(r):
+            buf = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)
+            async for chunk in r.content.iter_chunked(self.download_chunk_size):
+                buf.write(chunk)
+                self.fetcher._count_bytes('bescha', len(chunk))
+            buf.seek(0)
+            return buf
+
+        return await self._request('GET', fetch_url, self.bescha_timeout, _spool)
+
+
+class AsyncMongoWriter:
+    """
+    Upserts wie MongoWriter, aber awaitable: mit motor direkt im Event-Loop,
+    sonst über den synchronen MongoWriter in einem Worker-Thread. Der
+    motor-Client gehört zum Event-Loop des Laufs und wird mit dem
+    async-with-Block geschlossen.
+    """
+    def __init__(self):
+        self.sync_writer = MongoWriter()
+        self.client = None
+        self.db = None
+        if motor_asyncio is not None:
+            self.client = motor_asyncio.AsyncIOMotorClient(
+                mongoPool.mongo_uri(), **mongoPool._client_options())
+            self.db = self.client[self.sync_writer.db.name]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = self.db = None
+
+    async def _upsert(self, collection, docs, key_fn):
+        query = stored_query(docs, key_fn)
+        stored = await self.db[collection].find(*query).to_list(None) if query else []
+        ops = upsert_ops(docs, key_fn, stored)
+        if not ops:
+            return 0
+        try:
+            result = await self.db[collection].bulk_write(ops, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            log.warning(f"{len(details.get('writeErrors', []))} write errors in {collection}")
+        return details.get('nUpserted', 0) + details.get('nInserted', 0) + details.get('nModified', 0)
+
+    async def store_ted_notices(self, notices, source_file):
+        if self.db is None:
+            return await asyncio.to_thread(self.sync_writer.store_ted_notices, notices, source_file)
+        docs = [dict(n, source_file=source_file, content_hash=content_hash(n)) for n in notices]
+        return await self._upsert('ted_data', docs, ted_key) if docs else 0
+
+    async def store_bescha_releases(self, releases, source_file):
+        if self.db is None:
+            return await asyncio.to_thread(self.sync_writer.store_bescha_releases, releases, source_file)
+        docs = [dict(r, source_file=source_file, content_hash=content_hash(r)) for r in releases]
+        return await self._upsert('bescha_data', docs, bescha_key) if docs else 0
+
+
+def _next_batch(iterator, size):
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+async def harvest_ted(afetcher, writer, publisher, report, checkpoint, metrics, check=None):
+    """
+    TED-Seiten abrufen, je Seite speichern und (im Thread) in CKAN publizieren.
+    check() wird vor jeder Seite aufgerufen und bricht mit einer Exception ab
+    (z.B. LeaseLock.check bei verlorener Lease).
+    """
+    source_file = f"ted_async_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    pages = notice_count = 0
+    loop = asyncio.get_running_loop()
+    t = loop.time()
+    async for notices in afetcher.iter_ted_pages(checkpoint):
+        if check:
+            check()
+        metrics.add_phase('fetch', loop.time() - t)
+        t = loop.time()
+        metrics.incr('docs_written', await writer.store_ted_notices(notices, source_file) or 0)
+        metrics.add_phase('mongo', loop.time() - t)
+        t = loop.time()
+        failed_before = report.count('failed')
+        await asyncio.to_thread(publisher.publish_ted_page, notices, report)
+        metrics.add_phase('publish', loop.time() - t)
+        if checkpoint and report.count('failed') > failed_before:
+            # der Checkpoint geht trotzdem weiter, merkt sich aber den Fehler
+            await asyncio.to_thread(checkpoint.mark_failed, afetcher.fetcher.current_payload.get('query'))
+        pages += 1
+        notice_count += len(notices)
+        metrics.incr('pages')
+        metrics.incr('notices', len(notices))
+        report_progress(ted_pages=pages, ted_notices=notice_count)
+        t = loop.time()
+
+
+async def harvest_bescha_day(afetcher, writer, publisher, report, pub_day, batch_size, metrics, check=None,
+                             download_timeout=None):
+    """
+    Einen BeschA-Tag laden und die Releases in Batches speichern und publizieren.
+    download_timeout gilt nur für den Download: das Publizieren läuft in
+    Threads, die sich nicht abbrechen lassen, und wird deshalb abgewartet.
+    """
+    loop = asyncio.get_running_loop()
+    t = loop.time()
+    export = await asyncio.wait_for(afetcher.download_bescha_export(pub_day), timeout=download_timeout)
+    metrics.add_phase('fetch', loop.time() - t)
+    releases = afetcher.fetcher.iter_bescha_releases(export)
+    source_file = f"bescha_{pub_day}"
+    while True:
+        batch = await asyncio.to_thread(_next_batch, releases, batch_size)
+        if not batch:
+            return
+        if check:
+            check()
+        t = loop.time()
+        metrics.incr('docs_written', await writer.store_bescha_releases(batch, source_file) or 0)
+        metrics.add_phase('mongo', loop.time() - t)
+        t = loop.time()
+        await asyncio.to_thread(publisher.publish_bescha_notices, {'notices': batch}, report)
+        metrics.add_phase('publish', loop.time() - t)
+        metrics.incr('notices', len(batch))
+
+
+async def harvest_bescha(afetcher, writer, publisher, report, dates, days_in_flight, day_timeout,
+                         batch_size, metrics, on_day_done=None, check=None, on_day_failed=None):
+    """
+    Mehrere BeschA-Tage gleichzeitig, jeder Download mit eigenem Timeout.
+    on_day_done(pub_day) wird (im Thread) für jeden Tag aufgerufen, dessen
+    Releases vollständig publiziert wurden, on_day_failed(pub_day, fehler) für
+    jeden anderen; ein fehlgeschlagener Tag hält die übrigen nicht auf.
+    check() vor jedem Tag und Batch.
+    """
+    sem = asyncio.Semaphore(days_in_flight)
+    done = []
+    report_progress(bescha_days_total=len(dates), bescha_days_done=0)
+
+    async def _day(pub_day):
+        async with sem:
+            if check:
+                check()
+            day_report = PublishReport(report.source)
+            error = None
+            try:
+                await harvest_bescha_day(afetcher, writer, publisher, day_report, pub_day, batch_size, metrics,
+                                         check, download_timeout=day_timeout)
+            except asyncio.TimeoutError:
+                log.error(f"BESCHA download for {pub_day} timed out after {day_timeout}s")
+                error = FetchError(f"timed out after {day_timeout}s")
+            except FetchError as e:
+                log.error(f"BESCHA day {pub_day} could not be fetched: {e}")
+                error = e
+            except LeaseLost:
+                raise
+            except Exception as e:
+                # kaputter Export, Parser- oder Mongo-Fehler: nur dieser Tag
+                log.exception(f"BESCHA export for {pub_day} could not be processed")
+                metrics.incr('errors')
+                error = e
+            else:
+                metrics.incr('days')
+                failed = day_report.count('failed')
+                if failed:
+                    log.warning(f"BESCHA {pub_day} had failed releases, day stays pending")
+                    error = f"{failed} releases failed to publish"
+                elif on_day_done:
+                    await asyncio.to_thread(on_day_done, pub_day)
+            finally:
+                report.merge(day_report)
+            if error is not None:
+                metrics.incr('failed_days')
+                if on_day_failed:
+                    await asyncio.to_thread(on_day_failed, pub_day, error)
+            done.append(pub_day)
+            report_progress(bescha_days_done=len(done))
+
+    tasks = [asyncio.ensure_future(_day(d)) for d in dates]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # z.B. verlorene Lease: die übrigen Tage nicht unbeaufsichtigt weiterlaufen lassen
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
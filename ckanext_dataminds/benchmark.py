@@ -0,0 +1,586 @@
+"""
+Benchmark der Harvest-Pipeline mit lokalen Stand-ins: ein Fake-TED-Server mit
+iterationNextToken-Paging, ein Fake-BeschA-Server mit synthetischen OCDS-ZIPs,
+mongomock (oder ein lokaler mongod) und ein In-Memory-CKAN hinter
+tk.get_action. run_ted_cron_job_for und run_bescha_cron_job_for laufen
+unverändert; gemessen werden Durchsatz und Peak-RSS je Phase.
+mongomock sucht linear – für 10k/100k Notices einen mongod per --mongo-uri nutzen.
+
+    ckan dataminds benchmark --sizes 1000,10000 --output bench.json
+    python -m ckanext_dataminds.benchmark --baseline bench.json
+"""
+import io
+import os
+import gc
+import json
+import time
+import zipfile
+import logging
+import resource
+import tempfile
+import threading
+import collections
+import multiprocessing
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+import ckan.plugins.toolkit as tk
+
+from . import cron_jobs
+from . import dataFetch
+from . import mongoPool
+from . import mongoWriter
+from . import harvestLog
+from . import metrics as harvest_metrics
+from .CKANPublisher import CkanPublisher, exclusive_indexing
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SOURCES = ('ted', 'bescha')
+STAGES = ('fetch', 'mongo', 'publish', 'reindex')
+# Erster Tag der synthetischen Daten
+BENCH_DAY = "2024-01-15"
+# Releases je BeschA-Tag; größere Läufe verteilen sich auf mehrere Tage
+BESCHA_RELEASES_PER_DAY = 5000
+
+
+def ted_notice(i, day=BENCH_DAY):
+    """Synthetische TED-Notice Nr. i mit den Feldern des Standard-Payloads."""
+    return {
+        "publication-number": f"{i:08d}-2024",
+        "publication-date": f"{day}+01:00",
+        "title-proc": {"eng": f"Benchmark tender {i}: supply of technology services"},
+        "buyer-name": {"eng": [f"Benchmark buyer {i % 97}"]},
+        "links": {"html": {"ENG": f"https://ted.example/notice/{i:08d}-2024"}},
+    }
+
+
+def ocds_release(i, day=BENCH_DAY, padding=0):
+    """Synthetisches OCDS-Release Nr. i; padding Zeichen Beschreibung blähen es auf."""
+    ocid = f"ocds-bench-{i:08d}"
+    return {
+        "ocid": ocid,
+        "id": f"{ocid}-{day}",
+        "date": f"{day}T10:00:00Z",
+        "tag": ["tender"],
+        "buyer": {"id": f"buyer-{i % 53}", "name": f"Vergabestelle {i % 53}"},
+        "tender": {
+            "id": f"tender-{i}",
+            "title": f"Beschaffung Nr. {i}",
+            "description": "x" * padding,
+            "value": {"amount": 1000 + i, "currency": "EUR"},
+        },
+    }
+
+
+def _day(offset):
+    return (datetime.strptime(BENCH_DAY, "%Y-%m-%d") + timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+def bescha_days(size, per_day=BESCHA_RELEASES_PER_DAY):
+    """Verteilt size Releases auf Tage ab BENCH_DAY: {'YYYY-MM-DD': (erstes, anzahl)}."""
+    days = collections.OrderedDict()
+    start = 0
+    while start < size:
+        count = min(per_day, size - start)
+        days[_day(len(days))] = (start, count)
+        start += count
+    return days
+
+
+# --- Fake-Server ---------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, content_type, payload = getattr(self.server.app, method)(self.path, body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch('get')
+
+    def do_POST(self):
+        self._dispatch('post')
+
+
+def _json(status, data):
+    return status, 'application/json', json.dumps(data).encode('utf-8')
+
+
+class FakeTedServer:
+    """
+    TED-Suche: ein POST liefert limit Notices ab dem Offset aus nextToken und
+    iterationNextToken, solange noch Notices übrig sind. Die Query wird
+    ignoriert; es gibt immer total Notices. GET antwortet wie die echte API
+    mit 405 (ApiSpecMonitor).
+    """
+    path = "/v3/notices/search"
+
+    def __init__(self, total):
+        self.total = total
+
+    def get(self, path, body):
+        return _json(405, {"error": "Method Not Allowed"})
+
+    def post(self, path, body):
+        payload = json.loads(body or b'{}')
+        try:
+            offset = int(payload.get('nextToken') or 0)
+        except ValueError:
+            return _json(400, {"error": "invalid nextToken"})
+        limit = int(payload.get('limit') or 100)
+        end = min(self.total, offset + limit)
+        data = {"notices": [ted_notice(i) for i in range(offset, end)],
+                "totalNoticeCount": self.total}
+        if end < self.total:
+            data["iterationNextToken"] = str(end)
+        return _json(200, data)
+
+
+class FakeBeschaServer:
+    """
+    BeschA-Export: GET ?pubDay=YYYY-MM-DD liefert ein ZIP mit den Releases des
+    Tages, verteilt auf files JSON-Dateien im Release-Package-Format.
+    Unbekannte Tage geben 404.
+    """
+    path = "/api/notice-exports"
+
+    def __init__(self, days, padding=0, files=1):
+        self.days = days
+        self.padding = padding
+        self.files = max(1, files)
+
+    def get(self, path, body):
+        pub_day = parse_qs(urlparse(path).query).get('pubDay', [None])[0]
+        if pub_day not in self.days:
+            return _json(404, {"error": f"no export for {pub_day}"})
+        return 200, 'application/zip', self.export(pub_day)
+
+    def post(self, path, body):
+        return _json(405, {"error": "Method Not Allowed"})
+
+    def export(self, pub_day):
+        start, count = self.days[pub_day]
+        buf = io.BytesIO()
+        per_file = -(-count // self.files)
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+            for f, first in enumerate(range(start, start + count, per_file)):
+                releases = [ocds_release(i, pub_day, self.padding)
+                            for i in range(first, min(start + count, first + per_file))]
+                package = {"uri": f"https://bescha.example/{pub_day}/{f}.json",
+                           "publishedDate": f"{pub_day}T00:00:00Z",
+                           "releases": releases}
+                z.writestr(f"{pub_day}_{f}.json", json.dumps(package, ensure_ascii=False))
+        return buf.getvalue()
+
+
+def _serve(app, ready):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.app = app
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+@contextmanager
+def serve(app):
+    """
+    Startet app in einem eigenen Prozess, damit Antworten und deren Erzeugung
+    nicht in den RSS des gemessenen Harvests eingehen. Liefert die Endpunkt-URL.
+    """
+    ready = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_serve, args=(app, ready), daemon=True)
+    proc.start()
+    try:
+        port = ready.get(timeout=30)
+        yield f"http://127.0.0.1:{port}{app.path}"
+    finally:
+        proc.terminate()
+        proc.join(5)
+
+
+# --- CKAN-Stand-in -------------------------------------------------------------
+
+class FakeCkan:
+    """
+    In-Memory-Ersatz für die CKAN-Actions des Publishers mit Aufrufzähler und
+    Zeit je Action. latency simuliert die Antwortzeit einer echten Instanz.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.packages = {}
+        self.ids = {}
+        self.calls = collections.Counter()
+        self.seconds = collections.defaultdict(float)
+        self.reindexed = 0
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def get_action(self, name):
+        fn = getattr(self, f"_{name}", None)
+        if fn is None:
+            raise KeyError(f"Action {name} is not available in the benchmark")
+
+        def action(context, data_dict):
+            t0 = time.time()
+            try:
+                if self.latency:
+                    time.sleep(self.latency)
+                with self._lock:
+                    return fn(data_dict)
+            finally:
+                self.calls[name] += 1
+                self.seconds[name] += time.time() - t0
+        return action
+
+    def _next_id(self, prefix):
+        self._seq += 1
+        return f"{prefix}-{self._seq}"
+
+    def _resource(self, package_id, data):
+        return dict(data, id=self._next_id('res'), package_id=package_id)
+
+    def _package(self, ref):
+        pkg = self.packages.get(self.ids.get(ref, ref))
+        if pkg is None:
+            raise tk.ObjectNotFound(f"Package {ref} not found")
+        return pkg
+
+    def _package_list(self, data):
+        offset, limit = int(data.get('offset', 0)), int(data.get('limit', 1000))
+        return sorted(self.packages)[offset:offset + limit]
+
+    def _package_create(self, data):
+        name = data['name']
+        if name in self.packages:
+            raise tk.ValidationError({'name': ['That URL is already in use.']})
+        pkg = dict(data, id=self._next_id('pkg'))
+        pkg['resources'] = [self._resource(pkg['id'], r) for r in data.get('resources', [])]
+        self.packages[name] = pkg
+        self.ids[pkg['id']] = name
+        return pkg
+
+    def _package_show(self, data):
+        return self._package(data['id'])
+
+    def _package_patch(self, data):
+        pkg = self._package(data['id'])
+        pkg.update((k, v) for k, v in data.items() if k != 'id')
+        return pkg
+
+    def _resource_create(self, data):
+        pkg = self._package(data['package_id'])
+        res = self._resource(pkg['id'], data)
+        pkg['resources'].append(res)
+        return res
+
+    def _resource_patch(self, data):
+        for pkg in self.packages.values():
+            for res in pkg['resources']:
+                if res['id'] == data['id']:
+                    res.update(data)
+                    return res
+        raise tk.ObjectNotFound(f"Resource {data['id']} not found")
+
+    def _rebuild(self, package_ids=None, **kwargs):
+        self.reindexed += len(package_ids or ())
+
+    @contextmanager
+    def installed(self):
+        """tk.get_action sowie Commit und Suchindex (Bulk-/Defer-Modus) umleiten."""
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(tk, 'get_action', self.get_action))
+            stack.enter_context(mock.patch('ckan.model.repo.commit'))
+            stack.enter_context(mock.patch('ckan.model.Session.rollback'))
+            stack.enter_context(mock.patch('ckan.model.Session.remove'))
+            stack.enter_context(mock.patch('ckan.lib.search.rebuild', self._rebuild))
+            stack.enter_context(mock.patch('ckan.lib.search.commit'))
+            yield self
+
+
+# --- Messung -------------------------------------------------------------------
+
+def current_rss():
+    """Aktueller RSS des Prozesses in Bytes; ohne /proc der bisherige Höchstwert."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Höchster RSS des Prozesses in Bytes (ru_maxrss: Linux KiB, macOS Bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class StageTracker:
+    """
+    Ordnet RSS-Messungen den gerade aktiven Phasen zu. Ein Thread misst alle
+    interval Sekunden, zusätzlich wird beim Betreten und Verlassen einer Phase
+    gemessen. Phasen können sich überlappen (parallele BeschA-Downloads).
+    """
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.active = collections.Counter()
+        self.peaks = collections.defaultdict(int)
+        self.peak = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = current_rss()
+        with self._lock:
+            self.peak = max(self.peak, rss)
+            for stage, n in self.active.items():
+                if n and rss > self.peaks[stage]:
+                    self.peaks[stage] = rss
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            self.active[name] += 1
+        self.sample()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                self.active[name] -= 1
+
+    def wrap(self, name, fn):
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='bench-rss', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _stage_hooks(tracker):
+    """Patches, die die Einstiegspunkte jeder Phase in tracker.stage hüllen."""
+    hooks = [
+        (dataFetch.DataFetcher, '_post_ted', 'fetch'),
+        (dataFetch.DataFetcher, 'download_bescha_export', 'fetch'),
+        (mongoWriter.MongoWriter, 'store_ted_notices', 'mongo'),
+        (mongoWriter.MongoWriter, 'store_bescha_releases', 'mongo'),
+        (CkanPublisher, 'publish_ted_page', 'publish'),
+        (CkanPublisher, 'publish_bescha_notices', 'publish'),
+        (CkanPublisher, 'finish', 'reindex'),
+    ]
+    return [mock.patch.object(cls, attr, tracker.wrap(stage, getattr(cls, attr)))
+            for cls, attr, stage in hooks]
+
+
+@contextmanager
+def _config(values):
+    """Setzt Config-Werte für die Dauer des Laufs und stellt die alten wieder her."""
+    missing = object()
+    previous = {key: tk.config.get(key, missing) for key in values}
+    for key, value in values.items():
+        tk.config[key] = value
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is missing:
+                tk.config.pop(key, None)
+            else:
+                tk.config[key] = value
+
+
+@contextmanager
+def _mongo(mongo_uri, db):
+    """
+    Ohne mongo_uri mongomock statt MongoClient, sonst die angegebene Instanz.
+    Die Benchmark-Datenbank wird vorher und nachher verworfen.
+    """
+    with ExitStack() as stack:
+        if mongo_uri is None:
+            import mongomock
+            stack.enter_context(mock.patch.object(mongoPool, 'MongoClient', mongomock.MongoClient))
+            mongo_uri = "mongodb://dataminds-benchmark/"
+        mongoPool.close_clients()
+        mongoWriter._indexed_dbs.discard((mongo_uri, db))
+        mongoPool.get_client(mongo_uri).drop_database(db)
+        try:
+            yield mongo_uri
+        finally:
+            mongoPool.get_client(mongo_uri).drop_database(db)
+            mongoWriter._indexed_dbs.discard((mongo_uri, db))
+            mongoPool.close_clients()
+
+
+@contextmanager
+def _quiet():
+    """Während eines Laufs nur Warnungen und Fehler der Harvest-Jobs loggen."""
+    logger = logging.getLogger(harvestLog.LOGGER_NAME)
+    level = logger.level
+    logger.setLevel(max(logging.WARNING, logger.getEffectiveLevel()))
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def run_source(source, size, workdir, mongo_uri=None, overrides=None, padding=0,
+               per_day=BESCHA_RELEASES_PER_DAY, ckan_latency=0.0, verbose=False):
+    """
+    Ein Lauf von run_<source>_cron_job_for über size synthetische Notices.
+    Liefert Dauer, Durchsatz und Peak-RSS je Phase sowie die Zähler des Laufs.
+    mongomock hält die Daten im Prozess; realistische RSS-Werte der Phase
+    'mongo' gibt es nur mit mongo_uri (lokaler mongod).
+    """
+    days = bescha_days(size, per_day)
+    app = FakeTedServer(size) if source == 'ted' else FakeBeschaServer(days, padding)
+    db = f"dataminds_bench_{source}_{size}"
+    ckan = FakeCkan(latency=ckan_latency)
+    workdir = os.path.join(workdir, f"{source}_{size}")
+    os.makedirs(workdir, exist_ok=True)
+
+    with ExitStack() as stack:
+        url = stack.enter_context(serve(app))
+        mongo_uri = stack.enter_context(_mongo(mongo_uri, db))
+        stack.enter_context(_config(dict({
+            'dataminds.ted_api_url': url,
+            'dataminds.bescha_api_url': f"{url}?format=ocds.zip",
+            'dataminds.mongo_uri': mongo_uri,
+            'dataminds.mongo_db': db,
+            'dataminds.lock_backend': 'file',
+            'dataminds.lock_dir': os.path.join(workdir, 'locks'),
+            'dataminds.shared_package_index': 'false',
+        }, **(overrides or {}))))
+        stack.enter_context(mock.patch.object(cron_jobs, 'BASE_DIR', workdir))
+        stack.enter_context(ckan.installed())
+        stack.enter_context(exclusive_indexing())
+        tracker = stack.enter_context(StageTracker())
+        for patch in _stage_hooks(tracker):
+            stack.enter_context(patch)
+        if not verbose:
+            stack.enter_context(_quiet())
+
+        gc.collect()
+        rss_start = current_rss()
+        t0 = time.time()
+        if source == 'ted':
+            cron_jobs.run_ted_cron_job_for(BENCH_DAY, BENCH_DAY, force=True)
+        else:
+            first, last = next(iter(days)), next(reversed(days))
+            cron_jobs.run_bescha_cron_job_for(first, last, force=True)
+        duration = time.time() - t0
+        runs = harvest_metrics.recent_runs(source, limit=1, db=mongoPool.get_db())
+        dataFetch.stop_spec_monitor()
+        # der nächste Lauf hat einen neuen Stand-in-Port
+        dataFetch._spec_monitor = None
+
+    run = runs[0] if runs else {'phases': {}, 'counters': {}, 'latency': {}}
+    notices = run['counters'].get('notices', 0)
+    stages = {}
+    for stage in STAGES:
+        phase = run['phases'].get(stage)
+        if phase is None:
+            continue
+        stages[stage] = {
+            'seconds': phase['seconds'],
+            'calls': phase['calls'],
+            'per_s': round(notices / phase['seconds'], 1) if phase['seconds'] else None,
+            'peak_rss_mb': round(tracker.peaks.get(stage, 0) / 2 ** 20, 1),
+        }
+    return {
+        'source': source,
+        'size': size,
+        'duration_s': round(duration, 3),
+        'notices': notices,
+        'per_s': round(notices / duration, 1) if duration else None,
+        'rss_start_mb': round(rss_start / 2 ** 20, 1),
+        'peak_rss_mb': round(tracker.peak / 2 ** 20, 1),
+        'stages': stages,
+        'counters': run['counters'],
+        'latency': run['latency'],
+        'ckan_calls': dict(ckan.calls),
+        'ckan_seconds': {name: round(s, 3) for name, s in ckan.seconds.items()},
+        'reindexed': ckan.reindexed,
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, sources=SOURCES, workdir=None, **kwargs):
+    """run_source für jede Quelle und Größe; liefert die Ergebnisse als Liste."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="dataminds-bench-") as tmp:
+        for size in sizes:
+            for source in sources:
+                log.info(f"Benchmark {source} with {size} notices")
+                result = run_source(source, size, workdir or tmp, **kwargs)
+                log.info(f"Benchmark {source} {size}: {result['duration_s']:.2f}s, "
+                         f"{result['per_s']} notices/s, peak RSS {result['peak_rss_mb']} MB")
+                results.append(result)
+    return results
+
+
+def format_results(results):
+    """Ergebnistabelle: eine Zeile je Quelle, Größe und Phase."""
+    lines = [f"{'source':<8}{'size':>8}  {'stage':<9}{'seconds':>10}{'calls':>8}"
+             f"{'notices/s':>12}{'peak RSS MB':>13}"]
+    for r in results:
+        lines.append(f"{r['source']:<8}{r['size']:>8}  {'total':<9}{r['duration_s']:>10.2f}{'':>8}"
+                     f"{r['per_s'] or 0:>12.1f}{r['peak_rss_mb']:>13.1f}")
+        for stage, s in r['stages'].items():
+            lines.append(f"{'':<8}{'':>8}  {stage:<9}{s['seconds']:>10.2f}{s['calls']:>8}"
+                         f"{s['per_s'] or 0:>12.1f}{s['peak_rss_mb']:>13.1f}")
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Vergleicht mit einem früheren Ergebnis (Liste aus run_benchmark). Liefert
+    die Regressionen: Durchsatz mehr als tolerance unter bzw. Peak-RSS mehr
+    als tolerance über der Baseline, jeweils gesamt und je Phase.
+    """
+    previous = {(r['source'], r['size']): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r['source'], r['size']))
+        if base is None:
+            continue
+        pairs = [('total', r, base)] + [(stage, s, base['stages'][stage])
+                                        for stage, s in r['stages'].items() if stage in base['stages']]
+        label = f"{r['source']} {r['size']}"
+        for stage, now, then in pairs:
+            if then.get('per_s') and (now.get('per_s') or 0) < then['per_s'] * (1 - tolerance):
+                regressions.append(f"{label} {stage}: {now.get('per_s')} notices/s "
+                                   f"(baseline {then['per_s']})")
+        if base['peak_rss_mb'] and r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{label}: peak RSS {r['peak_rss_mb']} MB (baseline {base['peak_rss_mb']} MB)")
+    return regressions
+
+
+if __name__ == '__main__':
+    from .cli import benchmark
+    benchmark()
@@ -0,0 +1,86 @@
+import click
+
+
+@click.group(short_help="Dataminds harvest commands")
+def dataminds():
+    """Harvest-Befehle der Dataminds-Extension."""
+    pass
+
+
+@dataminds.command()
+@click.option('--once', is_flag=True, help="Nur einen Durchlauf ausführen und beenden")
+def scheduler(once):
+    """Scheduler für dataminds.ted_schedule / bescha_schedule im Vordergrund."""
+    from .scheduler import HarvestScheduler
+    sched = HarvestScheduler()
+    if once:
+        for source, next_run in sched.tick().items():
+            click.echo(f"{source}: next run {next_run.isoformat()}")
+        return
+    try:
+        sched.run_forever()
+    except KeyboardInterrupt:
+        sched.stop()
+
+
+@dataminds.command()
+@click.argument('source', type=click.Choice(['ted', 'bescha', 'all']))
+@click.option('--start-date', default=None, help="YYYY-MM-DD")
+@click.option('--end-date', default=None, help="YYYY-MM-DD")
+@click.option('--force', is_flag=True, help="Auch bereits erledigte Tage neu holen")
+def enqueue(source, start_date, end_date, force):
+    """Harvest für SOURCE in die Job-Queue stellen (ohne Datum: neue Tage)."""
+    from .jobs import enqueue_harvest
+    job = enqueue_harvest(source, start_date=start_date, end_date=end_date, force=force)
+    click.echo(f"Enqueued job {job.id}")
+
+
+@dataminds.command()
+def dedupe():
+    """Doppelte Notices/Releases in MongoDB entfernen und die Unique-Indexe anlegen."""
+    from . import mongoPool, mongoWriter
+    db = mongoPool.get_db()
+    for collection in mongoWriter.UNIQUE_INDEXES:
+        removed = mongoWriter.remove_duplicates(db, collection)
+        mongoWriter.create_unique_index(db, collection)
+        click.echo(f"{collection}: {removed} duplicates removed, unique index in place")
+
+
+@dataminds.command()
+@click.option('--sizes', default='1000,10000,100000', help="Notices je Lauf, kommagetrennt")
+@click.option('--source', type=click.Choice(['ted', 'bescha', 'all']), default='all')
+@click.option('--mongo-uri', default=None, help="Lokaler mongod statt mongomock")
+@click.option('--bescha-per-day', default=5000, help="Releases je BeschA-Tag")
+@click.option('--padding', default=0, help="Zusätzliche Zeichen je BeschA-Release")
+@click.option('--ckan-latency', default=0.0, help="Simulierte Dauer je CKAN-Action (s)")
+@click.option('--set', 'settings', multiple=True, help="Config für die Läufe, z.B. dataminds.bulk_publish=true")
+@click.option('--output', type=click.Path(), help="Ergebnisse als JSON schreiben")
+@click.option('--baseline', type=click.Path(exists=True), help="Mit früherem --output vergleichen")
+@click.option('--tolerance', default=0.25, help="Erlaubte Abweichung zur Baseline")
+@click.option('--verbose', is_flag=True, help="Info-Log der Harvest-Jobs anzeigen")
+def benchmark(sizes, source, mongo_uri, bescha_per_day, padding, ckan_latency, settings,
+              output, baseline, tolerance, verbose):
+    """Harvest-Benchmark gegen lokale TED-, BeschA-, Mongo- und CKAN-Stand-ins."""
+    import json
+    from . import benchmark as bench
+    overrides = dict(s.split('=', 1) for s in settings)
+    results = bench.run_benchmark(
+        sizes=[int(s) for s in sizes.split(',')],
+        sources=bench.SOURCES if source == 'all' else (source,),
+        mongo_uri=mongo_uri, overrides=overrides, padding=padding,
+        per_day=bescha_per_day, ckan_latency=ckan_latency, verbose=verbose)
+    click.echo(bench.format_results(results))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, encoding='utf-8') as f:
+            regressions = bench.compare_to_baseline(results, json.load(f), tolerance)
+        for line in regressions:
+            click.echo(f"[WARN] Regression: {line}", err=True)
+        if regressions:
+            raise SystemExit(1)
+
+
+def get_commands():
+    return [dataminds]
@@ -1,39 +1,77 @@
+import gzip
 import json
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import (Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify,
+                   send_from_directory, abort)
 import os
+import logging
 import ckan.plugins.toolkit as tk
-from .cron_jobs import run_ted_cron_job, run_ted_cron_job_for, run_bescha_cron_job_for
+from ckan import authz
+from pymongo.errors import PyMongoError
+from . import harvestLog, jobs, metrics, mongoPool, mongoWriter, profiling, scheduler
+
+log = logging.getLogger(__name__)
 
 # Define the blueprint with the template folder relative to this module
 dataminds_blueprint = Blueprint('dataminds', __name__, template_folder='templates/dataminds')
 
-# Path to the log file (adjust as necessary)
-LOG_FILE_PATH = '/var/log/ckan/ckanext_dataminds.log'
 BASE_DIR         = "/srv/app/ckanext_dataminds"
 SETTINGS_FILE    = os.path.join(BASE_DIR, "settings.json")
+# Notice-JSON erst ab dieser Größe (Bytes) komprimieren
+GZIP_MIN_SIZE    = 1024
+# Log im Admin-Panel: Einträge beim Laden und höchstens pro Poll des Live-Logs
+LOG_TAIL_ENTRIES = 50
+LOG_POLL_ENTRIES = 500
+# ohne Sysadmin-Recht erreichbar (öffentliche Notice-Ansicht)
+PUBLIC_ENDPOINTS = {'dataminds.notice'}
+
+@dataminds_blueprint.before_request
+def _require_sysadmin():
+    """
+    Alle Admin-Routen des Blueprints nur für Sysadmins; das /admin/-Präfix allein schützt nichts.
+    Scraper (Prometheus) melden sich mit dem API-Token eines Sysadmins im Authorization-Header an.
+    """
+    if request.endpoint in PUBLIC_ENDPOINTS:
+        return None
+    if not authz.is_sysadmin(getattr(tk.current_user, 'name', None)):
+        abort(403)
+    return None
+
+
+@dataminds_blueprint.before_app_request
+def _start_scheduler():
+    """
+    Startet den In-Process-Scheduler (dataminds.scheduler.enabled) beim ersten
+    Request – also nur in Web-Prozessen, nicht in CLI-Befehlen oder im RQ-Worker.
+    """
+    if tk.asbool(tk.config.get('dataminds.scheduler.enabled', False)):
+        scheduler.start_scheduler()
+
 
 @dataminds_blueprint.route('/admin/dataminds', methods=['GET'])
 def settings():
     """
     Render the settings page for the Dataminds plugin.
-    Displays current cron schedules, additional settings, and the last 50 log lines.
+    Displays current cron schedules, additional settings, and the last 50 log entries.
     """
 
-    # Read the log file and capture the last 50 lines
-    log_lines = []
-    if os.path.exists(LOG_FILE_PATH):
-        print("---------------------------------------------------LOG FILE EXISTS")
-        try:
-            with open(LOG_FILE_PATH, 'r') as log_file:
-                lines = log_file.readlines()
-                log_lines = [line.strip() for line in lines[-50:]]
-        except Exception as e:
-            flash(f"Error reading log file: {e}", "error")
+    # Last 50 entries of the structured log, read backwards from the end of the file
+    log_entries = []
+    try:
+        log_entries = harvestLog.tail(LOG_TAIL_ENTRIES)
+    except OSError as e:
+        flash(f"Error reading log file: {e}", "error")
     settings_data = load_settings()
+    try:
+        profiling_request = profiling.pending_request()
+    except PyMongoError as e:
+        log.warning(f"Could not read the profiling switch: {e}")
+        profiling_request = None
     # Render the settings template; note that the blueprint's template_folder is used, so use the template name directly.
     return render_template('settings.html', settings=settings_data,
-                           log_lines=log_lines)
+                           log_entries=log_entries, profiling_request=profiling_request,
+                           profiling_modes=profiling.MODES,
+                           log_follow=tk.asbool(tk.config.get('dataminds.log_follow', True)))
 
 @dataminds_blueprint.route('/admin/dataminds/update', methods=['POST'], endpoint='update_settings')
 def update_settings():
@@ -55,28 +93,158 @@ def update_settings():
     return redirect(url_for('dataminds.settings'))
 
 
-@dataminds_blueprint.route('/admin/dataminds/trigger/<source>')
+@dataminds_blueprint.route('/admin/dataminds/trigger/<source>', methods=['POST'])
 def trigger(source):
+    """
+    Stellt den Harvest für source in die Job-Queue und kehrt sofort zurück.
+    Nur per POST mit CSRF-Token (Formularfeld oder X-CSRFToken-Header).
+    Mit format=json (oder Accept: application/json) kommt die Job-ID als JSON,
+    mit force=true werden auch bereits erledigte Tage neu geholt.
+    """
     settings = load_settings()
-    # zuerst Query-Parameter, sonst zuletzt gespeicherte Werte
-    start = request.args.get('start_date') or settings.get(source, {}).get('start_date')
-    end   = request.args.get('end_date')   or settings.get(source, {}).get('end_date')
-
-    if source == 'ted':
-        run_ted_cron_job_for(start_date=start, end_date=end)
-        flash(f"Ted-Cron gestartet für {start or 'Vortag'} … {end or ''}", "success")
-    elif source == 'bescha':
-        run_bescha_cron_job_for(start_date=start, end_date=end)
-        flash("BeschA-Cron gestartet.", "success")
-    else:
+    # zuerst Formularfelder, sonst zuletzt gespeicherte Werte
+    start = request.form.get('start_date') or settings.get(source, {}).get('start_date')
+    end   = request.form.get('end_date')   or settings.get(source, {}).get('end_date')
+    wants_json = (request.form.get('format') == 'json'
+                  or request.accept_mimetypes.best == 'application/json')
+
+    try:
+        job = jobs.enqueue_harvest(source, start_date=start, end_date=end,
+                                   force=tk.asbool(request.form.get('force', False)))
+    except ValueError:
+        if wants_json:
+            return jsonify({'error': f"Unknown data source: {source}"}), 404
         flash("Unbekannte Datenquelle.", "error")
+        return redirect(url_for('dataminds.settings'))
 
+    if wants_json:
+        return jsonify({'job_id': job.id,
+                        'status_url': url_for('dataminds.job_status', job_id=job.id)}), 202
+    flash(f"{source.upper()}-Harvest für {start or 'Vortag'} … {end or ''} eingereiht (Job {job.id}).", "success")
     return redirect(url_for('dataminds.settings'))
 
+
+@dataminds_blueprint.route('/admin/dataminds/jobs', endpoint='job_list')
+def job_list():
+    """Letzte Harvest-Jobs der Queue mit Status und Fortschritt."""
+    return jsonify({'jobs': jobs.recent_jobs()})
+
+
+@dataminds_blueprint.route('/admin/dataminds/jobs/<job_id>', endpoint='job_status')
+def job_status(job_id):
+    """Status und Fortschritt (job.meta['progress']) eines Harvest-Jobs."""
+    status = jobs.get_job_status(job_id)
+    if status is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    return jsonify(status)
+
+@dataminds_blueprint.route('/dataminds/notice/<source>/<path:key>', endpoint='notice')
+def notice(source, key):
+    """
+    Notice-JSON aus MongoDB; Ziel der Notice-Resources in CKAN.
+    Der Content-Hash dient als ETag (If-None-Match -> 304), Clients mit
+    Accept-Encoding: gzip bekommen den Body komprimiert.
+    """
+    doc = mongoWriter.find_notice(mongoPool.get_db(), source, key)
+    if doc is None:
+        return jsonify({'error': f"Unknown notice: {source}/{key}"}), 404
+    # ältere Dokumente ohne gespeicherten Hash
+    etag = doc.pop('content_hash', None) or mongoWriter.content_hash(doc)
+
+    response = Response(mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    response.vary.add('Accept-Encoding')
+    if request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        return response
+
+    body = json.dumps(doc, ensure_ascii=False, default=str).encode('utf-8')
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=6)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_data(body)
+    return response
+
+@dataminds_blueprint.route('/admin/dataminds/metrics', endpoint='prometheus_metrics')
+def prometheus_metrics():
+    """Letzter Lauf je Quelle im Prometheus-Textformat (Phasen, Zähler, Latenzen)."""
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+
+@dataminds_blueprint.route('/admin/dataminds/metrics/runs', endpoint='metric_runs')
+def metric_runs():
+    """Letzte Läufe (optional ?source=ted&limit=30, höchstens 500) für die Trends im Admin-Panel."""
+    try:
+        limit = int(request.args.get('limit', 30))
+    except ValueError:
+        limit = 30
+    limit = max(1, min(limit, 500))
+    return jsonify({'runs': metrics.recent_runs(request.args.get('source'), limit)})
+
+@dataminds_blueprint.route('/admin/dataminds/profiling', methods=['POST'], endpoint='profiling_switch')
+def profiling_switch():
+    """Schalter im Admin-Panel: Profiling für den nächsten Harvest-Lauf an oder aus."""
+    try:
+        if request.form.get('enabled'):
+            mode = request.form.get('mode', 'sampling')
+            profiling.request_next_run(mode)
+            flash(f"Profiling ({mode}) für den nächsten Lauf aktiviert.", "success")
+        else:
+            profiling.cancel_next_run()
+            flash("Profiling für den nächsten Lauf deaktiviert.", "success")
+    except ValueError:
+        flash("Unbekannter Profiling-Modus.", "error")
+    except PyMongoError as e:
+        flash(f"Profiling-Schalter konnte nicht gespeichert werden: {e}", "error")
+    return redirect(url_for('dataminds.settings'))
+
+
+@dataminds_blueprint.route('/admin/dataminds/profiles', endpoint='profile_list')
+def profile_list():
+    """Vorhandene Profile (neueste zuerst) mit ihren Dateien."""
+    return jsonify({'profiles': profiling.list_profiles()})
+
+
+@dataminds_blueprint.route('/admin/dataminds/profiles/<filename>', endpoint='profile_download')
+def profile_download(filename):
+    """Download eines Profils: <source>_<task>.prof, .folded oder .json."""
+    if not profiling.PROFILE_FILE_RE.match(filename):
+        abort(404)
+    return send_from_directory(profiling.profile_dir(), filename, as_attachment=True)
+
+@dataminds_blueprint.route('/admin/dataminds/log/poll', endpoint='log_poll')
+def log_poll():
+    """
+    Live-Log als Short-Poll, optional gefiltert (?task=3&level=WARNING&source=ted).
+    Ohne gültigen cursor kommen die letzten passenden Einträge, sonst die neuen
+    Zeilen seit cursor; die Antwort enthält den cursor für den nächsten Aufruf.
+    """
+    if not tk.asbool(tk.config.get('dataminds.log_follow', True)):
+        abort(404)
+    task = request.args.get('task') or None
+    level = request.args.get('level') or None
+    source = request.args.get('source') or None
+    follower = harvestLog.LogFollower(cursor=request.args.get('cursor'))
+    try:
+        if follower.resumed:
+            matches = harvestLog.entry_filter(task, level, source)
+            entries = [e for e in map(harvestLog.parse_line, follower.read()) if matches(e)]
+            entries = entries[-LOG_POLL_ENTRIES:]
+        else:
+            entries = harvestLog.tail(LOG_TAIL_ENTRIES, task, level, source,
+                                      end=follower.offset if follower.cursor else None)
+    except OSError as e:
+        log.warning(f"Could not read the log: {e}")
+        entries = []
+    cursor = follower.cursor
+    follower.close()
+    return jsonify({'entries': entries, 'cursor': cursor, 'reset': not follower.resumed})
+
 def load_settings():
     defaults = {
-        "ted":   {"frequency": "daily", "start_date": "", "end_date": ""},
-        "bescha":{"frequency": "daily", "start_date": "", "end_date": ""}
+        "ted":   {"frequency": "cron", "start_date": "", "end_date": ""},
+        "bescha":{"frequency": "cron", "start_date": "", "end_date": ""}
     }
     if os.path.exists(SETTINGS_FILE):
         try:
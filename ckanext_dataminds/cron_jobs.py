@@ -3,28 +3,211 @@ import os
 import shutil
 import json
 import time
-import csv
+import collections
+import itertools
+import threading
 import concurrent.futures
-from datetime import datetime, timedelta
+from datetime import datetime
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from contextlib import contextmanager
 
+import ckan.plugins.toolkit as tk
+
 from . import dataFetch, DataFetcher
 from . import mongoWriter
 from . import CKANPublisher
+from . import harvestState
+from . import harvestLog
+from . import profiling
+from .metrics import RunMetrics
+from .jobs import report_progress
+from .harvestLock import LeaseLost, acquire_harvest_lock
 
 log = logging.getLogger(__name__)
 BASE_DIR = "/srv/app/ckanext_dataminds"
-TIMINGS_CSV = os.path.join(BASE_DIR, "timings.csv")
+# Releases pro Mongo-/CKAN-Batch beim Streamen eines BeschA-Exports
+BESCHA_BATCH_SIZE = 500
 
-def record_timing(task_num, phase, duration_s):
-    """Schreibt eine Zeile (task_num, phase, duration_s, timestamp) in TIMINGS_CSV."""
-    is_new = not os.path.exists(TIMINGS_CSV)
-    with open(TIMINGS_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if is_new:
-            writer.writerow(["task_num", "phase", "duration_s"])
-        writer.writerow([task_num, phase, f"{duration_s:.2f}"])
+def _package_name_index():
+    """
+    Namensindex für den CkanPublisher. Mit dataminds.shared_package_index = true
+    liegt er in CKANs Redis und wird von allen Workern gemeinsam genutzt.
+    """
+    redis_conn = None
+    if tk.asbool(tk.config.get('dataminds.shared_package_index', False)):
+        from ckan.lib.redis import connect_to_redis
+        redis_conn = connect_to_redis()
+    return CKANPublisher.PackageNameIndex(prefixes=('ted-', 'bescha-'), redis_conn=redis_conn)
+
+def _publish_workers():
+    """Anzahl paralleler CKAN-Publish-Worker (dataminds.publish_workers)."""
+    return tk.asint(tk.config.get('dataminds.publish_workers', 1))
+
+def _ckan_publisher(name_index=None):
+    """CkanPublisher für die Harvest-Jobs (Worker, Bulk-Modus aus der Config)."""
+    return CKANPublisher.CkanPublisher(
+        owner_org="publicai",
+        name_index=name_index or _package_name_index(),
+        workers=_publish_workers(),
+        bulk=tk.asbool(tk.config.get('dataminds.bulk_publish', False)),
+        batch_size=tk.asint(tk.config.get('dataminds.bulk_batch_size', 100)),
+        defer_indexing=tk.asbool(tk.config.get('dataminds.defer_indexing', False)),
+        reindex_batch_size=tk.asint(tk.config.get('dataminds.reindex_batch_size', 500)))
+
+def _finish_publisher(metrics, publisher):
+    """
+    Schließt den Lauf des Publishers ab: Reindex der ohne Suchindex
+    publizierten Pakete, mit Fortschritt im Job und Dauer als Phase 'reindex'.
+    """
+    try:
+        duration = publisher.finish(
+            on_progress=lambda done, total: report_progress(reindexed=done, reindex_total=total))
+    except Exception:
+        harvestLog.task_logger(log, metrics.source, metrics.task_num).exception(
+            "Search reindex after publishing failed")
+        metrics.incr('errors')
+        return
+    if duration:
+        metrics.add_phase('reindex', duration)
+
+def _write_publish_report(directory, task_num, report, tlog):
+    """Legt den Abschlussbericht eines Laufs als JSON neben dem Job-Counter ab."""
+    path = os.path.join(directory, f"publish_report_{task_num}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report.as_dict(), f, indent=2, ensure_ascii=False)
+    tlog.info(report.summary(), extra={'report': path})
+
+def _batched(iterable, size):
+    """Teilt einen Iterator in Listen mit höchstens size Elementen."""
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def _bescha_days_in_flight():
+    """Wie viele BeschA-Tage gleichzeitig geladen werden (dataminds.bescha_days_in_flight)."""
+    return max(1, tk.asint(tk.config.get('dataminds.bescha_days_in_flight', 3)))
+
+def _bescha_day_timeout():
+    """Timeout in Sekunden für den Download eines BeschA-Tages."""
+    return tk.asint(tk.config.get('dataminds.bescha_day_timeout', 600))
+
+def _timeout_setting(key, default):
+    """Timeout 'connect,read' (oder eine Zahl) aus der Config, in Sekunden."""
+    parts = [float(p) for p in str(tk.config.get(key, default)).split(',')]
+    return tuple(parts) if len(parts) == 2 else parts[0]
+
+def _data_fetcher():
+    """DataFetcher mit gepoolter Session, den konfigurierten API-URLs und Timeouts."""
+    return dataFetch.DataFetcher(
+        ted_api_url=tk.config.get('dataminds.ted_api_url', "https://api.ted.europa.eu/v3/notices/search"),
+        bescha_api_url=tk.config.get('dataminds.bescha_api_url',
+                                     "https://www.oeffentlichevergabe.de/api/notice-exports?format=ocds.zip"),
+        session=dataFetch.build_session(pool_maxsize=max(10, _bescha_days_in_flight())),
+        ted_timeout=_timeout_setting('dataminds.ted_timeout', '5,30'),
+        bescha_timeout=_timeout_setting('dataminds.bescha_timeout', '5,120'))
+
+def _max_window_days():
+    """Wie viele neue Tage ein inkrementeller Lauf höchstens holt."""
+    return max(1, tk.asint(tk.config.get('dataminds.scheduler.max_catchup_days', 7)))
+
+def _max_day_attempts():
+    """Nach wie vielen fehlgeschlagenen Läufen ein Tag aufgegeben wird."""
+    return max(1, tk.asint(tk.config.get('dataminds.max_day_attempts', harvestState.MAX_DAY_ATTEMPTS)))
+
+def _record_failure(state, days, error, initialize):
+    """
+    Zählt einen Fehlversuch für days (siehe HarvestState.mark_failed);
+    vorübergehende Abruffehler und eine verlorene Lease zählen nicht, ein
+    fehlender Export gibt den Tag sofort auf.
+    """
+    if isinstance(error, LeaseLost) or dataFetch.transient(error):
+        return []
+    return state.mark_failed(days, error, permanent=dataFetch.export_missing(error),
+                             max_attempts=_max_day_attempts(), initialize=initialize)
+
+def _harvest_days(state, start_date, end_date, force):
+    """
+    Zu verarbeitende Tage ('YYYY-MM-DD'): ohne Datum die neuen Tage seit der
+    High-Water-Mark, sonst der angegebene Bereich – jeweils ohne die Tage,
+    die schon erfolgreich publiziert wurden (außer mit force).
+    """
+    if not start_date and not end_date:
+        days = state.incremental_window(_max_window_days())
+    else:
+        days = harvestState.day_range(start_date or end_date, end_date or start_date)
+    return state.pending_days(days, force=force)
+
+def _release_after(lock, fn):
+    """
+    Wrappt fn so, dass der Harvest-Lock erst nach dem Ende von fn freigegeben wird.
+    fn bekommt den Lock und bricht mit lock.check() ab, wenn die Lease verloren ist.
+    """
+    def _run():
+        try:
+            return fn(lock)
+        finally:
+            lock.release()
+    return _run
+
+def _iter_bescha_days(fetcher, dates, in_flight, day_timeout, tlog=log):
+    """
+    Lädt die BeschA-Exporte für dates in einem Thread-Pool mit höchstens
+    in_flight Tagen gleichzeitig und liefert (pub_day, export, dauer, fehler) in
+    Datumsreihenfolge; export ist der gepufferte ZIP-Export des Tages.
+    Ein Tag, der fehlschlägt oder nicht innerhalb von day_timeout Sekunden
+    fertig ist, wird mit export=None und dem Fehler gemeldet. Die Frist läuft
+    erst, wenn ein Worker den Download beginnt – Wartezeit in der Queue zählt
+    nicht; ein überfälliger Download wird abgebrochen und gibt seinen Worker frei.
+    """
+    def _fetch(pub_day, job):
+        job['started_at'] = time.time()
+        job['started'].set()
+        _, export = fetcher.download_bescha_export(pub_day, cancel=job['cancel'])
+        return export, time.time() - job['started_at']
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=in_flight,
+                                                 thread_name_prefix='bescha-fetch')
+    pending = collections.deque()
+    days = iter(dates)
+
+    def _submit_next():
+        d = next(days, None)
+        if d is not None:
+            pub_day = d.strftime("%Y-%m-%d")
+            tlog.debug(f"Fetching BESCHA for pubDay={pub_day}", extra={'day': pub_day})
+            job = {'started': threading.Event(), 'started_at': None, 'cancel': threading.Event()}
+            pending.append((pub_day, job, pool.submit(_fetch, pub_day, job)))
+
+    try:
+        for _ in range(in_flight):
+            _submit_next()
+        while pending:
+            pub_day, job, future = pending.popleft()
+            job['started'].wait()
+            remaining = max(0.0, job['started_at'] + day_timeout - time.time())
+            error = None
+            try:
+                export, duration = future.result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                job['cancel'].set()
+                tlog.error(f"BESCHA download for {pub_day} timed out after {day_timeout}s", extra={'day': pub_day})
+                error = dataFetch.FetchError(f"timed out after {day_timeout}s")
+            except dataFetch.FetchError as e:
+                tlog.error(f"BESCHA download for {pub_day} failed: {e}", extra={'day': pub_day})
+                error = e
+            except Exception as e:
+                tlog.exception(f"BESCHA download for {pub_day} failed", extra={'day': pub_day})
+                error = e
+            if error is not None:
+                export, duration = None, time.time() - job['started_at']
+            # Nächsten Tag nachschieben, bevor dieser Tag weiterverarbeitet wird
+            _submit_next()
+            yield pub_day, export, duration, error
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 def run_ted_cron_job():
     job_start   = time.time()
@@ -32,258 +215,432 @@ def run_ted_cron_job():
     os.makedirs(ted_dir, exist_ok=True)
     counter_file= os.path.join(ted_dir, "ted_job_counter.txt")
     task_num    = _next_counter(counter_file)
-    lock_file   = os.path.join(ted_dir, "ted_cron_job.lock")
+    metrics     = RunMetrics("ted", task_num, mode="legacy")
+    tlog        = harvestLog.task_logger(log, "ted", task_num)
 
-    def _job():
+    def _job(lock):
         """Der komplette Job, den wir im Worker-Thread ausführen."""
-        if os.path.exists(lock_file):
-            print(f"[Task {task_num}] TED Job already running – waiting...")
-            while os.path.exists(lock_file):
-                time.sleep(1)
-        print("------------------------------------------------")
-        print(f"[Task {task_num}] Starting job at {datetime.now().isoformat()}")
-        with open(lock_file, "w") as f:
-            f.write(str(datetime.now()))
+        tlog.info("Starting job")
 
         # 1) Fetch Data
-        t0 = time.time()
-        fetcher = dataFetch.DataFetcher(
-            ted_api_url="https://api.ted.europa.eu/v3/notices/search",
-            bescha_api_url="https://www.oeffentlichevergabe.de/api/notice-exports"
-        )
-        ted_data = fetcher.fetch_ted_data()
-        print(f"[TIME] fetch_ted_data: {time.time() - t0:.2f}s")
+        fetcher = _data_fetcher()
+        with metrics.span("fetch"):
+            ted_data = fetcher.fetch_ted_data()
+        metrics.incr("bytes_downloaded", fetcher.bytes_downloaded["ted"])
         if not ted_data:
-            log.error(f"[Task {task_num}] TED-Data could not be fetched.")
+            tlog.error("TED-Data could not be fetched.")
+            metrics.incr("errors")
             return
+        metrics.incr("notices", len(ted_data.get("notices", [])))
 
         # 2) Store to JSON
-        t1 = time.time()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"ted_data_{timestamp}.json"
-        file_path= os.path.join(ted_dir, filename)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(ted_data, f, indent=2, ensure_ascii=False)
-        print(f"[TIME] store_ted_data: {time.time() - t1:.2f}s")
+        with metrics.span("store_json"):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"ted_data_{timestamp}.json"
+            file_path= os.path.join(ted_dir, filename)
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(ted_data, f, indent=2, ensure_ascii=False)
 
         # 3) Save to Mongo
-        t2 = time.time()
-        mongo = mongoWriter.MongoWriter(
-            mongo_uri="mongodb://mongodb:27017/",
-            db_name="ckan_mongo"
-        )
-        mongo.store_ted_data(file_path)
-        print(f"[TIME] save_to_mongo: {time.time() - t2:.2f}s")
+        lock.check()
+        with metrics.span("mongo"):
+            mongo = mongoWriter.MongoWriter()
+            mongo.store_ted_data(file_path)
 
         # 4) Publish to CKAN
-        t3 = time.time()
-        publisher = CKANPublisher.CkanPublisher(
-            mongo_uri="mongodb://mongodb:27017/",
-            db_name="ckan_mongo",
-            owner_org="publicai")
-        publisher.publish_ted_notices(file_path)
-        print(f"[TIME] publish_to_ckan: {time.time() - t3:.2f}s")
+        lock.check()
+        with metrics.span("publish"):
+            publisher = CKANPublisher.CkanPublisher(
+                owner_org="publicai",
+                name_index=_package_name_index())
+            report = publisher.publish_ted_notices(file_path)
+        metrics.add_report(report)
+
+    # Läuft der TED-Job schon (auch in einem anderen Container), warten bzw. überspringen
+    lock = acquire_harvest_lock("ted")
+    if lock is None:
+        tlog.warning("TED Job already running – skipped")
+        return
 
     # Starte den Job in einem Worker-Thread mit Timeout
+    profiler = profiling.for_run("ted", task_num)
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_job)
+        with harvestLog.run_context("ted", task_num), profiler, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_release_after(lock, profiler.wrap(_job)))
             # Timeout in Sekunden, z.B. 600 = 10 Minuten
             future.result(timeout=600)
     except concurrent.futures.TimeoutError:
-        log.error(f"[Task {task_num}] TED Cron Job timed out after 600s")
-        print(f"[Task {task_num}] Aborted: timeout")
+        tlog.error("TED Cron Job timed out after 600s")
+    except LeaseLost as e:
+        tlog.error(f"TED job aborted: {e}")
+        metrics.incr("errors")
     except Exception:
-        log.exception(f"[Task {task_num}] TED job failed")
-        print(f"[Task {task_num}] Failed")
+        tlog.exception("TED job failed")
+        metrics.incr("errors")
     finally:
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
+        metrics.save()
         total = time.time() - job_start
-        print(f"[Task {task_num}] Done – total time: {total:.2f}s")
-        print("------------------------------------------------")
+        tlog.info(f"Done – total time: {total:.2f}s", extra={'seconds': round(total, 2)})
 
-def run_ted_cron_job_for(start_date=None, end_date=None):
+def run_ted_cron_job_for(start_date=None, end_date=None, force=False):
+    """
+    Holt die TED-Notices für den Bereich (YYYY-MM-DD), ohne Angabe alle neuen
+    publication-dates seit der High-Water-Mark. Bereits erfolgreich
+    publizierte Tage werden übersprungen, außer mit force=True.
+    """
     job_start   = time.time()
     ted_dir     = os.path.join(BASE_DIR, "TED")
-    print(f"[DEBUG] start_date from frontend: {start_date}, end_date from frontend: {end_date}")
-    if not start_date and not end_date:
-        yesterday = datetime.now() - timedelta(days=1)
-        start = end = yesterday.strftime("%Y%m%d")
-    else:
-      # aus Admin-Panel übergeben
-        start = start_date.replace('-', '')
-        end = end_date.replace('-', '')
-    print(f"[INFO] Fetching TED notices from {start} to {end}  (format YYYYMMDD)")
-
-    date_query = f"(publication-date>={start} AND publication-date<={end})"
+    log.debug(f"TED run requested for {start_date}..{end_date}", extra={'source': 'ted'})
+    state = harvestState.HarvestState("ted")
+    incremental = not start_date and not end_date
+    days = _harvest_days(state, start_date, end_date, force)
+    if not days:
+        log.info(f"TED: nothing new to fetch (high-water mark {state.high_water_mark()})", extra={'source': 'ted'})
+        return
+    ranges = harvestState.contiguous_ranges(days)
 
     os.makedirs(ted_dir, exist_ok=True)
     counter_file= os.path.join(ted_dir, "ted_job_counter.txt")
     task_num    = _next_counter(counter_file)
-    lock_file   = os.path.join(ted_dir, "ted_cron_job.lock")
+    metrics     = RunMetrics("ted", task_num)
+    tlog        = harvestLog.task_logger(log, "ted", task_num)
 
-    def _job():
+    def _job(lock):
         """Der komplette Job, den wir im Worker-Thread ausführen."""
-        if os.path.exists(lock_file):
-            print(f"[Task {task_num}] TED Job already running – warte …")
-            while os.path.exists(lock_file):
-                time.sleep(1)
-        print("------------------------------------------------")
-        print(f"[Task {task_num}] Starting job at {datetime.now().isoformat()}")
-        with open(lock_file, "w") as f:
-            f.write(str(datetime.now()))
-
-        # 1) Fetch Data
-        t0 = time.time()
-        fetcher = dataFetch.DataFetcher()
-        fetcher.current_payload['query'] = date_query
-        ted_data = fetcher.fetch_ted_data()
-
-        duration = time.time() - t0
-        print(f"[TIME] fetch_ted_data: {duration:.2f}s")
-        record_timing(task_num, "fetch_ted", duration)
-
-        if not ted_data:
-            log.error(f"[Task {task_num}] TED-Data could not be fetched.")
-            return
-
-        # 2) Store to JSON
-        t1 = time.time()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"ted_data_{timestamp}.json"
-        file_path= os.path.join(ted_dir, filename)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(ted_data, f, indent=2, ensure_ascii=False)
-        duration = time.time() - t1
-        print(f"[TIME] store_ted_data: {duration:.2f}s")
-        record_timing(task_num, "store_ted_data", duration)
-
-        # 3) Save to MongoDB
-        t2 = time.time()
-        mongo = mongoWriter.MongoWriter(
-            mongo_uri="mongodb://mongodb:27017/",
-            db_name="ckan_mongo"
-        )
-        mongo.store_ted_data(file_path)
-        duration = time.time() - t2
-        print(f"[TIME] save_to_mongo: {duration:.2f}s")
-        record_timing(task_num, "save_to_mongo", duration)
-
-        # 4) Publish to CKAN
-        t3 = time.time()
-        publisher = CKANPublisher.CkanPublisher(
-            mongo_uri="mongodb://mongodb:27017/",
-            db_name="ckan_mongo",
-            owner_org="publicai")
-        publisher.publish_ted_notices(file_path)
-        duration = time.time() - t3
-        print(f"[TIME] publish_to_ckan: {duration:.2f}s")
-        record_timing(task_num, "publish_to_ckan", duration)
+        tlog.info(f"Starting job: TED notices for {', '.join(f'{a}..{b}' for a, b in ranges)}")
+
+        # Seiten werden direkt nach dem Abruf in Mongo gespeichert und in CKAN
+        # publiziert – keine Zwischendatei, Speicherbedarf bleibt pro Seite.
+        fetcher = _data_fetcher()
+        mongo = mongoWriter.MongoWriter()
+        publisher = _ckan_publisher()
+        report = CKANPublisher.PublishReport('TED')
+        source_file = f"ted_stream_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        page_no = notice_count = 0
+        # Fortschritt pro Query, damit ein abgebrochener Lauf weitermachen kann
+        checkpoint = dataFetch.TedCheckpoint(os.path.join(ted_dir, "ted_checkpoint.json"))
+
+        try:
+            # Ein Query pro zusammenhängendem Bereich noch offener Tage
+            for range_start, range_end in ranges:
+                fetcher.current_payload['query'] = (
+                    f"(publication-date>={range_start.replace('-', '')} "
+                    f"AND publication-date<={range_end.replace('-', '')})")
+                failed_before = report.count('failed')
+                # Seiten mit Fehlern, die ein früherer Lauf schon hinter sich gelassen hat
+                skipped_failures = checkpoint.had_failures(fetcher.current_payload['query'])
+                t0 = time.time()
+                try:
+                    for page_notices in fetcher.iter_ted_pages(checkpoint=checkpoint):
+                        lock.check()
+                        page_no += 1
+                        metrics.add_phase("fetch", time.time() - t0)
+
+                        # 1) Save page to MongoDB
+                        with metrics.span("mongo"):
+                            metrics.incr("docs_written", mongo.store_ted_notices(page_notices, source_file))
+
+                        # 2) Publish page to CKAN
+                        page_failed_before = report.count('failed')
+                        with metrics.span("publish"):
+                            publisher.publish_ted_page(page_notices, report=report)
+                        if report.count('failed') > page_failed_before:
+                            # der Checkpoint geht trotzdem weiter, merkt sich aber den Fehler
+                            checkpoint.mark_failed(fetcher.current_payload['query'])
+                        tlog.info(f"TED page {page_no}: {len(page_notices)} notices processed",
+                                  extra={'page': page_no, 'notices': len(page_notices)})
+                        notice_count += len(page_notices)
+                        metrics.incr("pages")
+                        metrics.incr("notices", len(page_notices))
+                        report_progress(task=task_num, pages=page_no, notices=notice_count)
+                        t0 = time.time()
+                except dataFetch.FetchError as e:
+                    tlog.error(f"TED-Data for {range_start}..{range_end} could not be fetched: {e}")
+                    metrics.incr("errors")
+                    _record_failure(state, harvestState.day_range(range_start, range_end), e, incremental)
+                    continue
+                # 3) Tage nur als erledigt markieren, wenn alle Notices publiziert wurden
+                failed = report.count('failed') - failed_before
+                if failed or skipped_failures:
+                    tlog.warning(f"TED {range_start}..{range_end} had failed notices, days stay pending")
+                    _record_failure(state, harvestState.day_range(range_start, range_end),
+                                    f"{failed} notices failed to publish"
+                                    + (" (and on pages of an earlier run)" if skipped_failures else ""),
+                                    incremental)
+                    continue
+                state.mark_done(harvestState.day_range(range_start, range_end), initialize=incremental)
+        finally:
+            _finish_publisher(metrics, publisher)
+            metrics.add_report(report)
+            metrics.incr("bytes_downloaded", fetcher.bytes_downloaded["ted"])
+            _write_publish_report(ted_dir, task_num, report, tlog)
+
+    lock = acquire_harvest_lock("ted")
+    if lock is None:
+        tlog.warning("TED Job already running – skipped")
+        return
 
     # Starte den Job in einem Worker-Thread mit Timeout
+    profiler = profiling.for_run("ted", task_num)
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_job)
+        with harvestLog.run_context("ted", task_num), profiler, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_release_after(lock, profiler.wrap(_job)))
             future.result(timeout=600)
     except concurrent.futures.TimeoutError:
-        log.error(f"[Task {task_num}] TED Cron Job timed out after 600s")
-        print(f"[Task {task_num}] Aborted: timeout")
+        tlog.error("TED Cron Job timed out after 600s")
+    except LeaseLost as e:
+        tlog.error(f"TED job aborted: {e}")
+        metrics.incr("errors")
     except Exception:
-        log.exception(f"[Task {task_num}] TED job failed")
-        print(f"[Task {task_num}] Failed")
+        tlog.exception("TED job failed")
+        metrics.incr("errors")
     finally:
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
+        metrics.save()
         total_duration = time.time() - job_start
-        record_timing(task_num, "total_job_time", total_duration)
-        print(f"[Task {task_num}] Done – total time: {total_duration:.2f}s")
-        print("------------------------------------------------")
+        tlog.info(f"Done – total time: {total_duration:.2f}s", extra={'seconds': round(total_duration, 2)})
 
 
 
-def run_bescha_cron_job_for(start_date=None, end_date=None):
+def run_bescha_cron_job_for(start_date=None, end_date=None, force=False):
     """
     Holt für den angegebenen Datumsbereich (YYYY-MM-DD) die BESCHA-OCIDS-ZIPs,
-    entpackt, speichert sie und publisht sie in CKAN.
+    entpackt, speichert sie und publisht sie in CKAN. Ohne Angabe werden alle
+    neuen pubDays seit der High-Water-Mark geholt; bereits erfolgreich
+    publizierte Tage werden übersprungen, außer mit force=True.
     """
     job_start = time.time()
     bescha_dir = os.path.join(BASE_DIR, "BESCHA")
     os.makedirs(bescha_dir, exist_ok=True)
     counter_file = os.path.join(bescha_dir, "bescha_job_counter.txt")
     task_num = _next_counter(counter_file)
-    lock_file = os.path.join(bescha_dir, "bescha_cron_job.lock")
-
-    # 1. Datum bestimmen
-    if not start_date or not end_date:
-        yesterday = datetime.now() - timedelta(days=1)
-        dates = [yesterday]
-    else:
-        # strings "YYYY-MM-DD" in datetime-Objekte und dann Liste aller Tage
-        sd = datetime.strptime(start_date, "%Y-%m-%d")
-        ed = datetime.strptime(end_date,   "%Y-%m-%d")
-        num_days = (ed - sd).days
-        dates = [sd + timedelta(days=i) for i in range(num_days + 1)]
-
-    print(f"[DEBUG] BESCHA run_for dates: {[d.strftime('%Y-%m-%d') for d in dates]}")
-
-    def _job():
-        if os.path.exists(lock_file):
-            print(f"[Task {task_num}] BESCHA Job already running – waiting…")
-            while os.path.exists(lock_file):
-                time.sleep(1)
-        with open(lock_file, "w") as f:
-            f.write(datetime.now().isoformat())
-        print("------------------------------------------------")
-        print(f"[Task {task_num}] Starting BESCHA job at {datetime.now().isoformat()}")
-
-        for d in dates:
-            pub_day = d.strftime("%Y-%m-%d")
-            print(f"[INFO] Fetching BESCHA for pubDay={pub_day}")
+    metrics = RunMetrics("bescha", task_num)
+    tlog = harvestLog.task_logger(log, "bescha", task_num)
+
+    # 1. Datum bestimmen: neue bzw. noch nicht erledigte Tage
+    state = harvestState.HarvestState("bescha")
+    incremental = not start_date and not end_date
+    days = _harvest_days(state, start_date, end_date, force)
+    if not days:
+        tlog.info(f"BESCHA: nothing new to fetch (high-water mark {state.high_water_mark()})")
+        return
+    dates = [datetime.strptime(d, "%Y-%m-%d") for d in days]
+
+    def _job(lock):
+        tlog.info(f"Starting BESCHA job for {days[0]}..{days[-1]}", extra={'days': len(days)})
+
+        # Ein Publisher für alle Tage, damit der Namensindex nur einmal geladen wird
+        publisher = _ckan_publisher()
+        report = CKANPublisher.PublishReport('BESCHA')
+
+        mongo = mongoWriter.MongoWriter()
+        fetcher = _data_fetcher()
+        days_done = release_count = 0
+        failed_days = []
+        report_progress(task=task_num, days_total=len(dates), days_done=0, releases=0)
+
+        # Downloads laufen parallel, Mongo und CKAN verarbeiten die Tage in Reihenfolge.
+        # Die Releases eines Tages werden in Batches aus dem ZIP gestreamt.
+        for pub_day, export, duration, error in _iter_bescha_days(
+                fetcher, dates, _bescha_days_in_flight(), _bescha_day_timeout(), tlog):
+            lock.check()
+            metrics.add_phase("fetch", duration)
+            if export is None:
+                tlog.error(f"BESCHA-Data for {pub_day} could not be fetched.", extra={'day': pub_day})
+                metrics.incr("errors")
+                days_done += 1
+                failed_days.append(pub_day)
+                _record_failure(state, [pub_day], error, incremental)
+                report_progress(days_done=days_done, failed_days=failed_days)
+                continue
+
+            source_file = f"bescha_{pub_day}"
+            mongo_s = publish_s = 0.0
+            failed_before = report.count('failed')
+            try:
+                for batch in _batched(fetcher.iter_bescha_releases(export), BESCHA_BATCH_SIZE):
+                    lock.check()
+                    # Mongo speichern
+                    t1 = time.time()
+                    metrics.incr("docs_written", mongo.store_bescha_releases(batch, source_file))
+                    mongo_s += time.time() - t1
+
+                    # CKAN publizieren
+                    t2 = time.time()
+                    publisher.publish_bescha_notices({'notices': batch}, report=report)
+                    publish_s += time.time() - t2
+                    release_count += len(batch)
+                    metrics.incr("notices", len(batch))
+                    report_progress(current_day=pub_day, releases=release_count)
+            except LeaseLost:
+                raise
+            except Exception as e:
+                tlog.exception(f"BESCHA export for {pub_day} could not be processed", extra={'day': pub_day})
+                metrics.incr("errors")
+                failed_days.append(pub_day)
+                _record_failure(state, [pub_day], e, incremental)
+            else:
+                # Tag nur als erledigt markieren, wenn alle Releases publiziert wurden
+                failed = report.count('failed') - failed_before
+                if failed:
+                    tlog.warning(f"BESCHA {pub_day} had failed releases, day stays pending", extra={'day': pub_day})
+                    failed_days.append(pub_day)
+                    _record_failure(state, [pub_day], f"{failed} releases failed to publish", incremental)
+                else:
+                    state.mark_done([pub_day], initialize=incremental)
+            tlog.info(f"BESCHA {pub_day}: fetch {duration:.2f}s, mongo {mongo_s:.2f}s, publish {publish_s:.2f}s",
+                      extra={'day': pub_day, 'fetch_s': round(duration, 3),
+                             'mongo_s': round(mongo_s, 3), 'publish_s': round(publish_s, 3)})
+            metrics.add_phase("mongo", mongo_s)
+            metrics.add_phase("publish", publish_s)
+            metrics.incr("days")
+            days_done += 1
+            report_progress(days_done=days_done)
+
+        _finish_publisher(metrics, publisher)
+        metrics.add_report(report)
+        metrics.incr("failed_days", len(failed_days))
+        metrics.incr("bytes_downloaded", fetcher.bytes_downloaded["bescha"])
+        _write_publish_report(bescha_dir, task_num, report, tlog)
+
+    lock = acquire_harvest_lock("bescha")
+    if lock is None:
+        tlog.warning("BESCHA Job already running – skipped")
+        return
+
+    # Kein globales Timeout mehr: jeder Tag hat sein eigenes (dataminds.bescha_day_timeout)
+    profiler = profiling.for_run("bescha", task_num)
+    try:
+        with harvestLog.run_context("bescha", task_num), profiler, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_release_after(lock, profiler.wrap(_job)))
+            future.result()
+    except LeaseLost as e:
+        tlog.error(f"BESCHA job aborted: {e}")
+        metrics.incr("errors")
+    except Exception:
+        tlog.exception("BESCHA job failed")
+        metrics.incr("errors")
+    finally:
+        metrics.save()
+        total_duration = time.time() - job_start
+        tlog.info(f"Done – total time: {total_duration:.2f}s", extra={'seconds': round(total_duration, 2)})
 
-            # Download & Unzip
-            t0 = time.time()
-            notices_dict = dataFetch.DataFetcher().fetch_bescha_data()
-            duration = time.time() - t0
-            print(f"[TIME] fetch_bescha_data ({pub_day}): {duration:.2f}s")
-            record_timing(task_num, f"fetch_bescha_{pub_day}", duration)
 
+def _host_limits():
+    """Host-Limits für den Async-Harvest (dataminds.async.host_limits)."""
+    from .asyncHarvest import parse_host_limits
+    return parse_host_limits(tk.config.get('dataminds.async.host_limits', ''))
 
-            # Mongo speichern
-            t1 = time.time()
-            mongoWriter.MongoWriter().store_bescha_data(notices_dict)
-            duration = time.time() - t1
-            print(f"[TIME] save_bescha_to_mongo ({pub_day}): {duration:.2f}s")
-            record_timing(task_num, f"save_bescha_to_mongo_{pub_day}", duration)
+def run_async_harvest(start_date=None, end_date=None, sources=('ted', 'bescha'), force=False):
+    """
+    Harvest von TED und BeschA in einem Event-Loop: TED-Seiten, mehrere
+    BeschA-Tage und die Mongo-Writes (motor) laufen nebenläufig, die
+    Requests werden pro Host begrenzt. CKAN-Actions bleiben synchron und
+    laufen in Worker-Threads. Tage wählen wie run_*_cron_job_for
+    (High-Water-Mark, erledigte Tage werden übersprungen).
+    """
+    import asyncio
+    from . import asyncHarvest
 
-            # CKAN publizieren
-            t2 = time.time()
-            publisher = CKANPublisher.CkanPublisher(
-                mongo_uri="mongodb://mongodb:27017/",
-                db_name="ckan_mongo",
-                owner_org="publicai")
-            publisher.publish_bescha_notices(notices_dict)
-            duration = time.time() - t2
-            print(f"[TIME] publish_bescha ({pub_day}): {duration:.2f}s")
-            record_timing(task_num, f"publish_bescha_{pub_day}", duration)
+    job_start = time.time()
+    async_dir = os.path.join(BASE_DIR, "ASYNC")
+    os.makedirs(async_dir, exist_ok=True)
+    task_num = _next_counter(os.path.join(async_dir, "async_job_counter.txt"))
+    tlog = harvestLog.task_logger(log, "async", task_num)
+    incremental = not start_date and not end_date
+    states = {source: harvestState.HarvestState(source) for source in sources}
+    days = {source: _harvest_days(states[source], start_date, end_date, force) for source in sources}
+    sources = [source for source in sources if days[source]]
+    if not sources:
+        tlog.info("Async harvest: nothing new to fetch")
+        return
+    metrics = {source: RunMetrics(source, task_num, mode="async") for source in sources}
+    tlog.info("Starting async harvest for "
+              + ", ".join(f"{source} {days[source][0]}..{days[source][-1]}" for source in sources))
+
+    async def _main():
+        fetcher = _data_fetcher()
+        if 'ted' in sources:
+            # ein Query über den ganzen Bereich; schon erledigte Tage dazwischen sind Upserts
+            start, end = days['ted'][0].replace('-', ''), days['ted'][-1].replace('-', '')
+            fetcher.current_payload['query'] = f"(publication-date>={start} AND publication-date<={end})"
+        # ein Publisher je Quelle (eigener Reindex), ein gemeinsamer Namensindex
+        name_index = _package_name_index()
+        publishers = {source: _ckan_publisher(name_index) for source in sources}
+        ted_report = CKANPublisher.PublishReport('TED')
+        bescha_report = CKANPublisher.PublishReport('BESCHA')
+        limiter = asyncHarvest.HostLimiter(_host_limits())
+        ted_timeout = _timeout_setting('dataminds.ted_timeout', '5,30')
+
+        async with asyncHarvest.AsyncMongoWriter() as writer, asyncHarvest.AsyncDataFetcher(
+                fetcher, limiter,
+                ted_timeout=sum(ted_timeout) if isinstance(ted_timeout, tuple) else ted_timeout,
+                bescha_timeout=_bescha_day_timeout()) as afetcher:
+            steps = {}
+            ted_skipped_failures = False
+            if 'ted' in sources:
+                checkpoint = dataFetch.TedCheckpoint(os.path.join(async_dir, "ted_checkpoint.json"))
+                ted_skipped_failures = checkpoint.had_failures(fetcher.current_payload['query'])
+                steps['ted'] = asyncHarvest.harvest_ted(
+                    afetcher, writer, publishers['ted'], ted_report, checkpoint, metrics['ted'],
+                    check=leases['ted'].check)
+            if 'bescha' in sources:
+                steps['bescha'] = asyncHarvest.harvest_bescha(
+                    afetcher, writer, publishers['bescha'], bescha_report, days['bescha'],
+                    _bescha_days_in_flight(), _bescha_day_timeout(), BESCHA_BATCH_SIZE, metrics['bescha'],
+                    on_day_done=lambda day: states['bescha'].mark_done([day], initialize=incremental),
+                    check=leases['bescha'].check,
+                    on_day_failed=lambda day, error: _record_failure(states['bescha'], [day], error, incremental))
+            results = dict(zip(steps, await asyncio.gather(*steps.values(), return_exceptions=True)))
+        reports = {'ted': ted_report, 'bescha': bescha_report}
+        for source in sources:
+            await asyncio.to_thread(_finish_publisher, metrics[source], publishers[source])
+            metrics[source].add_report(reports[source])
+            metrics[source].incr("bytes_downloaded", fetcher.bytes_downloaded[source])
+        for source, result in results.items():
+            if isinstance(result, BaseException):
+                tlog.error(f"Async harvest step {source} failed: {result!r}")
+                metrics[source].incr("errors")
+        if 'ted' in results:
+            if isinstance(results['ted'], BaseException):
+                _record_failure(states['ted'], days['ted'], results['ted'], incremental)
+            elif ted_report.count('failed') or ted_skipped_failures:
+                _record_failure(states['ted'], days['ted'],
+                                f"{ted_report.count('failed')} notices failed to publish", incremental)
+            else:
+                states['ted'].mark_done(days['ted'], initialize=incremental)
+        if 'ted' in sources:
+            _write_publish_report(async_dir, f"{task_num}_ted", ted_report, tlog)
+        if 'bescha' in sources:
+            _write_publish_report(async_dir, f"{task_num}_bescha", bescha_report, tlog)
+
+    # dieselben Locks wie die einzelnen Jobs, immer in derselben Reihenfolge
+    leases = {}
+    for source in sorted(sources):
+        lock = acquire_harvest_lock(source)
+        if lock is None:
+            tlog.warning(f"{source.upper()} Job already running – skipped")
+            for held in leases.values():
+                held.release()
+            return
+        leases[source] = lock
 
+    profiler = profiling.for_run("async", task_num)
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_job)
-            future.result(timeout=600)
-    except concurrent.futures.TimeoutError:
-        log.error(f"[Task {task_num}] BESCHA Cron Job timed out after 600s")
-        print(f"[Task {task_num}] Aborted: timeout")
+        with harvestLog.run_context("async", task_num), profiler:
+            profiler.wrap(asyncio.run)(_main())
     except Exception:
-        log.exception(f"[Task {task_num}] BESCHA job failed")
-        print(f"[Task {task_num}] Failed")
+        tlog.exception("Async harvest failed")
     finally:
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
+        for lock in leases.values():
+            lock.release()
+        for source_metrics in metrics.values():
+            source_metrics.save()
         total_duration = time.time() - job_start
-        record_timing(task_num, "total_job_time", total_duration)
-        print(f"[Task {task_num}] Done – total time: {total_duration:.2f}s")
-        print("------------------------------------------------")
+        tlog.info(f"Done – total time: {total_duration:.2f}s", extra={'seconds': round(total_duration, 2)})
 
 
 def _next_counter(path):
@@ -2,84 +2,367 @@ from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 import os
 import zipfile
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import threading
+import atexit
 import json
+import collections
+import logging
+
+from .releaseStream import iter_array_items
+
+log = logging.getLogger(__name__)
+
+# Feldnamen der TED-Suche und Pfad-Suffix des Endpunkts je API-Version
+TED_API_VERSIONS = {
+    None: (["title-proc", "buyer-name", "publication-date", "publication-number"], ""),
+    "2.0": (["title", "purchaser", "pub_date", "publication-number"], "/v2"),
+}
+
+
+class FetchError(Exception):
+    """Ein Abruf ist auch nach allen Retries fehlgeschlagen."""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def token_rejected(error):
+    """
+    Hat TED einen gespeicherten nextToken abgelehnt (4xx)? 429 zählt nicht dazu:
+    nach allen Retries weiter gedrosselt – der Checkpoint bleibt für den nächsten Lauf.
+    """
+    return error.status is not None and 400 <= error.status < 500 and error.status != 429
+
+
+def transient(error):
+    """Vorübergehender Fehler (Timeout, Verbindung, 429, 5xx) – zählt nicht als Fehlversuch eines Tages."""
+    return isinstance(error, FetchError) and (error.status is None or error.status == 429 or error.status >= 500)
+
+
+def export_missing(error):
+    """Für den Tag gibt es keinen Export (404/410) – ein erneuter Versuch ist sinnlos."""
+    return isinstance(error, FetchError) and error.status in (404, 410)
+
+
+def build_session(pool_maxsize=10, retries=3, backoff_factor=1.0):
+    """
+    requests-Session mit Connection-Pool (Keep-Alive) und urllib3-Retry:
+    Verbindungsfehler sowie 429/5xx werden mit exponentiellem Backoff
+    wiederholt, ein Retry-After-Header des Servers wird beachtet.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return session
+
+
+class TedCheckpoint:
+    """
+    Fortschritt laufender TED-Abfragen als JSON-Datei (z.B. unter BASE_DIR/TED):
+    pro Query der letzte iterationNextToken und die Zahl verarbeiteter Seiten.
+    Damit setzt ein abgebrochener Lauf bei der nächsten Seite wieder auf.
+    failed merkt sich, dass eine schon übersprungene Seite fehlgeschlagene
+    Notices hatte – der fortgesetzte Lauf darf die Tage dann nicht als erledigt markieren.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Checkpoint {self.path} unreadable, ignoring: {e}")
+            return {}
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self, query):
+        with self._lock:
+            return self._read().get(query)
+
+    def save(self, query, next_token, pages):
+        with self._lock:
+            data = self._read()
+            data[query] = {
+                'query': query,
+                'next_token': next_token,
+                'pages': pages,
+                'failed': (data.get(query) or {}).get('failed', False),
+                'updated': datetime.now().isoformat(),
+            }
+            self._write(data)
+
+    def mark_failed(self, query):
+        """Die gerade verarbeitete Seite von query hatte fehlgeschlagene Notices."""
+        with self._lock:
+            data = self._read()
+            entry = data.setdefault(query, {'query': query, 'next_token': None, 'pages': 0})
+            entry['failed'] = True
+            entry['updated'] = datetime.now().isoformat()
+            self._write(data)
+
+    def had_failures(self, query):
+        """Ob eine frühere, per Checkpoint übersprungene Seite von query fehlgeschlagen ist."""
+        state = self.load(query) or {}
+        return bool(state.get('failed') and state.get('next_token'))
+
+    def clear(self, query):
+        with self._lock:
+            data = self._read()
+            if data.pop(query, None) is not None:
+                self._write(data)
+
+
+class ApiSpecMonitor:
+    """
+    Prozessweite Überwachung der TED-API-Spezifikation. Ein einziger Thread
+    fragt den Endpunkt alle interval Sekunden ab; Version und Antwort werden
+    zwischengespeichert und gelten ttl Sekunden lang für alle DataFetcher.
+    """
+    def __init__(self, url, interval=60, ttl=300, session=None):
+        self.url = url
+        self.interval = interval
+        self.ttl = ttl
+        self.session = session or build_session(pool_maxsize=1, retries=1)
+        self.api_version = None
+        self.payload = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='ted-spec-monitor', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Beendet den Thread; ein späterer Zugriff startet ihn neu."""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.check()
+            self._stopped.wait(self.interval)
+
+    def check(self):
+        try:
+            response = self.session.get(self.url, timeout=5)
+            if response.status_code == 405:
+                log.debug("GET-Methode nicht erlaubt für den TED-API-Endpunkt. Überspringe API-Spezifikationscheck.")
+                return
+            if not response.ok:
+                log.warning(f"API-Spezifikation nicht erreichbar (Status {response.status_code})")
+                return
+            data = response.json()
+            with self._lock:
+                self.api_version = data.get("api_version")
+                self.payload = data
+                self.checked_at = time.time()
+        except Exception as e:
+            log.warning(f"Fehler beim Überwachen der API-Spezifikation: {e}")
+
+    def snapshot(self):
+        """(api_version, payload) des letzten Checks, (None, None) wenn älter als ttl."""
+        with self._lock:
+            if self.checked_at is None or time.time() - self.checked_at > self.ttl:
+                return None, None
+            return self.api_version, self.payload
+
+
+_spec_monitor = None
+_spec_monitor_lock = threading.Lock()
+
+
+def get_spec_monitor(url="https://api.ted.europa.eu/v3/notices/search"):
+    """Liefert den prozessweiten ApiSpecMonitor und startet ihn beim ersten Aufruf."""
+    global _spec_monitor
+    with _spec_monitor_lock:
+        if _spec_monitor is None:
+            _spec_monitor = ApiSpecMonitor(url)
+        monitor = _spec_monitor
+    monitor.start()
+    return monitor
+
+
+def stop_spec_monitor():
+    """Stoppt den Monitor-Thread dieses Prozesses, falls er läuft."""
+    with _spec_monitor_lock:
+        monitor = _spec_monitor
+    if monitor is not None:
+        monitor.stop()
+
+
+atexit.register(stop_spec_monitor)
+
 
 class DataFetcher:
     """
     Holt Daten von TED (POST) und BeschA (ZIP) und passt sich adaptiv an
     Änderungen der API-Spezifikation an.
     """
+    # BeschA-Exporte bis zu dieser Größe bleiben beim Download im Speicher
+    spool_max_bytes = 64 * 1024 * 1024
+    download_chunk_size = 256 * 1024
+
     def __init__(self,
                  ted_api_url="https://api.ted.europa.eu/v3/notices/search",
-                 bescha_api_url="https://www.oeffentlichevergabe.de/api/notice-exports?format=ocds.zip"):
+                 bescha_api_url="https://www.oeffentlichevergabe.de/api/notice-exports?format=ocds.zip",
+                 session=None, ted_timeout=(5, 30), bescha_timeout=(5, 120)):
         self.ted_api_url = ted_api_url
         self.bescha_api_url = bescha_api_url
         self.api_version = None
+        # Keep-Alive-Session mit Connection-Pool und Retry-Policy für alle Requests
+        self.session = session or build_session()
+        # (connect, read) in Sekunden, getrennt für TED-Seiten und BeschA-Exporte
+        self.ted_timeout = ted_timeout
+        self.bescha_timeout = bescha_timeout
+        # Heruntergeladene Bytes je Quelle ('ted', 'bescha') für die Metriken
+        self.bytes_downloaded = collections.Counter()
+        self._stats_lock = threading.Lock()
         self.current_payload = {
             "query": "(title-proc='technology')",
-            "fields": ["title-proc", "buyer-name", "publication-date", "publication-number"],
+            "fields": list(TED_API_VERSIONS[None][0]),
             "limit": 100
         }
-        self.monitor_thread = threading.Thread(target=self.monitor_api_spec, daemon=True)
-        self.monitor_thread.start()
 
-    def fetch_ted_data(self):
-        all_notices = []
-        next_token = None
-        max_retries = 3
-        print(f"[DEBUG] Starting fetch_ted_data with initial payload: {self.current_payload}")
-        attempt_counter = 0
+    def _count_bytes(self, source, size):
+        # BeschA-Tage werden parallel geladen
+        with self._stats_lock:
+            self.bytes_downloaded[source] += size
+
+    def _post_ted(self, payload, page_no):
+        """
+        Ein POST an die TED-Suche über die gepoolte Session. Wiederholungen
+        (Verbindungsfehler, 429/5xx inkl. Retry-After) übernimmt die Retry-Policy
+        der Session. Wirft FetchError, wenn die Seite nicht geholt werden kann.
+        """
+        try:
+            r = self.session.post(
+                self.ted_api_url,
+                headers={"Content-Type": "application/json"},
+                json=payload,
+                timeout=self.ted_timeout
+            )
+            r.raise_for_status()
+            self._count_bytes('ted', len(r.content))
+            data = r.json()
+            # pro Seite nur Status und Größe, Payload und Antwort bleiben aus dem Log
+            log.debug("TED page %s: status %s, %s bytes", page_no, r.status_code, len(r.content),
+                      extra={'page': page_no})
+            return data
+        except (requests.RequestException, ValueError) as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            log.error(f"TED-Request for page {page_no} failed: {e}", extra={'page': page_no})
+            raise FetchError(f"TED page {page_no} failed: {e}", status) from e
+
+    def iter_ted_pages(self, checkpoint=None):
+        """
+        Generator über die TED-Suche: liefert jede Seite (Liste von Notices),
+        sobald sie angekommen ist, statt alle Seiten zu sammeln. Der Aufrufer
+        verarbeitet die Seite, bevor die nächste angefragt wird.
+
+        Mit einem TedCheckpoint wird nach jeder verarbeiteten Seite der nächste
+        iterationNextToken gesichert und ein späterer Lauf mit derselben Query
+        setzt dort wieder auf. Lehnt TED den gespeicherten Token ab, beginnt
+        die Abfrage von vorn.
+        Wirft FetchError, wenn eine Seite auch nach allen Retries fehlschlägt.
+        """
+        self.sync_api_spec()
+        query = self.current_payload.get('query')
+        state = checkpoint.load(query) if checkpoint else None
+        next_token = state['next_token'] if state else None
+        page_no = state['pages'] if state else 0
+        resuming = bool(next_token)
+        if resuming:
+            log.info(f"Resuming TED query {query!r} after page {page_no} ({state['updated']})")
+        log.debug(f"Starting TED query {query!r}")
         while True:
             payload = dict(self.current_payload)
             if next_token:
                 payload['nextToken'] = next_token
-            print(f"[DEBUG] Sending request with payload: {payload}")
 
-            for attempt in range(1, max_retries + 1):
-                attempt_counter += 1
-                try:
-                    print(f"[DEBUG] Attempt {attempt} of {max_retries} (overall try #{attempt_counter})")
-                    r = requests.post(
-                        self.ted_api_url,
-                        headers={"Content-Type": "application/json"},
-                        json=payload,
-                        timeout=10
-                    )
-                    print(f"[DEBUG] Received response: status_code={r.status_code}")
-                    r.raise_for_status()
-                    data = r.json()
-                    print(f"[DEBUG] Response JSON keys: {list(data.keys())}")
-                    break
-                except requests.RequestException as e:
-                    print(f"[ERROR] TED-Request failed (Try {attempt}/{max_retries}): {e}")
-                    if attempt < max_retries:
-                        wait = 2 ** attempt
-                        print(f"[DEBUG] Waiting {wait}s before retry")
-                        time.sleep(wait)
-                    else:
-                        print("[ERROR] Max retries reached, aborting fetch_ted_data.")
-                        return None
-
-            page_notices = data.get('notices', [])
-            all_notices.extend(page_notices)
+            try:
+                data = self._post_ted(payload, page_no + 1)
+            except FetchError as e:
+                if resuming and token_rejected(e):
+                    log.warning(f"Checkpoint token rejected ({e.status}), restarting query from page 1")
+                    checkpoint.clear(query)
+                    next_token, page_no, resuming = None, 0, False
+                    continue
+                raise
+            resuming = False
+
+            page_no += 1
+            yield data.get('notices', [])
 
+            # erst nach der Verarbeitung der Seite den Fortschritt sichern
             next_token = data.get('iterationNextToken')
+            if checkpoint:
+                if next_token:
+                    checkpoint.save(query, next_token, page_no)
+                else:
+                    checkpoint.clear(query)
             if not next_token:
-                total = len(all_notices)
-                print(f"[DEBUG] No more pages. Total notices collected: {total}")
-                return {'notices': all_notices, 'totalNoticeCount': total}
+                log.debug(f"No more pages after page {page_no}.")
+                return
 
-    def fetch_bescha_data(self, ):
+    def fetch_ted_data(self):
         """
-        Holt die tägliche BESCHA-OCIDS-ZIP, entpackt sie und sammelt alle 'releases'
-        aus den JSON-Dateien. Liefert ein Dict im TED-ähnlichen Format:
-        {'notices': [...], 'totalNoticeCount': n}
+        Sammelt alle Seiten aus iter_ted_pages in einem Dict
+        {'notices': [...], 'totalNoticeCount': n}; None bei Fehlern.
+        """
+        all_notices = []
+        try:
+            for page_notices in self.iter_ted_pages():
+                all_notices.extend(page_notices)
+        except FetchError:
+            return None
+        total = len(all_notices)
+        log.debug(f"Total notices collected: {total}")
+        return {'notices': all_notices, 'totalNoticeCount': total}
+
+    def download_bescha_export(self, pub_day=None, cancel=None):
+        """
+        Lädt die BESCHA-OCIDS-ZIP für pub_day (Datum oder 'YYYY-MM-DD', Standard:
+        gestern) direkt aus dem Response-Stream in einen SpooledTemporaryFile.
+        Kleine Exporte bleiben im Speicher, große werden vom Betriebssystem
+        ausgelagert – es wird nichts unter BASE_DIR abgelegt oder entpackt.
+        Liefert (pub_day_str, Puffer); wirft FetchError nach allen Retries oder
+        sobald das threading.Event cancel gesetzt ist (geprüft je Chunk).
         """
-        max_retries = 3
-        all_releases = []
         if pub_day is None:
             dt = datetime.now() - timedelta(days=1)
         elif isinstance(pub_day, str):
@@ -91,106 +374,93 @@ class DataFetcher:
         # URL mit pubDay-Parameter bauen
         parsed = urlparse(self.bescha_api_url)
         qs = parse_qs(parsed.query)
-        qs['pubDay'] = [pub_day]
+        qs['pubDay'] = [pub_day_str]
         qs['format'] = ['ocds.zip']
         new_query = urlencode(qs, doseq=True)
         fetch_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path,
                                 parsed.params, new_query, parsed.fragment))
-        print(f"[DEBUG] Starting fetch_bescha_data for pubDay={pub_day}")
-        print(f"[DEBUG] Fetch URL: {fetch_url}")
+        log.debug(f"Fetching BESCHA export {fetch_url}", extra={'day': pub_day_str})
 
-        # ZIP-Download mit Retries
-        for attempt in range(1, max_retries + 1):
-            try:
-                print(f"[DEBUG] Attempt {attempt}/{max_retries} to download BESCHA-ZIP")
-                r = requests.get(fetch_url, timeout=10)
-                print(f"[DEBUG] Received status_code={r.status_code}")
+        # ZIP-Download; Retries übernimmt die Session
+        buf = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)
+        try:
+            size = 0
+            with self.session.get(fetch_url, timeout=self.bescha_timeout, stream=True) as r:
                 r.raise_for_status()
-                break
-            except requests.RequestException as e:
-                print(f"[ERROR] BESCHA-Request failed (Try {attempt}): {e}")
-                if attempt < max_retries:
-                    wait = 2 ** attempt
-                    print(f"[DEBUG] Waiting {wait}s before retry")
-                    time.sleep(wait)
-                else:
-                    print("[ERROR] Max retries reached, aborting fetch_bescha_data.")
-                    return None
-
-        # In temporäres Verzeichnis speichern und entpacken
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base = "/srv/app/ckanext_dataminds/BESCHA"
-        os.makedirs(base, exist_ok=True)
-        zip_path = os.path.join(base, f"bescha_{pub_day}_{timestamp}.zip")
-        with open(zip_path, "wb") as f:
-            f.write(r.content)
-        print(f"[OK] BeschA-ZIP gespeichert: {zip_path}")
-
-        tmp_dir = os.path.join(base, f"unzipped_{pub_day}_{timestamp}")
-        os.makedirs(tmp_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path, "r") as z:
-            z.extractall(tmp_dir)
-        print(f"[OK] BeschA-ZIP entpackt nach: {tmp_dir}")
-
-        # JSON-Dateien einlesen und 'releases' sammeln
-        for root, _, files in os.walk(tmp_dir):
-            for fn in files:
-                if not fn.lower().endswith(".json"):
+                for chunk in r.iter_content(chunk_size=self.download_chunk_size):
+                    if cancel is not None and cancel.is_set():
+                        buf.close()
+                        raise FetchError(f"BESCHA export {pub_day_str} cancelled")
+                    buf.write(chunk)
+                    size += len(chunk)
+            buf.seek(0)
+            self._count_bytes('bescha', size)
+            log.info(f"BeschA-ZIP empfangen: {pub_day_str} ({size} bytes)", extra={'day': pub_day_str, 'bytes': size})
+            return pub_day_str, buf
+        except requests.RequestException as e:
+            buf.close()
+            raise FetchError(f"BESCHA export {pub_day_str} failed: {e}",
+                             getattr(e.response, 'status_code', None)) from e
+
+    def iter_bescha_releases(self, export):
+        """
+        Liefert die OCDS-Releases eines heruntergeladenen Exports einzeln,
+        indem die JSON-Dateien direkt aus dem ZIP gelesen werden (ohne extractall).
+        Die Dateien werden inkrementell geparst, es liegt immer nur ein Release
+        im Speicher. Der Puffer wird am Ende geschlossen.
+        """
+        with export, zipfile.ZipFile(export, "r") as z:
+            for member in z.infolist():
+                fn = member.filename
+                if member.is_dir() or not fn.lower().endswith(".json"):
                     continue
-                fp = os.path.join(root, fn)
                 try:
-                    with open(fp, 'r', encoding='utf-8') as jf:
-                        data = json.load(jf)
-                    releases = data.get('releases', [])
-                    if isinstance(releases, list):
-                        all_releases.extend(releases)
-                    else:
-                        print(f"[WARN] {fn}: 'releases' ist kein Array")
-                except Exception as e:
-                    print(f"[WARN] Fehler beim Parsen von {fn}: {e}")
-
-        # Aufräumen
-        os.remove(zip_path)
-        # optional: shutil.rmtree(tmp_dir)
+                    with z.open(member) as jf:
+                        yield from iter_array_items(jf, keys=('releases',))
+                except ValueError as e:
+                    log.warning(f"Fehler beim Parsen von {fn}: {e}")
 
+    def fetch_bescha_data(self, pub_day=None):
+        """
+        Holt die BESCHA-OCIDS-ZIP für pub_day und sammelt alle 'releases'
+        aus den JSON-Dateien. Liefert ein Dict im TED-ähnlichen Format:
+        {'notices': [...], 'totalNoticeCount': n}; None bei Fehlern.
+        """
+        try:
+            _, export = self.download_bescha_export(pub_day)
+        except FetchError:
+            return None
+        all_releases = list(self.iter_bescha_releases(export))
         total = len(all_releases)
-        print(f"[DEBUG] Total BESCHA releases collected: {total}")
+        log.debug(f"Total BESCHA releases collected: {total}")
         return {'notices': all_releases, 'totalNoticeCount': total}
 
-    def monitor_api_spec(self):
-        while True:
-            try:
-                response = requests.get(self.ted_api_url, timeout=5)
-                if response.status_code == 405:
-                    print("[WARN] GET-Methode nicht erlaubt für den TED-API-Endpunkt. Überspringe API-Spezifikationscheck.")
-                elif response.ok:
-                    data = response.json()
-                    new_version = data.get("api_version")
-                    if new_version and new_version != self.api_version:
-                        print(f"[INFO] API-Version hat sich geändert: {self.api_version} -> {new_version}")
-                        self.api_version = new_version
-                        self.adapt_api()
-                else:
-                    print(f"[WARN] API-Spezifikation nicht erreichbar (Status {response.status_code})")
-            except Exception as e:
-                print(f"[WARN] Fehler beim Überwachen der API-Spezifikation: {e}")
-            time.sleep(60)
+    def sync_api_spec(self):
+        """
+        Übernimmt die vom geteilten ApiSpecMonitor erkannte API-Version und
+        passt URL/Payload an, falls sie sich gegenüber diesem Fetcher geändert hat.
+        """
+        new_version, _ = get_spec_monitor(self.ted_api_url).snapshot()
+        if new_version and new_version != self.api_version:
+            log.info(f"API-Version hat sich geändert: {self.api_version} -> {new_version}")
+            self.api_version = new_version
+            self.adapt_api()
 
     def adapt_api(self):
-        print("[INFO] Adaptive Maßnahme wird durchgeführt. Prüfe aktuelle API-Version und passe Parameter an.")
-        if self.api_version == "2.0":
-            self.ted_api_url = "https://api.ted.europa.eu/v3/notices/search/v2"
-            self.current_payload = {
-                "query": "(title='technology')",
-                "fields": ["title", "purchaser", "pub_date", "publication-number"],
-                "limit": 5
-            }
-            print("[INFO] API-Version 2.0 erkannt: URL und Payload angepasst.")
+        """
+        Passt nur Feldnamen und das Versions-Suffix des Pfads an die API-Version
+        an. Query und Limit des Aufrufers sowie die Basis-URL (dataminds.ted_api_url)
+        bleiben erhalten.
+        """
+        known = self.api_version in TED_API_VERSIONS
+        fields, suffix = TED_API_VERSIONS[self.api_version if known else None]
+        base = self.ted_api_url.rstrip('/')
+        for _, other_suffix in TED_API_VERSIONS.values():
+            if other_suffix and base.endswith(other_suffix):
+                base = base[:-len(other_suffix)]
+        self.ted_api_url = base + suffix
+        self.current_payload = dict(self.current_payload, fields=list(fields))
+        if known:
+            log.info(f"API-Version {self.api_version}: Feldnamen und URL angepasst ({self.ted_api_url}).")
         else:
-            self.ted_api_url = "https://api.ted.europa.eu/v3/notices/search"
-            self.current_payload = {
-                "query": "(title-proc='technology')",
-                "fields": ["title-proc", "buyer-name", "publication-date", "publication-number"],
-                "limit": 5
-            }
-            print("[INFO] API-Version unbekannt oder Standard: URL und Payload zurückgesetzt.")
+            log.info(f"API-Version {self.api_version} unbekannt: Standard-Feldnamen ({self.ted_api_url}).")
@@ -0,0 +1,337 @@
+import os
+import time
+import uuid
+import errno
+import fcntl
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import ckan.plugins.toolkit as tk
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LOCK_DIR = "/srv/app/ckanext_dataminds/locks"
+
+
+class LeaseLost(Exception):
+    """Die Lease ist abgelaufen oder übernommen; der Job muss abbrechen."""
+
+
+class LeaseLock:
+    """
+    Lease-basierter Lock für Harvest-Jobs über mehrere CKAN-Container hinweg.
+    Der Halter verlängert die Lease per Heartbeat alle ttl/3 Sekunden; stürzt
+    er ab, läuft die Lease nach ttl Sekunden aus und der nächste Job übernimmt.
+    Der Job ruft check() an Seiten-/Tages-/Batch-Grenzen auf und bricht ab,
+    sobald die Lease verloren ist. Unterklassen implementieren _try_acquire, _renew, _release und _wait.
+    """
+    heartbeat = True
+
+    def __init__(self, name, ttl=300):
+        self.name = name
+        self.ttl = ttl
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.held = False
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self, blocking=True, timeout=None):
+        """
+        Holt die Lease. Mit blocking=False wird sofort aufgegeben (skip),
+        sonst wird bis timeout Sekunden (None = unbegrenzt) gewartet, ohne
+        den Lock im Sekundentakt abzufragen. Liefert True bei Erfolg.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._try_acquire():
+                break
+            if not blocking:
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._wait(remaining)
+        self.held = True
+        self.lost = False
+        if self.heartbeat:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._heartbeat, daemon=True,
+                                            name=f"lease-{self.name}")
+            self._thread.start()
+        return True
+
+    def release(self):
+        if not self.held:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self._release()
+        except Exception:
+            log.exception(f"Could not release lock {self.name}")
+        self.held = False
+
+    def check(self):
+        """Wirft LeaseLost, wenn der Heartbeat die Lease verloren hat."""
+        if self.lost:
+            raise LeaseLost(f"Lease {self.name} was lost")
+
+    def _heartbeat(self):
+        renewed = time.monotonic()
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if self._renew():
+                    renewed = time.monotonic()
+                    continue
+                log.error(f"Lease {self.name} was lost (expired or taken over)")
+            except Exception:
+                log.exception(f"Lease {self.name} could not be renewed")
+                # seit ttl Sekunden nicht verlängert: die Lease ist abgelaufen
+                if time.monotonic() - renewed < self.ttl:
+                    continue
+                log.error(f"Lease {self.name} not renewed for {self.ttl}s, treating it as lost")
+            self.lost = True
+            return
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def _try_acquire(self):
+        raise NotImplementedError
+
+    def _renew(self):
+        raise NotImplementedError
+
+    def _release(self):
+        raise NotImplementedError
+
+    def _wait(self, timeout):
+        raise NotImplementedError
+
+
+class RedisLease(LeaseLock):
+    """
+    Lease als Redis-Key (SET NX PX). Wartende blockieren per BLPOP auf einer
+    Benachrichtigungsliste, in die beim Freigeben geschrieben wird; spätestens
+    nach ttl Sekunden wird erneut versucht (abgestürzter Halter).
+    """
+    _renew_script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0"""
+    _release_script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            redis.call('del', KEYS[1])
+            redis.call('lpush', KEYS[2], ARGV[1])
+            redis.call('pexpire', KEYS[2], 60000)
+        end
+        return 1"""
+
+    def __init__(self, name, redis_conn, ttl=300):
+        super().__init__(name, ttl)
+        self.redis = redis_conn
+        self.key = f"dataminds:lock:{name}"
+        self.notify_key = f"{self.key}:released"
+
+    def _try_acquire(self):
+        return bool(self.redis.set(self.key, self.token, nx=True, px=int(self.ttl * 1000)))
+
+    def _renew(self):
+        return bool(self.redis.eval(self._renew_script, 1, self.key, self.token, int(self.ttl * 1000)))
+
+    def _release(self):
+        self.redis.eval(self._release_script, 2, self.key, self.notify_key, self.token)
+
+    def _wait(self, timeout):
+        wait = self.ttl if timeout is None else min(timeout, self.ttl)
+        self.redis.blpop([self.notify_key], timeout=max(1, int(wait)))
+
+
+class MongoLease(LeaseLock):
+    """
+    Lease als Dokument in der Collection 'locks' ({_id: name, owner, expires_at}).
+    MongoDB kennt ohne Replica-Set keine Benachrichtigung, daher warten
+    Wartende bis zum Ablauf der aktuellen Lease (höchstens poll_max Sekunden).
+    """
+    poll_max = 10
+
+    def __init__(self, name, db, ttl=300):
+        super().__init__(name, ttl)
+        self.collection = db["locks"]
+
+    def _try_acquire(self):
+        now = datetime.utcnow()
+        try:
+            self.collection.find_one_and_update(
+                {"_id": self.name, "expires_at": {"$lt": now}},
+                {"$set": {"owner": self.token, "acquired_at": now,
+                          "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True)
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _renew(self):
+        result = self.collection.update_one(
+            {"_id": self.name, "owner": self.token},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}})
+        return result.matched_count == 1
+
+    def _release(self):
+        self.collection.delete_one({"_id": self.name, "owner": self.token})
+
+    def _wait(self, timeout):
+        doc = self.collection.find_one({"_id": self.name}, {"expires_at": 1})
+        wait = self.poll_max
+        if doc and doc.get("expires_at"):
+            wait = min(wait, max(0.5, (doc["expires_at"] - datetime.utcnow()).total_seconds()))
+        if timeout is not None:
+            wait = min(wait, timeout)
+        time.sleep(wait)
+
+
+class FileLease(LeaseLock):
+    """
+    Fallback ohne Redis/MongoDB: flock auf einer Datei, nur innerhalb eines Hosts.
+    Der Kernel gibt den Lock frei, wenn der Prozess stirbt, daher ist kein
+    Heartbeat nötig. Gewartet wird blockierend in flock, nicht per Polling.
+    """
+    heartbeat = False
+
+    def __init__(self, name, lock_dir=DEFAULT_LOCK_DIR, ttl=300):
+        super().__init__(name, ttl)
+        os.makedirs(lock_dir, exist_ok=True)
+        self.path = os.path.join(lock_dir, f"{name}.lock")
+        self._fd = None
+
+    def _open(self):
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _locked(self, fd):
+        self._fd = fd
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{self.token} {datetime.now().isoformat()}\n".encode())
+
+    def _try_acquire(self):
+        fd = self._open()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            os.close(fd)
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+        self._locked(fd)
+        return True
+
+    def acquire(self, blocking=True, timeout=None):
+        if not self._try_acquire():
+            if not blocking:
+                return False
+            fd = self._open()
+            if not self._flock_wait(fd, timeout):
+                return False
+            self._locked(fd)
+        self.held = True
+        return True
+
+    def _flock_wait(self, fd, timeout):
+        """Blockierendes flock; mit timeout in einem Hilfsthread, der ggf. aufgibt."""
+        if timeout is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return True
+        done = threading.Event()
+        state = {'given_up': False}
+        state_lock = threading.Lock()
+
+        def _wait_for_lock():
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with state_lock:
+                if state['given_up']:
+                    os.close(fd)  # gibt den Lock gleich wieder frei
+                    return
+                done.set()
+
+        threading.Thread(target=_wait_for_lock, daemon=True, name=f"flock-{self.name}").start()
+        if done.wait(timeout):
+            return True
+        with state_lock:
+            if done.is_set():
+                return True
+            state['given_up'] = True
+            return False
+
+    def _renew(self):
+        return True
+
+    def _release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _lock_ttl():
+    return tk.asint(tk.config.get('dataminds.lock_ttl', 300))
+
+
+def _redis_connection():
+    from ckan.lib.redis import connect_to_redis
+    conn = connect_to_redis()
+    conn.ping()
+    return conn
+
+
+def _mongo_db():
+    from . import mongoPool
+    db = mongoPool.get_db()
+    db.command('ping')
+    return db
+
+
+def harvest_lock(name):
+    """
+    Lock für den Harvest name ('ted', 'bescha') nach dataminds.lock_backend:
+    'redis', 'mongo', 'file' oder 'auto' (Redis, sonst MongoDB, sonst Datei).
+    """
+    backend = tk.config.get('dataminds.lock_backend', 'auto')
+    ttl = _lock_ttl()
+    if backend in ('auto', 'redis'):
+        try:
+            return RedisLease(name, _redis_connection(), ttl=ttl)
+        except Exception as e:
+            if backend == 'redis':
+                raise
+            log.warning(f"Redis not available for lock {name} ({e}), trying MongoDB")
+    if backend in ('auto', 'mongo'):
+        try:
+            return MongoLease(name, _mongo_db(), ttl=ttl)
+        except PyMongoError as e:
+            if backend == 'mongo':
+                raise
+            log.warning(f"MongoDB not available for lock {name} ({e}), using a file lock")
+    return FileLease(name, tk.config.get('dataminds.lock_dir', DEFAULT_LOCK_DIR), ttl=ttl)
+
+
+def acquire_harvest_lock(name):
+    """
+    Holt den Lock für name gemäß dataminds.lock_mode: 'wait' reiht sich ein
+    (höchstens dataminds.lock_wait_timeout Sekunden), 'skip' gibt sofort auf.
+    Liefert den gehaltenen Lock oder None.
+    """
+    lock = harvest_lock(name)
+    wait = tk.config.get('dataminds.lock_mode', 'wait') == 'wait'
+    timeout = tk.asint(tk.config.get('dataminds.lock_wait_timeout', 3600))
+    if lock.acquire(blocking=wait, timeout=timeout):
+        return lock
+    return None
@@ -0,0 +1,425 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import collections
+import logging.handlers
+from contextlib import contextmanager
+from datetime import datetime
+
+import ckan.plugins.toolkit as tk
+
+LOGGER_NAME = "ckanext_dataminds"
+DEFAULT_LOG_FILE = "/var/log/ckan/ckanext_dataminds.log"
+# Standard-Attribute eines LogRecords; alles andere (extra=...) sind strukturierte Felder
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+# Rückwärts-Lesen des Logs: Blockgröße und wie viele Bytes eine gefilterte
+# Suche höchstens durchgeht (auch über rotierte Dateien hinweg)
+TAIL_BLOCK_SIZE = 64 * 1024
+TAIL_MAX_SCAN_BYTES = 32 * 1024 * 1024
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+# source/task des laufenden Harvests; gilt für alle Threads des Prozesses
+_run = {}
+
+
+def log_file():
+    """Pfad des strukturierten Logs (JSON-Zeilen), aus dem das Admin-Panel liest."""
+    return tk.config.get('dataminds.log_file', DEFAULT_LOG_FILE)
+
+
+def parse_line(line):
+    """
+    Ein Eintrag des strukturierten Logs als Dict (ts, level, msg, source, task, …);
+    Zeilen, die kein JSON sind (z.B. ältere Textlogs), kommen nur als msg zurück.
+    """
+    line = line.rstrip('\r\n')
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        entry = None
+    return entry if isinstance(entry, dict) else {'msg': line}
+
+
+def record_fields(record):
+    """Die über extra übergebenen Felder eines Records."""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """Eine JSON-Zeile je Record: ts, level, logger, msg, die Felder aus extra und ggf. exc."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Konsole: Zeit, Level, Modul, [Task n] und die übrigen Felder als key=value."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-5s [%(name)s] %(message)s')
+
+    def formatMessage(self, record):
+        fields = record_fields(record)
+        source, task = fields.pop('source', None), fields.pop('task', None)
+        context = ' '.join(p for p in (source and source.upper(), task and f"Task {task}") if p)
+        line = f"{record.asctime} {record.levelname:<5} [{record.name}] "
+        line += f"[{context}] {record.message}" if context else record.message
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class TaskLogger(logging.LoggerAdapter):
+    """Hängt source und task an jeden Record; extra eines Aufrufs wird ergänzt, nicht ersetzt."""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+
+def task_logger(logger, source, task_num=None):
+    return TaskLogger(logger, {'source': source, 'task': task_num})
+
+
+@contextmanager
+def run_context(source, task_num):
+    """
+    Während des Blocks bekommen alle Records ohne eigenes source/task die des
+    Laufs – auch die aus Fetcher, Writer und Publisher in deren Worker-Threads.
+    Ein Harvest-Job läuft pro Prozess (RQ-Work-Horse), daher prozessweit.
+    """
+    global _run
+    previous, _run = _run, {'source': source, 'task': task_num}
+    try:
+        yield
+    finally:
+        _run = previous
+
+
+class LogSampler:
+    """
+    Stichproben für Ereignisse pro Notice: je key werden die ersten burst
+    Ereignisse geloggt, danach nur jedes rate-te – mit den Feldern
+    sampled=rate und seen=<Anzahl bisher>. Standardrate: dataminds.log_sample_rate.
+    """
+
+    def __init__(self, rate=None, burst=10):
+        self.rate = max(1, rate or tk.asint(tk.config.get('dataminds.log_sample_rate', 100)))
+        self.burst = burst
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def log(self, logger, level, key, msg, *args, **kwargs):
+        if not logger.isEnabledFor(level):
+            return
+        with self._lock:
+            self._counts[key] += 1
+            seen = self._counts[key]
+        if seen > self.burst:
+            if (seen - self.burst) % self.rate:
+                return
+            kwargs['extra'] = dict(kwargs.get('extra', {}), sampled=self.rate, seen=seen)
+        logger.log(level, msg, *args, **kwargs)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Wie QueueHandler, lässt aber die Felder aus extra und den Traceback
+    getrennt, damit der JsonFormatter sie als eigene Schlüssel schreibt.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        for key, value in _run.items():
+            if getattr(record, key, None) is None:
+                setattr(record, key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _handlers(config):
+    """
+    Datei- und Konsolen-Handler des Listeners. Web-Worker, RQ-Worker und CLI
+    schreiben alle in dieselbe Datei; rotiert wird deshalb nicht hier, sondern
+    extern per logrotate – der WatchedFileHandler öffnet die Datei neu, sobald
+    sie verschoben wurde. Beispiel (rotierte Dateien .1, .2, … bleiben lesbar):
+
+        /var/log/ckan/ckanext_dataminds.log {
+            size 50M
+            rotate 5
+            missingok
+            nocompress
+        }
+    """
+    handlers = []
+    path = config.get('dataminds.log_file', DEFAULT_LOG_FILE)
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            file_handler = logging.handlers.WatchedFileHandler(path, encoding='utf-8', delay=True)
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Structured log {path} not available: {e}")
+    if tk.asbool(config.get('dataminds.log_console', True)):
+        console = logging.StreamHandler()
+        console.setFormatter(TextFormatter())
+        handlers.append(console)
+    return handlers
+
+
+def _start_listener(handlers):
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # Im Kind (z.B. RQ-Work-Horse) läuft der Listener-Thread nicht mehr
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+
+
+def setup_logging(config=None):
+    """
+    Richtet den Logger 'ckanext_dataminds' einmal pro Prozess ein: die Module
+    loggen nur in eine Queue, ein Listener-Thread schreibt JSON-Zeilen in
+    dataminds.log_file (rotiert per logrotate) und Text auf die Konsole
+    (dataminds.log_console). Level aus dataminds.log_level.
+    """
+    global _queue_handler
+    config = config if config is not None else tk.config
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(str(config.get('dataminds.log_level', 'INFO')).upper())
+    with _setup_lock:
+        if _queue_handler is not None:
+            return logger
+        _queue_handler = _QueueHandler(queue.SimpleQueue())
+        _start_listener(_handlers(config))
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        atexit.register(stop_logging)
+    return logger
+
+
+def flush():
+    """Wartet, bis alle Records geschrieben sind (z.B. am Ende eines Jobs vor os._exit)."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def stop_logging():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+# --- Lesen: Tail und Follow -------------------------------------------------------
+
+
+def log_files(path=None):
+    """Das Log und seine rotierten Vorgänger (.1, .2, …), neueste zuerst."""
+    path = path or log_file()
+    files = [path] if os.path.exists(path) else []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        files.append(f"{path}.{n}")
+        n += 1
+    return files
+
+
+def _reverse_lines(path, end=None, block_size=TAIL_BLOCK_SIZE):
+    """
+    Zeilen einer Datei vom Ende her, blockweise von hinten gelesen – die Datei
+    wird nie ganz geladen. end begrenzt auf die ersten end Bytes.
+    """
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        rest = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b'\n')
+            # die erste Zeile kann im vorigen Block beginnen
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode('utf-8', 'replace')
+        if rest.strip():
+            yield rest.decode('utf-8', 'replace')
+
+
+def level_value(level):
+    """Numerischer Wert eines Levelnamens ('WARNING' -> 30); unbekannt = INFO."""
+    value = logging.getLevelName(str(level or 'INFO').upper())
+    return value if isinstance(value, int) else logging.INFO
+
+
+def entry_filter(task=None, level=None, source=None):
+    """
+    Prädikat für Log-Einträge: Task-Nummer, Mindest-Level und Quelle; None
+    heißt ohne Einschränkung. Textzeilen ohne Felder fallen bei task/source heraus.
+    """
+    min_level = level_value(level) if level else None
+
+    def _matches(entry):
+        if task is not None and str(entry.get('task')) != str(task):
+            return False
+        if source and entry.get('source') != source:
+            return False
+        if min_level is not None and level_value(entry.get('level')) < min_level:
+            return False
+        return True
+    return _matches
+
+
+def tail(n=50, task=None, level=None, source=None, path=None, end=None, max_scan_bytes=TAIL_MAX_SCAN_BYTES):
+    """
+    Die letzten n passenden Einträge, älteste zuerst. Gelesen wird vom Dateiende
+    rückwärts und, falls nötig, weiter in den rotierten Dateien; eine gefilterte
+    Suche bricht nach max_scan_bytes ab. end begrenzt die aktuelle Datei (Offset).
+    """
+    matches = entry_filter(task, level, source)
+    entries = []
+    scanned = 0
+    for i, file_path in enumerate(log_files(path)):
+        try:
+            for line in _reverse_lines(file_path, end if i == 0 else None):
+                scanned += len(line) + 1
+                entry = parse_line(line)
+                if matches(entry):
+                    entries.append(entry)
+                    if len(entries) >= n:
+                        return entries[::-1]
+                if scanned >= max_scan_bytes:
+                    return entries[::-1]
+        except FileNotFoundError:
+            # zwischen log_files() und open() rotiert
+            continue
+    return entries[::-1]
+
+
+class LogFollower:
+    """
+    Liest neue Zeilen des Logs, wie tail -F: beginnt am aktuellen Ende (oder an
+    einem früheren cursor '<inode>:<offset>') und öffnet die Datei neu, wenn
+    logrotate sie ersetzt hat – der Rest der alten Datei wird
+    vorher noch gelesen.
+    """
+
+    def __init__(self, path=None, cursor=None):
+        self.path = path or log_file()
+        self._file = None
+        self._inode = None
+        self._buffer = b''
+        self.offset = 0
+        # True, wenn an cursor weitergelesen wird (sonst ab dem aktuellen Ende)
+        self.resumed = False
+        self._open(cursor)
+
+    @property
+    def cursor(self):
+        return f"{self._inode}:{self.offset}" if self._file is not None else None
+
+    def _open(self, cursor=None, from_start=False):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._file = None
+            return
+        self._inode = os.fstat(f.fileno()).st_ino
+        self.offset = 0 if from_start else f.seek(0, os.SEEK_END)
+        inode, _, offset = str(cursor or '').partition(':')
+        if not from_start and inode == str(self._inode) and offset.isdigit() and int(offset) <= self.offset:
+            self.offset = f.seek(int(offset))
+            self.resumed = True
+        self._file = f
+        self._buffer = b''
+
+    def _rotated(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return st.st_ino != self._inode or st.st_size < self.offset
+
+    def _read(self):
+        data = self._file.read()
+        if not data:
+            return []
+        lines = (self._buffer + data).split(b'\n')
+        # unvollständige letzte Zeile bis zum nächsten Aufruf puffern
+        self._buffer = lines.pop()
+        result = []
+        for line in lines:
+            self.offset += len(line) + 1
+            if line.strip():
+                result.append(line.decode('utf-8', 'replace'))
+        return result
+
+    def _skipped_files(self):
+        """
+        Rotierte Dateien, die nach der bisher gelesenen entstanden sind – falls
+        zwischen zwei Aufrufen mehr als einmal rotiert wurde. Älteste zuerst.
+        """
+        newer = []
+        for rotated in log_files(self.path)[1:]:
+            try:
+                if os.stat(rotated).st_ino == self._inode:
+                    return newer[::-1]
+            except FileNotFoundError:
+                continue
+            newer.append(rotated)
+        # die gelesene Datei ist schon gelöscht: was dazwischen lag, ist nicht mehr zu bestimmen
+        return []
+
+    def read(self):
+        """Neue vollständige Zeilen seit dem letzten Aufruf."""
+        if self._file is None:
+            self._open(from_start=True)
+            return self._read() if self._file is not None else []
+        lines = self._read()
+        if self._rotated():
+            if self._buffer.strip():
+                lines.append(self._buffer.decode('utf-8', 'replace'))
+            self._file.close()
+            for rotated in self._skipped_files():
+                try:
+                    with open(rotated, 'rb') as f:
+                        lines += [line.rstrip(b'\n').decode('utf-8', 'replace') for line in f if line.strip()]
+                except FileNotFoundError:
+                    continue
+            self._open(from_start=True)
+            if self._file is not None:
+                lines += self._read()
+        return lines
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
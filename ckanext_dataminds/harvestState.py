@@ -0,0 +1,173 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from . import mongoPool
+
+log = logging.getLogger(__name__)
+
+DAY_FORMAT = "%Y-%m-%d"
+# Nach so vielen fehlgeschlagenen Läufen wird ein Tag aufgegeben (retired)
+MAX_DAY_ATTEMPTS = 5
+# erledigte oder aufgegebene Tage; fehlgeschlagene Versuche haben kein finished_at
+_FINISHED = {"finished_at": {"$exists": True}}
+
+# Datenbanken, in denen der Index von 'harvest_days' in diesem Prozess schon angelegt wurde
+_indexed_dbs = set()
+_index_lock = threading.Lock()
+
+
+def day_range(start_date, end_date):
+    """Alle Tage von start_date bis end_date (je 'YYYY-MM-DD') als Strings."""
+    start = datetime.strptime(start_date, DAY_FORMAT)
+    end = datetime.strptime(end_date, DAY_FORMAT)
+    return [(start + timedelta(days=i)).strftime(DAY_FORMAT) for i in range((end - start).days + 1)]
+
+
+def contiguous_ranges(days):
+    """Fasst sortierte Tage zu zusammenhängenden Bereichen [(start, end), …] zusammen."""
+    ranges = []
+    for day in sorted(days):
+        if ranges and _next_day(ranges[-1][1]) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def _next_day(day):
+    return (datetime.strptime(day, DAY_FORMAT) + timedelta(days=1)).strftime(DAY_FORMAT)
+
+
+class HarvestState:
+    """
+    Fortschritt eines Harvests pro Quelle in MongoDB:
+    'harvest_days' enthält je Tag (publication-date bzw. pubDay) ein Dokument –
+    erledigt (finished_at), fehlgeschlagen (failures) oder nach zu vielen
+    Fehlversuchen bzw. einem fehlenden Export aufgegeben (retired, mit
+    finished_at) –, 'harvest_state' die High-Water-Mark, also den letzten Tag,
+    bis zu dem alle Tage lückenlos erledigt oder aufgegeben sind.
+    """
+    def __init__(self, source, db=None):
+        self.source = source
+        db = db if db is not None else mongoPool.get_db()
+        self.days = db["harvest_days"]
+        self.state = db["harvest_state"]
+        self._ensure_index(db)
+
+    def _ensure_index(self, db):
+        """Index source + day einmal pro Prozess und Datenbank anlegen."""
+        key = (id(db.client), db.name)
+        with _index_lock:
+            if key in _indexed_dbs:
+                return
+            self.days.create_index([("source", ASCENDING), ("day", ASCENDING)], name="source_day")
+            _indexed_dbs.add(key)
+
+    def high_water_mark(self):
+        doc = self.state.find_one({"_id": self.source}) or {}
+        return doc.get("high_water_mark")
+
+    def done_days(self, days):
+        """Die bereits erledigten oder aufgegebenen Tage aus days."""
+        cursor = self.days.find(dict(_FINISHED, source=self.source, day={"$in": list(days)}), {"day": 1})
+        return {doc["day"] for doc in cursor}
+
+    def pending_days(self, days, force=False):
+        """days ohne die schon erledigten (force=True: alle), sortiert."""
+        days = sorted(set(days))
+        if force:
+            return days
+        done = self.done_days(days)
+        return [d for d in days if d not in done]
+
+    def incremental_window(self, max_days, now=None):
+        """
+        Die ersten max_days noch offenen Tage nach der High-Water-Mark bis
+        gestern – schon erledigte Tage hinter einer Lücke zählen nicht mit, so
+        dass ein fehlschlagender Tag die folgenden nicht aufhält. Ohne
+        High-Water-Mark nur gestern; leer, wenn nichts Neues ansteht.
+        """
+        yesterday = ((now or datetime.now()) - timedelta(days=1)).strftime(DAY_FORMAT)
+        hwm = self.high_water_mark()
+        if not hwm:
+            return [yesterday]
+        if hwm >= yesterday:
+            return []
+        done = {doc["day"] for doc in self.days.find(
+            dict(_FINISHED, source=self.source, day={"$gt": hwm, "$lte": yesterday}), {"day": 1})}
+        return [d for d in day_range(_next_day(hwm), yesterday) if d not in done][:max_days]
+
+    def mark_done(self, days, initialize=False):
+        """
+        Markiert days als erfolgreich publiziert und schiebt die High-Water-Mark
+        über alle lückenlos erledigten Tage vor. Ohne bisherige Mark wird sie nur
+        mit initialize=True gesetzt (inkrementeller Lauf), damit ein einzelner
+        Backfill alter Tage keinen riesigen Aufholbereich erzeugt.
+        """
+        days = sorted(days)
+        if not days:
+            return self.high_water_mark()
+        now = datetime.utcnow()
+        for day in days:
+            self.days.update_one(
+                {"_id": f"{self.source}:{day}"},
+                {"$set": {"source": self.source, "day": day, "finished_at": now},
+                 "$inc": {"runs": 1},
+                 "$unset": {"failures": "", "retired": "", "last_error": ""}},
+                upsert=True)
+        return self._advance(days[0], initialize, now)
+
+    def mark_failed(self, days, error=None, permanent=False, max_attempts=MAX_DAY_ATTEMPTS, initialize=False):
+        """
+        Zählt einen fehlgeschlagenen Versuch für days. Nach max_attempts
+        Versuchen oder mit permanent=True (z.B. kein Export, 404) wird der Tag
+        aufgegeben: er gilt als abgeschlossen, damit die High-Water-Mark und
+        damit die folgenden Tage weiterlaufen. force=True holt ihn trotzdem.
+        Liefert die aufgegebenen Tage.
+        """
+        now = datetime.utcnow()
+        retired = []
+        for day in sorted(days):
+            try:
+                doc = self.days.find_one_and_update(
+                    {"_id": f"{self.source}:{day}", "finished_at": {"$exists": False}},
+                    {"$set": {"source": self.source, "day": day, "failed_at": now,
+                              "last_error": str(error or '')[:500]},
+                     "$inc": {"failures": 1}},
+                    upsert=True, return_document=ReturnDocument.AFTER)
+            except DuplicateKeyError:
+                # schon erledigt (erneuter Lauf mit force=True): bleibt erledigt
+                continue
+            if permanent or doc["failures"] >= max_attempts:
+                self.days.update_one({"_id": doc["_id"]},
+                                     {"$set": {"retired": True, "finished_at": now}})
+                retired.append(day)
+                log.warning(f"{self.source.upper()} {day} given up after {doc['failures']} failed attempt(s): "
+                            f"{error}", extra={'source': self.source, 'day': day})
+        if retired:
+            self._advance(retired[0], initialize, now)
+        return retired
+
+    def _advance(self, first_day, initialize, now):
+        """Schiebt die High-Water-Mark über alle lückenlos abgeschlossenen Tage vor."""
+        hwm = self.high_water_mark()
+        if not hwm:
+            if not initialize:
+                return None
+            hwm = (datetime.strptime(first_day, DAY_FORMAT) - timedelta(days=1)).strftime(DAY_FORMAT)
+        later = self.days.find(dict(_FINISHED, source=self.source, day={"$gt": hwm}),
+                               {"day": 1}).sort("day", ASCENDING)
+        for doc in later:
+            if doc["day"] != _next_day(hwm):
+                break
+            hwm = doc["day"]
+        # $max: parallele Läufe können die Mark nie zurücksetzen
+        self.state.update_one({"_id": self.source},
+                              {"$max": {"high_water_mark": hwm}, "$set": {"updated": now}},
+                              upsert=True)
+        log.info(f"{self.source.upper()} high-water mark: {hwm}", extra={'source': self.source})
+        return hwm
@@ -0,0 +1,136 @@
+import logging
+import threading
+from datetime import datetime
+
+import ckan.plugins.toolkit as tk
+
+from . import harvestLog
+
+log = logging.getLogger(__name__)
+
+# Quelle -> Name der Job-Funktion in cron_jobs
+HARVEST_JOBS = {
+    'ted': 'run_ted_cron_job_for',
+    'bescha': 'run_bescha_cron_job_for',
+    'all': 'run_async_harvest',
+}
+
+# RQ-Job, der in diesem Work-Horse-Prozess läuft. get_current_job() ist
+# thread-lokal, die Jobs arbeiten aber in eigenen Threads.
+_active_job = None
+_progress_lock = threading.Lock()
+
+
+def job_queue():
+    """Name der RQ-Queue für Harvest-Jobs (dataminds.job_queue)."""
+    return tk.config.get('dataminds.job_queue', 'dataminds')
+
+
+def _job_timeout():
+    """Maximale Laufzeit eines Harvest-Jobs in Sekunden, danach bricht RQ ab."""
+    return tk.asint(tk.config.get('dataminds.job_timeout', 6 * 3600))
+
+
+def enqueue_harvest(source, start_date=None, end_date=None, force=False):
+    """
+    Stellt einen Harvest-Job für source ('ted', 'bescha' oder 'all') in die
+    Queue und liefert sofort den RQ-Job zurück. Ausgeführt wird er von einem
+    eigenen Worker: ckan jobs worker <dataminds.job_queue>
+    Mit force=True werden auch schon erledigte Tage erneut geholt.
+    """
+    if source not in HARVEST_JOBS:
+        raise ValueError(f"Unknown data source: {source}")
+    title = f"dataminds {source} {start_date or 'new'}..{end_date or ''}{' (force)' if force else ''}"
+    job = tk.enqueue_job(
+        run_harvest_job, args=[source],
+        kwargs={'start_date': start_date or None, 'end_date': end_date or None, 'force': force},
+        title=title, queue=job_queue(),
+        rq_kwargs={'timeout': _job_timeout(), 'meta': {'source': source}})
+    log.info(f"Enqueued {title} as job {job.id}")
+    return job
+
+
+def run_harvest_job(source, start_date=None, end_date=None, force=False):
+    """Einstiegspunkt im Worker: merkt sich den RQ-Job und startet den Harvest."""
+    global _active_job
+    from rq import get_current_job
+    from . import cron_jobs
+    from .CKANPublisher import exclusive_indexing
+    _active_job = get_current_job()
+    try:
+        # der Work-Horse führt nur diesen Job aus: Suchindex darf zurückgestellt werden
+        with exclusive_indexing():
+            getattr(cron_jobs, HARVEST_JOBS[source])(start_date=start_date, end_date=end_date, force=force)
+    finally:
+        _active_job = None
+        # der Work-Horse endet mit os._exit: Log-Queue vorher leeren
+        harvestLog.flush()
+
+
+def report_progress(**fields):
+    """
+    Schreibt Fortschritt (z.B. pages=3, notices=750) in job.meta['progress']
+    des laufenden RQ-Jobs. Außerhalb eines Workers passiert nichts.
+    """
+    job = _active_job
+    if job is None:
+        return
+    with _progress_lock:
+        progress = job.meta.setdefault('progress', {})
+        progress.update(fields)
+        progress['updated'] = datetime.utcnow().isoformat()
+        try:
+            job.save_meta()
+        except Exception as e:
+            log.warning(f"Could not save progress of job {job.id}: {e}")
+
+
+def _isoformat(dt):
+    return dt.isoformat() if dt else None
+
+
+def job_status(job):
+    """JSON-taugliche Zusammenfassung eines RQ-Jobs."""
+    status = {
+        'id': job.id,
+        'title': job.meta.get('title'),
+        'source': job.meta.get('source'),
+        'status': job.get_status(),
+        'progress': job.meta.get('progress', {}),
+        'enqueued_at': _isoformat(job.enqueued_at),
+        'started_at': _isoformat(job.started_at),
+        'ended_at': _isoformat(job.ended_at),
+    }
+    if job.is_failed and job.exc_info:
+        status['error'] = job.exc_info.strip().splitlines()[-1]
+    return status
+
+
+def get_job_status(job_id):
+    """Status eines Jobs per ID; None, wenn der Job unbekannt oder abgelaufen ist."""
+    from ckan.lib import jobs as ckan_jobs
+    try:
+        return job_status(ckan_jobs.job_from_id(job_id))
+    except KeyError:
+        return None
+
+
+def recent_jobs(limit=20):
+    """Wartende, laufende, fertige und fehlgeschlagene Jobs der Harvest-Queue."""
+    from ckan.lib import jobs as ckan_jobs
+    from rq.registry import StartedJobRegistry, FinishedJobRegistry, FailedJobRegistry
+
+    queue = ckan_jobs.get_queue(job_queue())
+    job_ids = list(queue.job_ids)
+    for registry_cls in (StartedJobRegistry, FinishedJobRegistry, FailedJobRegistry):
+        registry = registry_cls(queue.name, connection=queue.connection)
+        job_ids.extend(registry.get_job_ids())
+
+    jobs = []
+    for job_id in job_ids:
+        try:
+            jobs.append(job_status(ckan_jobs.job_from_id(job_id)))
+        except KeyError:
+            continue
+    jobs.sort(key=lambda j: j['enqueued_at'] or '', reverse=True)
+    return jobs[:limit]
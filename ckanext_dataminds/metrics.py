@@ -0,0 +1,175 @@
+import math
+import time
+import logging
+import threading
+import collections
+from contextlib import contextmanager
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from . import mongoPool
+
+log = logging.getLogger(__name__)
+
+COLLECTION = "harvest_metrics"
+# Quantile der Latenzen, die pro Lauf gespeichert werden
+QUANTILES = (0.5, 0.95)
+
+
+def percentile(values, q):
+    """q-Quantil (0..1) nach der Nearest-Rank-Methode; None ohne Werte."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def _collection(db=None):
+    db = db if db is not None else mongoPool.get_db()
+    return db[COLLECTION]
+
+
+class RunMetrics:
+    """
+    Metriken eines Harvest-Laufs: Dauer und Aufrufe je Phase (fetch, mongo,
+    publish, reindex), Zähler (notices, bytes_downloaded, docs_written,
+    published, skipped, failed, errors …) und Latenzen, z.B. publish pro
+    Notice. Thread-sicher; save() legt am Ende ein Dokument in
+    'harvest_metrics' ab, aus dem Dashboard und /metrics lesen.
+    """
+
+    def __init__(self, source, task_num, mode='sync'):
+        self.source = source
+        self.task_num = task_num
+        self.mode = mode
+        self.started = datetime.utcnow()
+        self._t0 = time.time()
+        self.phases = collections.defaultdict(lambda: {'seconds': 0.0, 'calls': 0})
+        self.counters = collections.Counter()
+        self.latencies = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase):
+        """Misst den Block als einen Aufruf der Phase phase."""
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(phase, time.time() - t0)
+
+    def add_phase(self, phase, seconds, calls=1):
+        with self._lock:
+            self.phases[phase]['seconds'] += seconds
+            self.phases[phase]['calls'] += calls
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name, values):
+        """Latenzen (Sekunden) für name hinzufügen, ein Wert oder eine Liste."""
+        if isinstance(values, (int, float)):
+            values = [values]
+        with self._lock:
+            self.latencies[name].extend(values)
+
+    def add_report(self, report):
+        """Übernimmt Ergebnisse und Publish-Latenzen eines PublishReport."""
+        for status in ('published', 'updated', 'skipped', 'failed'):
+            self.incr(status, report.count(status))
+        self.observe('publish', report.latencies)
+
+    def as_dict(self):
+        with self._lock:
+            latency = {}
+            for name, values in self.latencies.items():
+                latency[name] = {'count': len(values), 'max': max(values) if values else None}
+                for q in QUANTILES:
+                    latency[name][f"p{int(q * 100)}"] = percentile(values, q)
+            return {
+                'source': self.source,
+                'task_num': self.task_num,
+                'mode': self.mode,
+                'started': self.started,
+                'finished': datetime.utcnow(),
+                'duration_s': round(time.time() - self._t0, 3),
+                'phases': {name: {'seconds': round(p['seconds'], 3), 'calls': p['calls']}
+                           for name, p in self.phases.items()},
+                'counters': dict(self.counters),
+                'latency': latency,
+            }
+
+    def save(self, db=None):
+        """Schreibt den Lauf nach MongoDB; ein Fehler dabei bricht den Job nicht ab."""
+        doc = self.as_dict()
+        phases = ", ".join(f"{name} {p['seconds']:.2f}s/{p['calls']}" for name, p in doc['phases'].items())
+        log.info(f"{self.source} phases: {phases}",
+                 extra={'source': self.source, 'task': self.task_num, 'phases': doc['phases']})
+        try:
+            collection = _collection(db)
+            collection.create_index([("source", ASCENDING), ("started", DESCENDING)], name="source_started")
+            collection.insert_one(doc)
+        except PyMongoError as e:
+            log.warning(f"Could not store metrics of {self.source} task {self.task_num}: {e}")
+        return doc
+
+
+def recent_runs(source=None, limit=30, db=None):
+    """Die letzten limit Läufe (neueste zuerst), optional nur für source."""
+    query = {'source': source} if source else {}
+    cursor = _collection(db).find(query, {'_id': False}).sort('started', DESCENDING).limit(limit)
+    runs = []
+    for doc in cursor:
+        for key in ('started', 'finished'):
+            if isinstance(doc.get(key), datetime):
+                doc[key] = doc[key].isoformat()
+        runs.append(doc)
+    return runs
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(db=None):
+    """Der jeweils letzte Lauf je Quelle im Prometheus-Textformat."""
+    collection = _collection(db)
+    families = collections.OrderedDict([
+        ('dataminds_run_duration_seconds', ('gauge', "Duration of the last harvest run", [])),
+        ('dataminds_run_finished_timestamp_seconds', ('gauge', "End of the last harvest run", [])),
+        ('dataminds_phase_seconds', ('gauge', "Time spent per phase in the last harvest run", [])),
+        ('dataminds_phase_calls', ('gauge', "Calls per phase in the last harvest run", [])),
+        ('dataminds_run_count', ('gauge', "Counters of the last harvest run", [])),
+        ('dataminds_latency_seconds', ('gauge', "Latency quantiles of the last harvest run", [])),
+    ])
+    for source in sorted(collection.distinct('source')):
+        run = collection.find_one({'source': source}, sort=[('started', DESCENDING)])
+        if run is None:
+            continue
+        src = f'source="{_label(source)}"'
+        families['dataminds_run_duration_seconds'][2].append((src, run.get('duration_s', 0)))
+        if isinstance(run.get('finished'), datetime):
+            finished = (run['finished'] - datetime(1970, 1, 1)).total_seconds()
+            families['dataminds_run_finished_timestamp_seconds'][2].append((src, finished))
+        for phase, values in run.get('phases', {}).items():
+            labels = f'{src},phase="{_label(phase)}"'
+            families['dataminds_phase_seconds'][2].append((labels, values.get('seconds', 0)))
+            families['dataminds_phase_calls'][2].append((labels, values.get('calls', 0)))
+        for name, value in run.get('counters', {}).items():
+            families['dataminds_run_count'][2].append((f'{src},name="{_label(name)}"', value))
+        for name, values in run.get('latency', {}).items():
+            for q in QUANTILES:
+                value = values.get(f"p{int(q * 100)}")
+                if value is not None:
+                    families['dataminds_latency_seconds'][2].append(
+                        (f'{src},name="{_label(name)}",quantile="{q}"', value))
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
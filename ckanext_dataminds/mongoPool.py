@@ -0,0 +1,72 @@
+import os
+import logging
+import threading
+
+from pymongo import MongoClient
+import ckan.plugins.toolkit as tk
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MONGO_URI = "mongodb://mongodb:27017/"
+DEFAULT_DB_NAME = "ckan_mongo"
+
+# Ein MongoClient pro URI und Prozess; MongoClient ist thread-safe und poolt selbst
+_clients = {}
+_clients_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def mongo_uri(uri=None):
+    return uri or tk.config.get('dataminds.mongo_uri', DEFAULT_MONGO_URI)
+
+
+def db_name(name=None):
+    return name or tk.config.get('dataminds.mongo_db', DEFAULT_DB_NAME)
+
+
+def _client_options():
+    """Pool-, Timeout- und Write-Concern-Einstellungen aus der CKAN-Config."""
+    cfg = tk.config
+    write_concern = str(cfg.get('dataminds.mongo.write_concern', '1'))
+    return {
+        'maxPoolSize': tk.asint(cfg.get('dataminds.mongo.max_pool_size', 50)),
+        'minPoolSize': tk.asint(cfg.get('dataminds.mongo.min_pool_size', 0)),
+        'serverSelectionTimeoutMS': tk.asint(cfg.get('dataminds.mongo.server_selection_timeout_ms', 5000)),
+        'connectTimeoutMS': tk.asint(cfg.get('dataminds.mongo.connect_timeout_ms', 5000)),
+        'socketTimeoutMS': tk.asint(cfg.get('dataminds.mongo.socket_timeout_ms', 60000)),
+        'w': int(write_concern) if write_concern.isdigit() else write_concern,
+        'retryWrites': True,
+    }
+
+
+def get_client(uri=None):
+    """
+    Liefert den prozessweiten MongoClient für uri (Standard: dataminds.mongo_uri).
+    Nach einem fork (z.B. RQ-Work-Horse) wird ein neuer Client aufgebaut, da
+    MongoClient nicht fork-sicher ist.
+    """
+    global _clients_pid
+    uri = mongo_uri(uri)
+    with _lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(uri)
+        if client is None:
+            client = MongoClient(uri, **_client_options())
+            _clients[uri] = client
+            log.info(f"MongoClient created for {uri}")
+        return client
+
+
+def get_db(name=None, uri=None):
+    """Datenbank-Handle auf dem geteilten Client."""
+    return get_client(uri)[db_name(name)]
+
+
+def close_clients():
+    """Schließt alle Clients dieses Prozesses (z.B. beim Shutdown eines Workers)."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -1,106 +1,300 @@
+import hashlib
 import json
 import logging
 import os
 import shutil
 import zipfile
-from pymongo import MongoClient
+import threading
+from pymongo import ASCENDING, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+from . import mongoPool
+from .releaseStream import iter_array_items
 
 log = logging.getLogger(__name__)
 
+# Datenbanken, deren Indexe in diesem Prozess bereits angelegt wurden
+_indexed_dbs = set()
+_index_lock = threading.Lock()
+
+
+# Felder, die nicht zum Inhalt einer Notice gehören
+_HASH_EXCLUDE = ("_id", "source_file", "content_hash")
+# Unique-Indexe der Deduplizierung: Collection -> (Felder, Indexname, partieller Filter)
+UNIQUE_INDEXES = {
+    "ted_data": (("publication-number",), "uniq_publication_number",
+                 {"publication-number": {"$exists": True}}),
+    "bescha_data": (("ocid", "id"), "uniq_ocid_release_id", {"id": {"$exists": True}}),
+}
+# MongoDB-Fehlercode für doppelte Schlüssel (auch beim Aufbau eines Unique-Index)
+DUPLICATE_KEY = 11000
+
+
+def content_hash(doc):
+    """
+    Stabiler SHA-256 über den Inhalt einer Notice bzw. eines Releases:
+    Schlüssel sortiert, kompakt serialisiert, ohne Verwaltungsfelder.
+    """
+    content = {k: v for k, v in doc.items() if k not in _HASH_EXCLUDE}
+    raw = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ted_key(notice):
+    """Filter, der eine TED-Notice eindeutig identifiziert (None ohne Nummer)."""
+    pubnum = notice.get("publication-number")
+    return {"publication-number": pubnum} if pubnum else None
+
+
+def bescha_key(release):
+    """Filter, der ein OCDS-Release eindeutig identifiziert (ocid + Release-id)."""
+    if not release.get("id"):
+        return None
+    return {"ocid": release.get("ocid"), "id": release["id"]}
+
+
+def find_notice(db, source, key):
+    """
+    Eine TED-Notice (publication-number) bzw. ein BeschA-Release (id, sonst
+    ocid) aus db, ohne _id und source_file, aber mit content_hash (falls
+    vorhanden). None, wenn nicht vorhanden.
+    """
+    projection = {"_id": False, "source_file": False}
+    if source == "ted":
+        return db["ted_data"].find_one({"publication-number": key}, projection)
+    if source == "bescha":
+        return (db["bescha_data"].find_one({"id": key}, projection)
+                or db["bescha_data"].find_one({"ocid": key}, projection))
+    return None
+
+
+def stored_query(docs, key_fn):
+    """
+    (filter, projection) für die schon gespeicherten Dokumente eines Batches:
+    nur Schlüsselfelder, content_hash und source_file. None, wenn kein Dokument einen Schlüssel hat.
+    """
+    keys = [key for key in map(key_fn, docs) if key]
+    if not keys:
+        return None
+    projection = {field: True for key in keys[:1] for field in key}
+    projection.update({"_id": False, "content_hash": True, "source_file": True})
+    return {"$or": keys}, projection
+
+
+def _key_id(key):
+    return tuple(sorted(key.items()))
+
+
+def upsert_ops(docs, key_fn, stored=()):
+    """
+    Bulk-Operationen für einen Batch; stored sind die gespeicherten Gegenstücke
+    (Ergebnis von stored_query). Neue Dokumente: Upsert mit $setOnInsert, samt
+    source_file des ersten Laufs. Vorhandene nur bei geändertem content_hash,
+    dann ganz ersetzt (upstream entfernte Felder verschwinden, der Inhalt passt
+    wieder zum content_hash; source_file bleibt), unveränderte gar nicht.
+    Ohne Schlüssel: InsertOne.
+    """
+    known = {_key_id(key_fn(doc)): doc for doc in stored}
+    ops = []
+    for doc in docs:
+        key = key_fn(doc)
+        if not key:
+            ops.append(InsertOne(doc))
+        elif _key_id(key) not in known:
+            # ein paralleler Lauf kann es inzwischen angelegt haben: dann No-op
+            ops.append(UpdateOne(key, {"$setOnInsert": doc}, upsert=True))
+        elif known[_key_id(key)].get("content_hash") != doc.get("content_hash"):
+            replacement = {k: v for k, v in doc.items() if k != "_id"}
+            if "source_file" in known[_key_id(key)]:
+                replacement["source_file"] = known[_key_id(key)]["source_file"]
+            ops.append(ReplaceOne(key, replacement))
+    return ops
+
+
+def remove_duplicates(db, collection):
+    """
+    Entfernt doppelte Dokumente (gleicher Unique-Schlüssel, z.B. Altbestand aus der
+    dateibasierten Deduplizierung); je Schlüssel bleibt das zuletzt eingefügte.
+    Liefert die Zahl der gelöschten Dokumente.
+    """
+    fields, _, partial = UNIQUE_INDEXES[collection]
+    pipeline = [
+        {"$match": partial},
+        {"$group": {"_id": {field: f"${field}" for field in fields},
+                    "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ]
+    removed = 0
+    for group in db[collection].aggregate(pipeline, allowDiskUse=True):
+        # ObjectIds steigen mit der Einfügezeit
+        older = sorted(group["ids"])[:-1]
+        removed += db[collection].delete_many({"_id": {"$in": older}}).deleted_count
+    return removed
+
+
+def create_unique_index(db, collection):
+    """
+    Legt den Unique-Index einer Collection an. Scheitert er an Duplikaten im
+    Bestand, werden diese vorher einmalig entfernt (remove_duplicates).
+    """
+    fields, name, partial = UNIQUE_INDEXES[collection]
+    spec = [(field, ASCENDING) for field in fields]
+    try:
+        db[collection].create_index(spec, unique=True, name=name, partialFilterExpression=partial)
+    except OperationFailure as e:
+        if e.code != DUPLICATE_KEY:
+            raise
+        removed = remove_duplicates(db, collection)
+        log.warning(f"Removed {removed} duplicate documents from {collection} before creating {name}")
+        db[collection].create_index(spec, unique=True, name=name, partialFilterExpression=partial)
+
+
 class MongoWriter:
     """
     Schreibt Datensätze in MongoDB.
     Nutzt standardmäßig die DB 'ckan_mongo' und Collections 'ted_data' bzw. 'bescha_data'.
     """
-    def __init__(self, mongo_uri="mongodb://mongodb:27017/", db_name="ckan_mongo"):
-        self.mongo_uri = mongo_uri
-        try:
-            self.client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000)
-            db_names = self.client.list_database_names()
-        except Exception as e:
-            print("Error connecting to MongoDB:", e)
-        self.db = self.client[db_name]
+    # Dokumente pro bulk_write
+    batch_size = 1000
+
+    def __init__(self, mongo_uri=None, db_name=None):
+        # Geteilter, gepoolter Client; ohne Argumente aus der CKAN-Config
+        self.mongo_uri = mongoPool.mongo_uri(mongo_uri)
+        self.client = mongoPool.get_client(self.mongo_uri)
+        self.db = self.client[mongoPool.db_name(db_name)]
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """
+        Legt die Unique-Indexe für die Dokument-Deduplizierung an (einmal pro
+        Prozess und Datenbank): 'publication-number' für TED, ocid + id für BeschA.
+        """
+        key = (self.mongo_uri, self.db.name)
+        with _index_lock:
+            if key in _indexed_dbs:
+                return
+            try:
+                for collection in UNIQUE_INDEXES:
+                    create_unique_index(self.db, collection)
+                # Lookup der Releases über ihre id (Notice-Endpoint)
+                self.db["bescha_data"].create_index([("id", ASCENDING)], name="release_id")
+                _indexed_dbs.add(key)
+            except PyMongoError as e:
+                log.error(f"Could not create unique indexes in {self.db.name}: {e}. "
+                          f"Run 'ckan dataminds dedupe' and restart.")
+
+    def _bulk_upsert(self, collection, docs, key_fn, label):
+        """
+        Schreibt docs als ungeordnete Bulk-Upserts (siehe upsert_ops): pro Batch
+        werden erst die gespeicherten content_hashes gelesen, unveränderte
+        Dokumente werden nicht geschrieben. Dokumente ohne Schlüssel werden
+        einfach eingefügt. Liefert die Zahl der neu angelegten bzw. geänderten Dokumente.
+        """
+        inserted = updated = unchanged = 0
+        for i in range(0, len(docs), self.batch_size):
+            batch = docs[i:i + self.batch_size]
+            query = stored_query(batch, key_fn)
+            stored = list(self.db[collection].find(*query)) if query else []
+            ops = upsert_ops(batch, key_fn, stored)
+            unchanged += len(batch) - len(ops)
+            if not ops:
+                continue
+            try:
+                result = self.db[collection].bulk_write(ops, ordered=False)
+                details = result.bulk_api_result
+            except BulkWriteError as e:
+                # parallele Upserts desselben Schlüssels: die übrigen Writes sind durch
+                details = e.details
+                log.warning(f"{len(details.get('writeErrors', []))} write errors in {collection}")
+            inserted += details.get("nUpserted", 0) + details.get("nInserted", 0)
+            updated += details.get("nModified", 0)
+            unchanged += details.get("nMatched", 0) - details.get("nModified", 0)
+        log.debug(f"{label}: {inserted} new, {updated} updated, {unchanged} unchanged in {collection}.",
+                  extra={'inserted': inserted, 'updated': updated, 'unchanged': unchanged})
+        return inserted + updated
 
     def store_ted_data(self, ted_json_path):
         """
         Speichert TED-Daten aus einer JSON-Datei in die MongoDB-Collection 'ted_data'.
-        Vor dem Einfügen wird anhand des Dateinamens geprüft, ob diese Datei bereits hochgeladen wurde.
+        Dedupliziert wird pro Notice über 'publication-number', nicht pro Datei.
         """
         try:
             filename = os.path.basename(ted_json_path)
-            existing = self.db["ted_data"].find_one({"source_file": filename})
-            if existing:
-                print(f"[INFO] File {filename} has already been uploaded. Skipping...")
-                return
-
             with open(ted_json_path, 'r', encoding='utf-8') as f:
                 ted_data = json.load(f)
             if "notices" not in ted_data or not ted_data["notices"]:
-                print("[WARN] No 'notices' found.")
+                log.warning("No 'notices' found.")
                 return
-            for notice in ted_data["notices"]:
-                notice["source_file"] = filename
-            result = self.db["ted_data"].insert_many(ted_data["notices"])
-            print(f"[OK] {len(result.inserted_ids)} TED-Documents from {filename} successfully uploaded.")
+            self.store_ted_notices(ted_data["notices"], filename)
         except FileNotFoundError:
-            print(f"[FEHLER] File not Found: {ted_json_path}")
+            log.error(f"File not Found: {ted_json_path}")
         except json.JSONDecodeError as e:
-            print(f"[FEHLER] JSON-Decoding Error: {e}")
+            log.error(f"JSON-Decoding Error: {e}")
 
+    def store_ted_notices(self, notices, source_file):
+        """
+        Speichert eine Liste von TED-Notices (z.B. eine Seite der TED-Suche)
+        per Upsert in 'ted_data'. Die übergebenen Dicts bleiben unverändert, damit
+        sie danach noch unverfälscht an CKAN gehen können.
+        """
+        if not notices:
+            return 0
+        docs = [dict(notice, source_file=source_file, content_hash=content_hash(notice))
+                for notice in notices]
+        return self._bulk_upsert("ted_data", docs, ted_key, f"TED {source_file}")
 
     def store_bescha_data(self, zip_paths):
         """
-        Speichert JSON-Daten aus entpackten BeschA-ZIP-Dateien in die MongoDB-Collection 'bescha_data'.
-        Für jeden ZIP-Dateipfad wird anhand des Dateinamens geprüft, ob er bereits verarbeitet wurde.
+        Speichert JSON-Daten aus BeschA-ZIP-Dateien in die MongoDB-Collection 'bescha_data'.
+        Dedupliziert wird pro Release über ocid + id, nicht pro ZIP-Datei.
         """
+        if isinstance(zip_paths, dict):
+            # bereits eingelesene Releases im TED-ähnlichen Format
+            releases = zip_paths.get('notices') or zip_paths.get('releases') or []
+            return self.store_bescha_releases(releases, zip_paths.get('source_file', 'bescha_stream'))
         if isinstance(zip_paths, str):
             zip_paths = [zip_paths]
 
-        docs_to_insert = []
+        total = 0
         for zip_path in zip_paths:
             source_file = os.path.basename(zip_path)
+            log.info(f"Verarbeite ZIP: {source_file}…")
 
-            # Überspringen, falls schon importiert
-            if self.db["bescha_data"].find_one({"source_file": source_file}):
-                print(f"[INFO] {source_file} bereits verarbeitet, skip.")
-                continue
-
-            print(f"[INFO] Verarbeite ZIP: {source_file}…")
-
-            # ZIP entpacken und JSON-Dateien parsen
+            # JSON-Dateien direkt aus dem ZIP inkrementell parsen und in Batches einfügen
             try:
                 with zipfile.ZipFile(zip_path, "r") as archive:
                     for member in archive.namelist():
                         if not member.lower().endswith(".json"):
                             continue
+                        batch = []
                         with archive.open(member) as f:
                             try:
-                                data = json.load(f)
-                            except json.JSONDecodeError as e:
-                                print(f"[WARN] JSON-Fehler in {member}: {e}")
-                                continue
-
-                        # Unter 'releases' oder 'notices' abholen
-                        releases = data.get("releases") or data.get("notices") or []
-                        if isinstance(releases, dict):
-                            releases = [releases]
-
-                        for rel in releases:
-                            rel["source_file"] = source_file
-                            docs_to_insert.append(rel)
+                                # Unter 'releases' oder 'notices' abholen
+                                for rel in iter_array_items(f, keys=("releases", "notices")):
+                                    batch.append(rel)
+                                    if len(batch) >= self.batch_size:
+                                        total += self.store_bescha_releases(batch, source_file)
+                                        batch = []
+                            except ValueError as e:
+                                log.warning(f"JSON-Fehler in {member}: {e}")
+                        total += self.store_bescha_releases(batch, source_file)
 
             except zipfile.BadZipFile as e:
-                print(f"[FEHLER] Ungültige ZIP-Datei {zip_path}: {e}")
+                log.error(f"Ungültige ZIP-Datei {zip_path}: {e}")
             except Exception as e:
-                print(f"[FEHLER] Fehler beim Verarbeiten von {zip_path}: {e}")
+                log.exception(f"Fehler beim Verarbeiten von {zip_path}: {e}")
 
-        # Bulk-Insert in MongoDB
-        if not docs_to_insert:
-            print("[WARN] Keine BESCHA-Dokumente gefunden zum Einfügen.")
-            return
+        if not total:
+            log.warning("Keine BESCHA-Dokumente gefunden zum Einfügen.")
+        return total
 
-        try:
-            result = self.db["bescha_data"].insert_many(docs_to_insert)
-            print(f"[OK] {len(result.inserted_ids)} BESCHA-Dokumente eingefügt (source_file zuletzt: {source_file}).")
-        except Exception as e:
-            print(f"[FEHLER] Beim Einfügen in MongoDB ist ein Fehler aufgetreten: {e}")
+    def store_bescha_releases(self, releases, source_file):
+        """
+        Speichert bereits geparste OCDS-Releases (z.B. einen Batch aus dem
+        gestreamten BeschA-Export) per Upsert in 'bescha_data', ohne die Dicts
+        zu verändern.
+        """
+        docs = [dict(rel, source_file=source_file, content_hash=content_hash(rel)) for rel in releases]
+        if not docs:
+            return 0
+        return self._bulk_upsert("bescha_data", docs, bescha_key, f"BESCHA {source_file}")
@@ -1,15 +1,18 @@
 import logging
-from ckan.plugins import SingletonPlugin, implements, IConfigurer, IBlueprint, ITemplateHelpers
+from ckan.plugins import (SingletonPlugin, implements, IConfigurer, IConfigurable, IBlueprint,
+                          IClick, ITemplateHelpers)
 from ckan.plugins.toolkit import add_template_directory, add_public_directory
 
 from . import cron_jobs
+from . import harvestLog
 
 log = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
 
 class DatamindsPlugin(SingletonPlugin):
     implements(IConfigurer)
+    implements(IConfigurable)
     implements(IBlueprint)
+    implements(IClick)
     implements(ITemplateHelpers)
 
     def update_config(self, config):
@@ -19,8 +22,77 @@ class DatamindsPlugin(SingletonPlugin):
         # Set default cron job schedules (can be overridden in the CKAN config file)
         config.setdefault('dataminds.ted_schedule', '0 0 * * *')      # e.g., daily at midnight
         config.setdefault('dataminds.bescha_schedule', '0 1 * * *')    # e.g., daily at 1 AM
+        # Share the CKAN package-name index between workers via Redis
+        config.setdefault('dataminds.shared_package_index', 'false')
+        # Number of parallel CKAN publish workers (1 = sequential)
+        config.setdefault('dataminds.publish_workers', '1')
+        # Bulk publish: new datasets with URL resources created in batches of this size,
+        # search index rebuilt once at the end of the run
+        config.setdefault('dataminds.bulk_publish', 'false')
+        config.setdefault('dataminds.bulk_batch_size', '100')
+        # Skip per-package search indexing while publishing; the touched packages are
+        # reindexed at the end of the run in chunks of reindex_batch_size. Only applies
+        # to harvests running as background jobs (ckan jobs worker), since the switch is process-wide
+        config.setdefault('dataminds.defer_indexing', 'false')
+        config.setdefault('dataminds.reindex_batch_size', '500')
+        # BeschA backfills: days downloaded in parallel and per-day timeout (s)
+        config.setdefault('dataminds.bescha_days_in_flight', '3')
+        config.setdefault('dataminds.bescha_day_timeout', '600')
+        # API endpoints of the harvests (e.g. local stand-ins for the benchmark)
+        config.setdefault('dataminds.ted_api_url', 'https://api.ted.europa.eu/v3/notices/search')
+        config.setdefault('dataminds.bescha_api_url',
+                          'https://www.oeffentlichevergabe.de/api/notice-exports?format=ocds.zip')
+        # HTTP timeouts "connect,read" in seconds for TED pages and BeschA exports
+        config.setdefault('dataminds.ted_timeout', '5,30')
+        config.setdefault('dataminds.bescha_timeout', '5,120')
+        # Shared MongoDB client (one pool per process for fetcher, writer and publisher)
+        config.setdefault('dataminds.mongo_uri', 'mongodb://mongodb:27017/')
+        config.setdefault('dataminds.mongo_db', 'ckan_mongo')
+        config.setdefault('dataminds.mongo.max_pool_size', '50')
+        config.setdefault('dataminds.mongo.server_selection_timeout_ms', '5000')
+        config.setdefault('dataminds.mongo.connect_timeout_ms', '5000')
+        config.setdefault('dataminds.mongo.socket_timeout_ms', '60000')
+        config.setdefault('dataminds.mongo.write_concern', '1')
+        # Async harvest: per-host limits "host:concurrency[:requests_per_second]"
+        config.setdefault('dataminds.async.host_limits', 'api.ted.europa.eu:2:5 www.oeffentlichevergabe.de:4')
+        # Harvest jobs run on this RQ queue (ckan jobs worker dataminds), max runtime in seconds
+        config.setdefault('dataminds.job_queue', 'dataminds')
+        config.setdefault('dataminds.job_timeout', '21600')
+        # Harvest lock shared by all CKAN containers: backend auto|redis|mongo|file,
+        # lease TTL (s, renewed by heartbeat) and what a second job does: wait|skip
+        config.setdefault('dataminds.lock_backend', 'auto')
+        config.setdefault('dataminds.lock_ttl', '300')
+        config.setdefault('dataminds.lock_mode', 'wait')
+        config.setdefault('dataminds.lock_wait_timeout', '3600')
+        # Profile every harvest run (off|sampling|cprofile; the admin panel switch
+        # profiles just the next run) and where profiles are written
+        config.setdefault('dataminds.profiling', 'off')
+        config.setdefault('dataminds.profile_dir', '/srv/app/ckanext_dataminds/profiles')
+        # Built-in scheduler thread, started on the first web request so CLI commands
+        # and the RQ worker never run it (alternatively: ckan dataminds scheduler), and
+        # how many missed days one scheduled run catches up at most
+        config.setdefault('dataminds.scheduler.enabled', 'false')
+        config.setdefault('dataminds.scheduler.max_catchup_days', '7')
+        # Failed runs after which a day is given up so later days keep flowing
+        config.setdefault('dataminds.max_day_attempts', '5')
+        # Structured log: JSON lines (rotated externally by logrotate) read by the admin panel, optional text
+        # on the console, level and the sample rate for per-notice events
+        config.setdefault('dataminds.log_file', '/var/log/ckan/ckanext_dataminds.log')
+        config.setdefault('dataminds.log_console', 'true')
+        config.setdefault('dataminds.log_level', 'INFO')
+        config.setdefault('dataminds.log_sample_rate', '100')
+        # Live log on the settings page; the browser polls for new lines with a cursor
+        config.setdefault('dataminds.log_follow', 'true')
         return config
 
+    def configure(self, config):
+        # Logger der Extension: Queue + Listener-Thread, vor allen anderen Diensten
+        harvestLog.setup_logging(config)
+
+    def get_commands(self):
+        from .cli import get_commands
+        return get_commands()
+
     def get_blueprint(self):
         # Return the Flask blueprint for the admin interface
         from .controller import dataminds_blueprint
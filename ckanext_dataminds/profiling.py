@@ -0,0 +1,344 @@
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import collections
+from datetime import datetime
+
+import ckan.plugins.toolkit as tk
+from pymongo.errors import PyMongoError
+
+from . import mongoPool
+from .metrics import percentile
+from .dataFetch import DataFetcher
+from .mongoWriter import MongoWriter
+from .CKANPublisher import CkanPublisher, PackageNameIndex
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = "/srv/app/ckanext_dataminds/profiles"
+COLLECTION = "harvest_profiling"
+# 'sampling': Wall-Clock-Stacks aller Job-Threads; 'cprofile' zusätzlich cProfile im Job-Thread
+MODES = ('sampling', 'cprofile')
+# Abstand der Stack-Samples in Sekunden
+SAMPLE_INTERVAL = 0.01
+# So viele der langsamsten CKAN-Action-Aufrufe landen im Profil
+SLOWEST_CALLS = 25
+# Innerste Frames wartender Pool-Threads (leere Queue) – kein Job-Zeitanteil
+IDLE_FRAMES = ('thread.py:_worker',)
+PROFILE_FILE_RE = re.compile(r'^[a-z]+_\d+\.(json|folded|prof)$')
+
+# Methoden, deren Aufrufe während eines Profils gemessen werden
+HOOKS = (
+    (DataFetcher, ('_post_ted', 'download_bescha_export', 'fetch_ted_data')),
+    (MongoWriter, ('store_ted_data', 'store_ted_notices', 'store_bescha_releases', '_bulk_upsert')),
+    (CkanPublisher, ('publish_ted_notices', 'publish_ted_page', 'publish_bescha_notices',
+                     '_load_publish_states', '_publish_package', '_create_batch', 'finish')),
+    (PackageNameIndex, ('load',)),
+)
+
+
+def profile_dir():
+    return tk.config.get('dataminds.profile_dir', DEFAULT_PROFILE_DIR)
+
+
+def _collection(db=None):
+    db = db if db is not None else mongoPool.get_db()
+    return db[COLLECTION]
+
+
+def request_next_run(mode='sampling', db=None):
+    """Schaltet das Profiling für den nächsten Harvest-Lauf ein (Schalter im Admin-Panel)."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    _collection(db).update_one(
+        {'_id': 'next_run'},
+        {'$set': {'mode': mode, 'requested_at': datetime.utcnow()}}, upsert=True)
+
+
+def cancel_next_run(db=None):
+    _collection(db).delete_one({'_id': 'next_run'})
+
+
+def pending_request(db=None):
+    """Die noch offene Anforderung ({'mode', 'requested_at'}) oder None."""
+    return _collection(db).find_one({'_id': 'next_run'}, {'_id': False})
+
+
+def _claim_mode(db=None):
+    """
+    Modus für den anstehenden Lauf: dataminds.profiling (immer) oder die
+    Anforderung aus dem Admin-Panel, die dabei verbraucht wird – bei mehreren
+    Workern bekommt sie genau ein Lauf.
+    """
+    configured = tk.config.get('dataminds.profiling', 'off')
+    if configured in MODES:
+        return configured
+    try:
+        doc = _collection(db).find_one_and_delete({'_id': 'next_run'})
+    except PyMongoError as e:
+        log.warning(f"Could not read the profiling switch: {e}")
+        return None
+    return doc['mode'] if doc else None
+
+
+def for_run(source, task_num, db=None):
+    """RunProfiler für den Lauf; ohne Anforderung ein inaktiver (alles No-ops)."""
+    return RunProfiler(source, task_num, _claim_mode(db))
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _thread_label(name):
+    # Pool-Threads (bescha-fetch_0, bescha-fetch_1 …) zu einem Stapel zusammenfassen
+    return re.sub(r'[_-]\d+$', '', name).replace(';', ':')
+
+
+class RunProfiler:
+    """
+    Profil eines Harvest-Laufs. Solange es aktiv ist (with-Block):
+
+    - ein Sampler-Thread zeichnet alle SAMPLE_INTERVAL Sekunden die Stacks der
+      Job-Threads auf (Wall-Clock, auch Warten auf TED, Mongo und CKAN),
+    - die Methoden aus HOOKS sowie jeder CKAN-Action-Aufruf (tk.get_action)
+      und der Solr-Reindex werden mit ihrer Dauer erfasst,
+    - im Modus 'cprofile' läuft cProfile in dem Thread, der wrap(fn) ausführt.
+
+    Am Ende entstehen in profile_dir() <source>_<task>.folded (für flamegraph.pl
+    bzw. speedscope), <source>_<task>.json (Zeiten je Methode und Action) und
+    im Modus 'cprofile' <source>_<task>.prof (pstats, z.B. für snakeviz).
+    Es ist immer nur ein Profil pro Prozess aktiv.
+    """
+    _active = None
+    _active_lock = threading.Lock()
+
+    def __init__(self, source, task_num, mode=None, interval=SAMPLE_INTERVAL):
+        self.source = source
+        self.task_num = task_num
+        self.mode = mode
+        self.interval = interval
+        self.active = False
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.methods = collections.defaultdict(list)
+        self.actions = collections.defaultdict(list)
+        self.slowest = []
+        self._profile = cProfile.Profile() if mode == 'cprofile' else None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._registered = set()
+        self._baseline = set()
+        self._originals = []
+        self._thread = None
+        self._started = None
+        self._t0 = None
+
+    @property
+    def name(self):
+        return f"{self.source}_{self.task_num}"
+
+    def __enter__(self):
+        if self.mode is None:
+            return self
+        with RunProfiler._active_lock:
+            if RunProfiler._active is not None:
+                log.warning(f"Profiling of {self.name} skipped: {RunProfiler._active.name} is running")
+                return self
+            RunProfiler._active = self
+        self.active = True
+        self._started = datetime.utcnow()
+        self._t0 = time.time()
+        self._install_hooks()
+        self._baseline = set(sys._current_frames())
+        self._thread = threading.Thread(target=self._sample_loop, name='dataminds-profiler', daemon=True)
+        self._thread.start()
+        log.info(f"Profiling {self.name} ({self.mode})", extra={'source': self.source, 'task': self.task_num})
+        return self
+
+    def __exit__(self, *exc):
+        if not self.active:
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._remove_hooks()
+        self.active = False
+        with RunProfiler._active_lock:
+            RunProfiler._active = None
+        try:
+            self.write()
+        except OSError as e:
+            log.error(f"Could not write profile {self.name}: {e}")
+        return False
+
+    def wrap(self, fn):
+        """
+        fn im Profil ausführen: der Thread wird gesampelt, auch wenn er schon
+        vor dem Profil lief, und im Modus 'cprofile' läuft dort cProfile.
+        """
+        if self.mode is None:
+            return fn
+
+        def _run(*args, **kwargs):
+            if not self.active:
+                return fn(*args, **kwargs)
+            ident = threading.get_ident()
+            self._registered.add(ident)
+            if self._profile is not None:
+                self._profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if self._profile is not None:
+                    self._profile.disable()
+                self._registered.discard(ident)
+        return _run
+
+    # --- Hooks -----------------------------------------------------------------
+
+    def _timed(self, records, label, fn):
+        def timed(*args, **kwargs):
+            t0 = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._record(records, label, t0)
+        timed.__wrapped__ = fn
+        return timed
+
+    def _record(self, records, label, t0):
+        duration = time.time() - t0
+        with self._lock:
+            records[label].append(duration)
+            if records is self.actions:
+                self.slowest.append((duration, label, round(t0 - self._t0, 3)))
+                if len(self.slowest) > 4 * SLOWEST_CALLS:
+                    self.slowest = sorted(self.slowest, reverse=True)[:SLOWEST_CALLS]
+
+    def _patch(self, owner, attr, replacement):
+        self._originals.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, replacement)
+
+    def _install_hooks(self):
+        for cls, names in HOOKS:
+            for name in names:
+                self._patch(cls, name, self._timed(self.methods, f"{cls.__name__}.{name}", getattr(cls, name)))
+
+        get_action = tk.get_action
+
+        def timed_get_action(action_name):
+            return self._timed(self.actions, action_name, get_action(action_name))
+        self._patch(tk, 'get_action', timed_get_action)
+
+        try:
+            from ckan.lib import search
+        except ImportError:
+            return
+        for name in ('rebuild', 'commit'):
+            self._patch(search, name, self._timed(self.actions, f"search.{name}", getattr(search, name)))
+
+    def _remove_hooks(self):
+        while self._originals:
+            owner, attr, original = self._originals.pop()
+            setattr(owner, attr, original)
+
+    # --- Sampler ---------------------------------------------------------------
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own or (ident in self._baseline and ident not in self._registered):
+                    continue
+                if _frame_label(frame.f_code) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(_thread_label(names.get(ident, str(ident))))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    # --- Ausgabe ---------------------------------------------------------------
+
+    @staticmethod
+    def _summary(records):
+        summary = {}
+        for label, values in sorted(records.items(), key=lambda kv: -sum(kv[1])):
+            summary[label] = {
+                'calls': len(values),
+                'seconds': round(sum(values), 3),
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+                'max': max(values),
+            }
+        return summary
+
+    def as_dict(self):
+        with self._lock:
+            slowest = sorted(self.slowest, reverse=True)[:SLOWEST_CALLS]
+            return {
+                'name': self.name,
+                'source': self.source,
+                'task_num': self.task_num,
+                'mode': self.mode,
+                'started': self._started.isoformat(),
+                'duration_s': round(time.time() - self._t0, 3),
+                'samples': self.samples,
+                'interval_s': self.interval,
+                'methods': self._summary(self.methods),
+                'actions': self._summary(self.actions),
+                'slowest_actions': [{'action': label, 'seconds': round(d, 4), 'at_s': at}
+                                    for d, label, at in slowest],
+            }
+
+    def write(self, directory=None):
+        """Schreibt .folded, .json und ggf. .prof; liefert die Dateipfade."""
+        directory = directory or profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name)
+        paths = [f"{base}.folded", f"{base}.json"]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = self.as_dict()
+        if self._profile is not None:
+            paths.append(f"{base}.prof")
+            pstats.Stats(self._profile).dump_stats(paths[-1])
+        summary['files'] = [os.path.basename(p) for p in paths]
+        with open(paths[1], "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        top = ', '.join(f"{label} {s['seconds']:.2f}s/{s['calls']}"
+                        for label, s in list(summary['actions'].items())[:3])
+        log.info(f"Profile {self.name} written to {directory} ({self.samples} samples; {top})",
+                 extra={'source': self.source, 'task': self.task_num})
+        return paths
+
+
+def list_profiles(directory=None):
+    """Zusammenfassungen der vorhandenen Profile, neueste zuerst."""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for fn in os.listdir(directory):
+        if not fn.endswith('.json') or not PROFILE_FILE_RE.match(fn):
+            continue
+        try:
+            with open(os.path.join(directory, fn), encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read profile {fn}: {e}")
+            continue
+        profiles.append({key: summary.get(key) for key in
+                         ('name', 'source', 'task_num', 'mode', 'started', 'duration_s', 'samples', 'files')})
+    return sorted(profiles, key=lambda p: p.get('started') or '', reverse=True)
@@ -0,0 +1,106 @@
+import codecs
+import json
+
+# Gemeinsamer C-beschleunigter Decoder; raw_decode liefert Objekt und Endposition
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_TAIL = '.eE+-'
+
+
+class _JsonReader:
+    """
+    Liest ein JSON-Dokument stückweise aus einem Datei-Objekt (bytes oder str).
+    Es wird immer nur so viel Text gepuffert, wie für den aktuellen Wert nötig ist.
+    """
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Hängt den nächsten Chunk an; False, wenn die Datei zu Ende ist."""
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            self.buf += self.utf8.decode(b'', final=True)
+            return False
+        if isinstance(data, bytes):
+            data = self.utf8.decode(data)
+        # bereits verarbeiteten Text verwerfen
+        if self.pos >= self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += data
+        return True
+
+    def peek(self):
+        """Nächstes Zeichen nach Whitespace ('' am Dateiende)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch == '' or ch not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """Dekodiert den nächsten vollständigen JSON-Wert ab der aktuellen Position."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # Zahlen am Pufferende könnten abgeschnitten sein ("1" aus "1.5e3")
+            truncated = end == len(self.buf) or (
+                type(obj) in (int, float) and self.buf[end] in _NUMBER_TAIL)
+            if truncated and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_array_items(fp, keys=('releases',), chunk_size=64 * 1024):
+    """
+    Liefert die Elemente des ersten Arrays unter einem der Top-Level-Schlüssel
+    keys (z.B. 'releases' eines OCDS-Release-Packages) einzeln, ohne das ganze
+    Dokument zu laden. Andere Top-Level-Werte werden überlesen.
+    Der Speicherbedarf hängt nur von der Größe eines Elements ab, nicht von der Datei.
+    """
+    reader = _JsonReader(fp, chunk_size)
+    if reader.peek() == '\ufeff':
+        reader.pos += 1
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in keys and reader.peek() == '[':
+            reader.pos += 1
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+            return
+        # nicht benötigten Wert überspringen
+        reader.value()
+        if reader.expect(',}') == '}':
+            return
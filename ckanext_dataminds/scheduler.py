@@ -0,0 +1,246 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import ckan.plugins.toolkit as tk
+
+from . import mongoPool
+from . import jobs
+from .harvestState import HarvestState
+
+log = logging.getLogger(__name__)
+
+SOURCES = ('ted', 'bescha')
+# (min, max) je Feld: Minute, Stunde, Tag, Monat, Wochentag (0/7 = Sonntag)
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Wie oft der Scheduler spätestens aufwacht (s)
+TICK_SECONDS = 60
+
+
+def _parse_field(spec, lo, hi):
+    """Ein Cron-Feld: '*', '5', '1-5', '*/15', '0-30/10' und Listen davon."""
+    values = set()
+    for part in spec.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = lo, hi
+        elif '-' in part:
+            start, end = (int(p) for p in part.split('-', 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if step < 1 or start < lo or end > hi or start > end:
+            raise ValueError(f"Invalid cron field {spec!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Minimaler Parser für 5-Feld-Cron-Ausdrücke ('0 1 * * *').
+    Wie bei cron gilt: sind Tag und Wochentag beide eingeschränkt, reicht einer.
+    """
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = ' '.join(fields)
+        (self.minutes, self.hours, self.days, self.months,
+         self.weekdays) = (_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELD_RANGES))
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt):
+        """Erster Zeitpunkt nach dt, zu dem der Ausdruck zutrifft."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=5 * 366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+def schedule_for(source, settings=None):
+    """
+    Zeitplan einer Quelle: dataminds.<source>_schedule aus der CKAN-Config,
+    unverändert. Nur wenn im Admin-Panel eine Frequenz gespeichert wurde
+    (settings.json, 'hourly'/'daily'/'weekly' statt 'cron'), gilt diese – zur
+    Minute/Stunde des konfigurierten Ausdrucks, sofern dort feste Werte stehen.
+    """
+    expression = tk.config.get(f'dataminds.{source}_schedule', '0 0 * * *')
+    if settings is None:
+        from .controller import load_settings
+        settings = load_settings()
+    frequency = settings.get(source, {}).get('frequency')
+    if frequency in ('hourly', 'daily', 'weekly'):
+        minute, hour = expression.split()[:2]
+        if not (minute.isdigit() and (hour.isdigit() or frequency == 'hourly')):
+            log.warning(f"Scheduler: {source} frequency '{frequency}' overrides '{expression}' "
+                        f"at minute/hour 0, the configured ones are not fixed values",
+                        extra={'source': source})
+        minute = minute if minute.isdigit() else '0'
+        hour = hour if hour.isdigit() else '0'
+        expression = {
+            'hourly': f"{minute} * * * *",
+            'daily': f"{minute} {hour} * * *",
+            'weekly': f"{minute} {hour} * * 1",
+        }[frequency]
+    return CronSchedule(expression)
+
+
+class HarvestScheduler:
+    """
+    Stellt TED- und BeschA-Harvests nach Zeitplan in die Job-Queue.
+    Der Zustand liegt in MongoDB ('harvest_schedule'); das Weiterschalten von
+    next_run ist ein Compare-and-Set, so dass bei mehreren CKAN-Containern
+    bzw. Web-Workern jedes Fenster genau einmal eingereiht wird. Die Jobs
+    holen die neuen Tage seit der High-Water-Mark der Quelle; verpasste
+    Fenster werden so in Etappen von höchstens max_catchup_days nachgeholt.
+    """
+    def __init__(self, sources=SOURCES, db=None):
+        self.sources = sources
+        self.db = db if db is not None else mongoPool.get_db()
+        self.collection = self.db["harvest_schedule"]
+        self.states = {source: HarvestState(source, self.db) for source in sources}
+        self.max_catchup_days = max(1, tk.asint(tk.config.get('dataminds.scheduler.max_catchup_days', 7)))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _job_pending(self, source):
+        """Ob für source noch ein Job wartet oder läuft."""
+        try:
+            return any(j['source'] == source and j['status'] in ('queued', 'started', 'deferred')
+                       for j in jobs.recent_jobs(limit=100))
+        except Exception as e:
+            log.warning(f"Could not list harvest jobs: {e}")
+            return False
+
+    def tick(self, now=None):
+        """Prüft alle Quellen einmal; liefert die Zeitpunkte des jeweils nächsten Laufs."""
+        now = now or datetime.now()
+        from .controller import load_settings
+        settings = load_settings()
+        next_runs = {}
+        for source in self.sources:
+            try:
+                next_runs[source] = self._tick_source(source, schedule_for(source, settings), now)
+            except Exception:
+                log.exception(f"Scheduler tick for {source} failed")
+        return next_runs
+
+    def _tick_source(self, source, schedule, now):
+        state = self.collection.find_one({"_id": source}) or {}
+        if state.get("expression") != schedule.expression or not state.get("next_run"):
+            # neuer oder geänderter Zeitplan: ab jetzt planen, Fortschritt bleibt
+            next_run = schedule.next_after(now)
+            self.collection.update_one(
+                {"_id": source},
+                {"$set": {"expression": schedule.expression, "next_run": next_run}},
+                upsert=True)
+            log.info(f"Scheduler: {source} '{schedule.expression}', next run {next_run.isoformat()}",
+                     extra={'source': source})
+            return next_run
+        if now < state["next_run"]:
+            return state["next_run"]
+
+        if self._job_pending(source):
+            # laufenden Job abwarten, danach geht es mit dessen Fortschritt weiter
+            next_run = now + timedelta(seconds=TICK_SECONDS)
+            self._claim(source, state, next_run)
+            return next_run
+
+        hwm = self.states[source].high_water_mark()
+        days = self.states[source].incremental_window(self.max_catchup_days, now)
+        window = [days[0], days[-1]] if days else None
+        if state.get("catching_up") and state.get("enqueued_window") == window:
+            # der letzte Aufhol-Job kam nicht voran (z.B. API-Fehler): bis zum nächsten Fenster warten
+            next_run = schedule.next_after(now)
+            if self._claim(source, state, next_run, catching_up=False):
+                log.warning(f"Scheduler: {source} made no progress past {hwm}, retry at {next_run.isoformat()}",
+                            extra={'source': source})
+            return next_run
+
+        yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+        catching_up = bool(days) and days[-1] < yesterday
+        # noch nicht aufgeholt: gleich im nächsten Tick weitermachen
+        next_run = now + timedelta(seconds=TICK_SECONDS) if catching_up else schedule.next_after(now)
+        if not self._claim(source, state, next_run, catching_up=catching_up, enqueued_window=window):
+            return next_run
+        if not days:
+            log.info(f"Scheduler: {source} up to date ({hwm}), next run {next_run.isoformat()}",
+                     extra={'source': source})
+            return next_run
+
+        # ohne Datum: der Job bestimmt die neuen Tage selbst aus der High-Water-Mark
+        job = jobs.enqueue_harvest(source)
+        self.collection.update_one(
+            {"_id": source}, {"$set": {"last_job_id": job.id, "last_enqueued": now}})
+        log.info(f"Scheduler: {source} {days[0]}..{days[-1]} enqueued as job {job.id}, "
+                 f"next run {next_run.isoformat()}", extra={'source': source, 'job': job.id})
+        return next_run
+
+    def _claim(self, source, state, next_run, **fields):
+        """
+        Schaltet next_run per Compare-and-Set weiter. False, wenn ein anderer
+        Prozess dieses Fenster schon übernommen hat.
+        """
+        claimed = self.collection.find_one_and_update(
+            {"_id": source, "next_run": state["next_run"]},
+            {"$set": dict(fields, next_run=next_run)})
+        return claimed is not None
+
+    def run_forever(self):
+        """Schleife bis stop(): wacht zum nächsten fälligen Lauf auf, spätestens jede Minute."""
+        log.info(f"Harvest scheduler started for {', '.join(self.sources)}")
+        while not self._stop.is_set():
+            next_runs = self.tick()
+            wait = TICK_SECONDS
+            if next_runs:
+                wait = min(wait, max(1.0, (min(next_runs.values()) - datetime.now()).total_seconds()))
+            self._stop.wait(wait)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, daemon=True,
+                                        name="dataminds-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """Startet den In-Process-Scheduler einmal pro Prozess (dataminds.scheduler.enabled)."""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = HarvestScheduler()
+            _scheduler.start()
+        return _scheduler
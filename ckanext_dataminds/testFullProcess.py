@@ -1,73 +1,55 @@
-import io
-import json
+import tempfile
 import unittest
-import zipfile
-from datetime import datetime
-from unittest.mock import MagicMock, patch
 
-from ckanext_dataminds import DataFetcher, MongoWriter, CkanPublisher, run_ted_cron_job, run_bescha_cron_job
+from ckanext_dataminds import benchmark
 
-class TestFullProcess(unittest.TestCase):
-
-    @patch('ckanext_dataminds.CkanPublisher.RemoteCKAN')
-    @patch('ckanext_dataminds.dataFetch.requests.post')
-    @patch('ckanext_dataminds.dataFetch.requests.get')
-    @patch('ckanext_dataminds.mongoWriter.MongoClient')
-    def test_full_process(self, mock_mongo_client, mock_requests_get, mock_requests_post, mock_remote_ckan):
-        # --- Setup für TED (POST) ---
-        dummy_ted_data = {
-            "notices": [
-                {
-                    "publication-date": "2023-11-01",
-                    "title-proc": {"eng": "Example TED Notice"},
-                    "buyer-name": {"eng": ["Example Buyer"]}
-                }
-            ]
-        }
-        dummy_post_response = MagicMock()
-        dummy_post_response.ok = True
-        dummy_post_response.json.return_value = dummy_ted_data
-        mock_requests_post.return_value = dummy_post_response
-
-        # --- Setup für BeschA (GET) ---
-        dummy_bescha_data = {"dummy": "value"}
-        dummy_json = json.dumps(dummy_bescha_data).encode("utf-8")
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, mode="w") as zf:
-            zf.writestr("dummy.json", dummy_json)
-        zip_buffer.seek(0)
-        dummy_get_response = MagicMock()
-        dummy_get_response.ok = True
-        dummy_get_response.content = zip_buffer.read()
-        mock_requests_get.return_value = dummy_get_response
-
-        # --- Setup für MongoDB ---
-        dummy_ted_collection = MagicMock()
-        dummy_ted_collection.find.return_value = dummy_ted_data["notices"]
-        dummy_bescha_collection = MagicMock()
-        dummy_bescha_collection.find.return_value = [dummy_bescha_data]
-        dummy_db = MagicMock()
-        dummy_db.__getitem__.side_effect = lambda name: dummy_ted_collection if name == "ted_data" else dummy_bescha_collection
-        mock_mongo_client.return_value = dummy_db
 
-        # --- Setup für CKAN-API ---
-        dummy_ckan = MagicMock()
-        # package_show löst NotFound aus, um die Erstellung zu erzwingen
-        dummy_ckan.action.package_show.side_effect = Exception("NotFound")
-        dummy_package = {"id": "dummy-package-id", "extras": []}
-        dummy_ckan.action.package_create.return_value = dummy_package
-        dummy_resource = {"id": "dummy-resource-id"}
-        dummy_ckan.action.resource_create.return_value = dummy_resource
-        mock_remote_ckan.return_value = dummy_ckan
-
-        # --- Ausführung der Cron Jobs ---
-        run_ted_cron_job()
-        run_bescha_cron_job()
+class TestFullProcess(unittest.TestCase):
+    """
+    TED und BeschA einmal komplett durch Fetch, MongoDB und CKAN – gegen die
+    lokalen Stand-ins des Benchmarks (Fake-Server, mongomock, Fake-CKAN).
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_ted_process(self):
+        # 250 Notices: drei Seiten à 100 über iterationNextToken
+        result = benchmark.run_source('ted', 250, self.tmp.name)
+        self.assertEqual(result['notices'], 250)
+        self.assertEqual(result['counters']['pages'], 3)
+        self.assertEqual(result['counters']['docs_written'], 250)
+        self.assertEqual(result['counters']['published'], 250)
+        self.assertEqual(result['ckan_calls']['package_create'], 250)
+        self.assertEqual(result['ckan_calls']['resource_create'], 250)
+        self.assertNotIn('errors', result['counters'])
+
+    def test_bescha_process(self):
+        # zwei Tage à 100 Releases
+        result = benchmark.run_source('bescha', 200, self.tmp.name, per_day=100)
+        self.assertEqual(result['notices'], 200)
+        self.assertEqual(result['counters']['days'], 2)
+        self.assertEqual(result['counters']['docs_written'], 200)
+        self.assertEqual(result['counters']['published'], 200)
+        self.assertEqual(result['ckan_calls']['package_create'], 200)
+        self.assertNotIn('errors', result['counters'])
+
+    def test_bulk_publish(self):
+        result = benchmark.run_source('ted', 250, self.tmp.name,
+                                      overrides={'dataminds.bulk_publish': 'true',
+                                                 'dataminds.bulk_batch_size': '100'})
+        self.assertEqual(result['counters']['published'], 250)
+        self.assertNotIn('resource_create', result['ckan_calls'])
+        self.assertEqual(result['reindexed'], 250)
+        self.assertIn('reindex', result['stages'])
+
+    def test_baseline_regression(self):
+        result = benchmark.run_source('ted', 100, self.tmp.name)
+        faster = dict(result, per_s=result['per_s'] * 2)
+        self.assertEqual(benchmark.compare_to_baseline([result], [result]), [])
+        self.assertTrue(benchmark.compare_to_baseline([result], [faster]))
 
-        # --- Assertions ---
-        self.assertTrue(dummy_ckan.action.package_create.called, "package_create wurde nicht aufgerufen.")
-        self.assertTrue(dummy_ckan.action.resource_create.called, "resource_create wurde nicht aufgerufen.")
 
 if __name__ == '__main__':
     unittest.main()
-
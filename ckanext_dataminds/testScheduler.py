@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime
+
+from ckanext_dataminds.scheduler import CronSchedule, schedule_for
+import ckan.plugins.toolkit as tk
+
+
+class TestCronSchedule(unittest.TestCase):
+
+    def test_fields(self):
+        schedule = CronSchedule('*/15 1-3 * * 1,5')
+        self.assertEqual(schedule.minutes, {0, 15, 30, 45})
+        self.assertEqual(schedule.hours, {1, 2, 3})
+        self.assertEqual(schedule.weekdays, {1, 5})
+        # 7 ist wie 0 Sonntag
+        self.assertEqual(CronSchedule('0 0 * * 7').weekdays, {0})
+
+    def test_invalid(self):
+        for expression in ('0 0 * *', '60 0 * * *', '0 24 * * *', '*/0 * * * *', '5-1 * * * *'):
+            with self.assertRaises(ValueError):
+                CronSchedule(expression)
+
+    def test_next_after(self):
+        now = datetime(2024, 3, 15, 10, 7, 30)
+        self.assertEqual(CronSchedule('0 */6 * * *').next_after(now), datetime(2024, 3, 15, 12, 0))
+        self.assertEqual(CronSchedule('30 1 * * *').next_after(now), datetime(2024, 3, 16, 1, 30))
+        # Montag
+        self.assertEqual(CronSchedule('0 2 * * 1').next_after(now), datetime(2024, 3, 18, 2, 0))
+        self.assertEqual(CronSchedule('0 0 1 * *').next_after(now), datetime(2024, 4, 1, 0, 0))
+        # genau zum Zeitpunkt: erst der nächste
+        self.assertEqual(CronSchedule('7 10 * * *').next_after(datetime(2024, 3, 15, 10, 7)),
+                         datetime(2024, 3, 16, 10, 7))
+
+    def test_day_or_weekday(self):
+        # Tag und Wochentag eingeschränkt: einer von beiden reicht (wie cron)
+        schedule = CronSchedule('0 0 13 * 5')
+        self.assertEqual(schedule.next_after(datetime(2024, 3, 1, 12, 0)), datetime(2024, 3, 8, 0, 0))
+        self.assertEqual(schedule.next_after(datetime(2024, 3, 12, 12, 0)), datetime(2024, 3, 13, 0, 0))
+
+    def test_never_matches(self):
+        with self.assertRaises(ValueError):
+            CronSchedule('0 0 31 2 *').next_after(datetime(2024, 1, 1))
+
+
+class TestScheduleFor(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(tk.config.pop, 'dataminds.ted_schedule', None)
+        tk.config['dataminds.ted_schedule'] = '0 */6 * * *'
+
+    def test_configured_expression(self):
+        # ohne gespeicherte Frequenz gilt der konfigurierte Ausdruck unverändert
+        for frequency in (None, '', 'cron'):
+            settings = {'ted': {'frequency': frequency}}
+            self.assertEqual(schedule_for('ted', settings).expression, '0 */6 * * *')
+        self.assertEqual(schedule_for('ted', {}).expression, '0 */6 * * *')
+
+    def test_frequency_override(self):
+        tk.config['dataminds.ted_schedule'] = '30 2 * * *'
+        expected = {'hourly': '30 * * * *', 'daily': '30 2 * * *', 'weekly': '30 2 * * 1'}
+        for frequency, expression in expected.items():
+            self.assertEqual(schedule_for('ted', {'ted': {'frequency': frequency}}).expression, expression)
+
+    def test_override_without_fixed_time(self):
+        with self.assertLogs('ckanext_dataminds.scheduler', 'WARNING'):
+            schedule = schedule_for('ted', {'ted': {'frequency': 'daily'}})
+        self.assertEqual(schedule.expression, '0 0 * * *')
+
+
+if __name__ == '__main__':
+    unittest.main()
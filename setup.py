@@ -24,10 +24,22 @@ setup(
     zip_safe=False,
     install_requires=[
         'ckanapi==4.6',
-        'pymongo==3.12.1',
+        # motor 3.5 (async extra) and mongomock need pymongo 4.5-4.8
+        'pymongo>=4.5,<4.9',
         'requests==2.30.0',
         'Flask==2.2',
     ],
+    extras_require={
+        # Async harvest engine; without motor its Mongo writes run in a thread pool
+        'async': [
+            'aiohttp>=3.8,<4',
+            'motor>=3.4,<3.6',
+        ],
+        # testFullProcess / benchmark run against mongomock instead of a MongoDB server
+        'test': [
+            'mongomock>=4.1,<5',
+        ],
+    },
     entry_points={
         'ckan.plugins': [
             'dataminds=ckanext_dataminds.plugin:DatamindsPlugin'